@@ -23,4 +23,7 @@ cd ../model/
 yolo export model=yolo11n.pt format=engine workspace=4 int8=True data=coco.yaml
 yolo export model=yolov5nu.pt format=engine workspace=4 int8=True data=coco.yaml
 yolo export model=yolov8n.pt format=engine workspace=4 int8=True data=coco.yaml
+
+# Cascade large tier (yolo.py --cascade 11s)
+#yolo export model=yolo11s.pt format=engine workspace=4 int8=True data=coco.yaml
 cd -
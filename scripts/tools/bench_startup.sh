@@ -0,0 +1,119 @@
+#!/bin/bash
+
+# Cold vs warm start of a module, from its --startup-log timeline.
+# Cold runs drop the page cache first (root), warm runs follow each other.
+
+runs=3
+stop_after=20  # Seconds before a live module is interrupted (SIGINT)
+mode="both"
+log_dir="/tmp/bench_startup"
+
+# Function to display help
+show_help() {
+  echo "Usage: $0 [OPTIONS] -- <module command>"
+  echo
+  echo "Options:"
+  echo "  --runs <num>      Runs per mode (default: $runs)"
+  echo "  --stop <sec>      Interrupt each run after this many seconds (default: $stop_after)"
+  echo "  --cold            Cold runs only"
+  echo "  --warm            Warm runs only"
+  echo "  -h, --help        Show this help message and exit"
+  echo
+  echo "Example:"
+  echo "  sudo $0 --runs 5 -- python3 ./utils/yolo.py rtp://@:5600"
+  echo "  sudo $0 --stop 30 -- python3 ./utils/deepstream/deepstream.py -i rtp://@:5600"
+  echo "  $0 --warm -- python3 ./utils/yolo.py video.mp4 --replay --replay-fps 0"
+  exit 0
+}
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --runs)
+      runs="$2"
+      shift 2
+      ;;
+    --stop)
+      stop_after="$2"
+      shift 2
+      ;;
+    --cold)
+      mode="cold"
+      shift
+      ;;
+    --warm)
+      mode="warm"
+      shift
+      ;;
+    -h|--help)
+      show_help
+      ;;
+    --)
+      shift
+      break
+      ;;
+    *)
+      echo "Unknown option: $1"
+      show_help
+      ;;
+  esac
+done
+
+if [[ $# -eq 0 ]]; then
+  show_help
+fi
+
+mkdir -p "$log_dir"
+
+drop_caches() {
+  if [[ $EUID -ne 0 ]]; then
+    echo "Cold runs need root to drop the page cache"
+    exit 1
+  fi
+  sync
+  echo 3 > /proc/sys/vm/drop_caches
+}
+
+run_mode() {
+  local name=$1
+  local log="$log_dir/$name.jsonl"
+  rm -f "$log"
+
+  # One untimed run so the warm runs start from a populated cache
+  if [[ "$name" == "warm" ]]; then
+    timeout -s INT "$stop_after" "${@:2}" > /dev/null 2>&1
+  fi
+
+  for ((i = 1; i <= runs; i++)); do
+    [[ "$name" == "cold" ]] && drop_caches
+    echo "$name run $i/$runs"
+    timeout -s INT "$stop_after" "${@:2}" --startup-log "$log" > /dev/null 2>&1
+  done
+}
+
+if [[ "$mode" != "warm" ]]; then
+  run_mode cold "$@"
+fi
+if [[ "$mode" != "cold" ]]; then
+  run_mode warm "$@"
+fi
+
+python3 - "$log_dir" <<'EOF'
+import os
+import sys
+import json
+
+for name in ("cold", "warm"):
+    path = os.path.join(sys.argv[1], f"{name}.jsonl")
+    if not os.path.exists(path):
+        continue
+    with open(path) as f:
+        runs = [json.loads(line)['events'] for line in f if line.strip()]
+    if not runs:
+        print(f"{name}: no timeline recorded")
+        continue
+    events = sorted({event for run in runs for event in run}, key=lambda e: min(run.get(e, 1e9) for run in runs))
+    print(f"{name} ({len(runs)} runs), seconds since process start, min/median/max:")
+    for event in events:
+        values = sorted(run[event] for run in runs if event in run)
+        print(f"  {event:<14} {values[0]:7.3f} {values[len(values) // 2]:7.3f} {values[-1]:7.3f}")
+EOF
@@ -15,41 +15,87 @@
 # limitations under the License.
 ################################################################################
 
+import json
 import time
-from threading import Lock
-start_time=time.time()
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+# pipeline/ is put on sys.path by the entry scripts
+from pipeline.stats import StreamingStats
 
-fps_mutex = Lock()
+FPS_WINDOW_SEC   = 5.0    # Sliding window of the frame rate
+FPS_SLOT_SEC     = 0.25   # Resolution of the window, frames are counted per slot
+JITTER_GAIN      = 1.0 / 16  # RFC 3550 interarrival jitter smoothing
+METRICS_HOST     = "127.0.0.1"
 
 class GETFPS:
-    def __init__(self,stream_id):
-        global start_time
-        self.start_time=start_time
-        self.is_first=True
-        self.frame_count=0
-        self.stream_id=stream_id
-
-    def update_fps(self):
-        end_time = time.time()
-        if self.is_first:
-            self.start_time = end_time
-            self.is_first = False
-        else:
-            global fps_mutex
-            with fps_mutex:
-                self.frame_count = self.frame_count + 1
-
-    def get_fps(self):
-        end_time = time.time()
-        with fps_mutex:
-            stream_fps = float(self.frame_count/(end_time - self.start_time))
-            self.frame_count = 0
-        self.start_time = end_time
-        return round(stream_fps, 2)
+    """Frame rate, inter-frame interval/jitter and latency of one stream.
+
+    The pad probe of the stream is the only writer, so nothing is locked:
+    frames are counted in a ring of time slots tagged with their slot number,
+    and readers (print timer, metrics endpoint) sum the complete slots of the
+    last window. A stalled stream reads as 0 FPS instead of a stale value.
+    """
+
+    def __init__(self, stream_id, window_sec=FPS_WINDOW_SEC, slot_sec=FPS_SLOT_SEC):
+        self.stream_id = stream_id
+        self.slot_sec = slot_sec
+        self.window_slots = max(1, int(round(window_sec / slot_sec)))
+        # One extra slot for the one being filled
+        self.slot_counts = [0] * (self.window_slots + 1)
+        self.slot_ids = [-1] * (self.window_slots + 1)
+        self.frame_count = 0
+        self.last_frame_time = None
+        self.last_interval = None
+        self.jitter = 0.0
+        self.frame_interval = StreamingStats()
+        self.latency = StreamingStats()
+
+    def update_fps(self, ntp_timestamp=0):
+        """Count one frame; ntp_timestamp (ns, NvDsFrameMeta) gives the latency since nvstreammux."""
+        end_time = time.monotonic()
+        slot = int(end_time / self.slot_sec)
+        index = slot % len(self.slot_counts)
+        if self.slot_ids[index] != slot:
+            # Reset the count before retagging, a concurrent reader sees at worst an empty slot
+            self.slot_counts[index] = 0
+            self.slot_ids[index] = slot
+        self.slot_counts[index] += 1
+        self.frame_count += 1
+
+        if self.last_frame_time is not None:
+            interval = end_time - self.last_frame_time
+            self.frame_interval.update(interval, end_time)
+            if self.last_interval is not None:
+                self.jitter += JITTER_GAIN * (abs(interval - self.last_interval) - self.jitter)
+            self.last_interval = interval
+        self.last_frame_time = end_time
+
+        if ntp_timestamp:
+            self.latency.update(max(0.0, time.time() - ntp_timestamp / 1e9), end_time)
+
+    def get_fps(self, now=None):
+        """Frames per second over the complete slots of the last window."""
+        now = time.monotonic() if now is None else now
+        current = int(now / self.slot_sec)
+        first = current - self.window_slots
+        frames = 0
+        for slot_id, count in zip(list(self.slot_ids), list(self.slot_counts)):
+            if first <= slot_id < current:
+                frames += count
+        return round(frames / (self.window_slots * self.slot_sec), 2)
+
+    def snapshot(self, now=None):
+        return {
+            'fps': self.get_fps(now),
+            'frames': self.frame_count,
+            'interval': self.frame_interval.snapshot(),
+            'jitter': self.jitter,
+            'latency': self.latency.snapshot(),
+        }
 
     def print_data(self):
         print('frame_count=',self.frame_count)
-        print('start_time=',self.start_time)
+        print('fps=',self.get_fps())
 
 class PERF_DATA:
     def __init__(self, num_streams=1):
@@ -57,11 +103,91 @@ class PERF_DATA:
         self.all_stream_fps = {}
         for i in range(num_streams):
             self.all_stream_fps["stream{0}".format(i)]=GETFPS(i)
+        self.server = None
 
     def perf_print_callback(self):
         self.perf_dict = {stream_index:stream.get_fps() for (stream_index, stream) in self.all_stream_fps.items()}
         print ("\n**PERF: ", self.perf_dict, "\n")
+        interval_dict = {stream_index:"{:.1f}/{:.1f}/{:.1f} jitter {:.1f}".format(stream.frame_interval.window['p50']*1000,
+                                                                                 stream.frame_interval.window['p95']*1000,
+                                                                                 stream.frame_interval.window['p99']*1000,
+                                                                                 stream.jitter*1000)
+                         for (stream_index, stream) in self.all_stream_fps.items()}
+        print ("**INTERVAL(ms p50/p95/p99): ", interval_dict, "\n")
+        latency_dict = {stream_index:"{:.1f}/{:.1f}/{:.1f}".format(stream.latency.window['p50']*1000,
+                                                                  stream.latency.window['p95']*1000,
+                                                                  stream.latency.window['p99']*1000)
+                        for (stream_index, stream) in self.all_stream_fps.items() if stream.latency.count}
+        if latency_dict:
+            print ("**LATENCY(ms p50/p95/p99): ", latency_dict, "\n")
         return True
-    
-    def update_fps(self, stream_index):
-        self.all_stream_fps[stream_index].update_fps()
+
+    def update_fps(self, stream_index, ntp_timestamp=0):
+        self.all_stream_fps[stream_index].update_fps(ntp_timestamp)
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {stream_index: stream.snapshot(now) for (stream_index, stream) in self.all_stream_fps.items()}
+
+    def prometheus(self):
+        """Snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{{{labels}}} {value}")
+
+        streams = [(f'stream="{stream.stream_id}"', snapshot[index])
+                   for index, stream in self.all_stream_fps.items()]
+        metric("deepstream_fps", "gauge", f"Frames per second over the last {FPS_WINDOW_SEC:g}s",
+               [("", labels, snap['fps']) for labels, snap in streams])
+        metric("deepstream_frames_total", "counter", "Frames processed",
+               [("", labels, snap['frames']) for labels, snap in streams])
+        metric("deepstream_jitter_seconds", "gauge", "Inter-frame interval jitter (RFC 3550 estimator)",
+               [("", labels, f"{snap['jitter']:.6f}") for labels, snap in streams])
+        for name, key, help_text in (("deepstream_frame_interval_seconds", 'interval', "Time between frames"),
+                                     ("deepstream_latency_seconds", 'latency', "nvstreammux to probe latency")):
+            samples = []
+            for labels, snap in streams:
+                for quantile in ('p50', 'p95', 'p99'):
+                    samples.append(("", f'{labels},quantile="0.{quantile[1:]}"', f"{snap[key][quantile]:.6f}"))
+                samples.append(("_count", labels, snap[key]['total']))
+            metric(name, "summary", f"{help_text}, quantiles of the last completed window", samples)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host=METRICS_HOST):
+        """Serve /metrics (Prometheus) and /metrics.json from a daemon thread."""
+        perf_data = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = perf_data.prometheus(), "text/plain; version=0.0.4"
+                elif self.path in ("/", "/metrics.json"):
+                    body, content_type = json.dumps(perf_data.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        print(f"Metrics on http://{host}:{self.server.server_address[1]}/metrics (Prometheus) and /metrics.json")
+        return self.server
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
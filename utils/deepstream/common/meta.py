@@ -0,0 +1,208 @@
+import time
+import threading
+import numpy as np
+from queue import Queue, Empty
+
+META_MAX_FRAMES  = 16    # Frames per batch, the nvstreammux batch-size
+META_MAX_OBJECTS = 512   # Objects copied per batch, the rest are counted as truncated
+META_SLOTS       = 4     # Batches the consumers may hold at once
+META_CLASSES     = 4     # Minimum length of the per-frame class counts
+
+FRAME_META_DTYPE = np.dtype([
+    ('source',    '<u2'),  # nvstreammux pad index
+    ('frame_num', '<u4'),
+    ('pts',       '<u8'),  # Buffer PTS, ns
+    ('ntp_ts',    '<u8'),  # NTP timestamp, ns
+    ('num_obj',   '<u4'),  # Objects in the frame meta, may exceed the objects copied
+    ('first',     '<u4'),  # Index of the frame's first object in the batch objects
+    ('count',     '<u4'),  # Objects of the frame copied
+])
+
+OBJECT_META_DTYPE = np.dtype([
+    ('source',     '<u2'),
+    ('class_id',   '<i2'),
+    ('object_id',  '<u8'),  # Tracker id, 2**64-1 (UNTRACKED_OBJECT_ID) without a tracker
+    ('confidence', '<f4'),
+    ('left',       '<f4'),  # Box in nvstreammux output pixels
+    ('top',        '<f4'),
+    ('width',      '<f4'),
+    ('height',     '<f4'),
+])
+
+class MetaBatch:
+    """One extracted batch.
+
+    frames and objects are views on preallocated arrays, filled on the consumer
+    thread (or in the probe with probe_arrays) and reused once every consumer
+    returned, copy what must outlive the call. frame_metas (pyds frame metas)
+    are only valid inside the probe that extracted the batch.
+    """
+
+    __slots__ = ('sequence', 'timestamp', 'slot', 'frame_metas', 'frames', 'objects')
+
+    def __init__(self, sequence, timestamp, slot, frame_metas):
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.slot = slot
+        self.frame_metas = frame_metas
+        self.frames = None
+        self.objects = None
+
+    def frame_objects(self, index):
+        frame = self.frames[index]
+        return self.objects[frame['first']:frame['first'] + frame['count']]
+
+    def class_counts(self, index, minlength=META_CLASSES):
+        class_ids = self.frame_objects(index)['class_id']
+        return np.bincount(class_ids[class_ids >= 0], minlength=minlength)
+
+class BatchMetaExtractor:
+    """Copies NvDsBatchMeta frame and object data in one pass, off the streaming thread where possible.
+
+    extract() runs in the pad probe. It only walks the meta lists and appends
+    plain tuples to the rows of a slot; the consumer thread converts them into
+    the slot's preallocated arrays and calls the consumers. When the consumers
+    still hold every slot, the batch goes to a scratch slot and is not
+    delivered, so the streaming thread never waits. probe_arrays fills the
+    arrays in the probe, for callers that need them there (OSD text).
+    pyds is injected, a stub with the same cast() attributes works for tests.
+    """
+
+    def __init__(self, pyds=None, max_frames=META_MAX_FRAMES, max_objects=META_MAX_OBJECTS,
+                 slots=META_SLOTS, probe_arrays=False):
+        if pyds is None:
+            import pyds
+        self.pyds = pyds
+        self.max_frames = max_frames
+        self.max_objects = max_objects
+        self.probe_arrays = probe_arrays
+        # The last slot is the scratch slot, never handed to the consumers
+        self.frames = np.zeros((slots + 1, max_frames), dtype=FRAME_META_DTYPE)
+        self.objects = np.zeros((slots + 1, max_objects), dtype=OBJECT_META_DTYPE)
+        self.frame_rows = [[] for _ in range(slots + 1)]
+        self.object_rows = [[] for _ in range(slots + 1)]
+        self.scratch = slots
+        self.free = Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.ready = Queue()
+        self.consumers = []
+        self.stopped = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.sequence = 0
+        self.frame_count = 0
+        self.object_count = 0
+        self.truncated = 0     # Objects beyond max_objects, or of frames beyond max_frames
+        self.dropped = 0       # Batches not delivered, the consumers were behind
+        self.errors = 0
+        self.extract_time = 0.0
+
+    def add_consumer(self, consumer):
+        """consumer(batch) is called on the consumer thread for every delivered batch."""
+        self.consumers.append(consumer)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._consume, name="meta-consumer", daemon=True)
+        self.thread.start()
+        return self
+
+    def extract(self, batch_meta):
+        """Walk the batch once and queue it for the consumers, returns the MetaBatch."""
+        mark = time.perf_counter()
+        deliver = self.consumers and self.thread is not None
+        slot = self.scratch
+        if deliver:
+            try:
+                slot = self.free.get_nowait()
+            except Empty:
+                self.dropped += 1
+        frame_rows, object_rows = self.frame_rows[slot], self.object_rows[slot]
+        frame_rows.clear()
+        object_rows.clear()
+        add_frame, add_object = frame_rows.append, object_rows.append
+        cast_frame = self.pyds.NvDsFrameMeta.cast
+        cast_object = self.pyds.NvDsObjectMeta.cast
+        max_frames, max_objects = self.max_frames, self.max_objects
+        frame_metas = []
+
+        n_objects = 0
+        try:
+            l_frame = batch_meta.frame_meta_list
+            while l_frame is not None:
+                frame_meta = cast_frame(l_frame.data)
+                num_obj = frame_meta.num_obj_meta
+                if len(frame_metas) == max_frames:
+                    self.truncated += num_obj
+                    l_frame = l_frame.next
+                    continue
+                source = frame_meta.pad_index
+                first = n_objects
+                l_obj = frame_meta.obj_meta_list
+                while l_obj is not None:
+                    if n_objects == max_objects:
+                        self.truncated += num_obj - (n_objects - first)
+                        break
+                    obj_meta = cast_object(l_obj.data)
+                    rect = obj_meta.rect_params
+                    add_object((source, obj_meta.class_id, obj_meta.object_id, obj_meta.confidence,
+                                rect.left, rect.top, rect.width, rect.height))
+                    n_objects += 1
+                    l_obj = l_obj.next
+                add_frame((source, frame_meta.frame_num, frame_meta.buf_pts, frame_meta.ntp_timestamp,
+                           num_obj, first, n_objects - first))
+                frame_metas.append(frame_meta)
+                l_frame = l_frame.next
+        except StopIteration:
+            # Older bindings end the lists by raising StopIteration
+            pass
+
+        batch = MetaBatch(self.sequence, time.monotonic(), slot, frame_metas)
+        self.sequence += 1
+        self.frame_count += len(frame_metas)
+        self.object_count += n_objects
+        if self.probe_arrays:
+            self._fill(batch)
+        if slot != self.scratch:
+            self.ready.put(batch)
+        self.extract_time += time.perf_counter() - mark
+        return batch
+
+    def _fill(self, batch):
+        frame_rows, object_rows = self.frame_rows[batch.slot], self.object_rows[batch.slot]
+        frames = self.frames[batch.slot, :len(frame_rows)]
+        objects = self.objects[batch.slot, :len(object_rows)]
+        frames[:] = frame_rows
+        objects[:] = object_rows
+        batch.frames, batch.objects = frames, objects
+
+    def _consume(self):
+        while not self.stopped.is_set() or not self.ready.empty():
+            try:
+                batch = self.ready.get(timeout=0.1)
+            except Empty:
+                continue
+            try:
+                if batch.frames is None:
+                    self._fill(batch)
+                for consumer in self.consumers:
+                    consumer(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"Metadata consumer exception: {e}")
+            finally:
+                self.free.put(batch.slot)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def summary(self):
+        if not self.sequence:
+            return "no batches"
+        return (f"{self.sequence} batches, {self.frame_count} frames, {self.object_count} objects, "
+                f"{self.extract_time / self.sequence * 1000:.3f}ms/batch in the probe, "
+                f"{self.dropped} batches not delivered, {self.truncated} objects truncated, "
+                f"{self.errors} consumer errors")
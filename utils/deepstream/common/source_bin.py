@@ -1,13 +1,32 @@
 # source_bin.py
 
+import re
+import sys
+import struct
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import GLib, Gst
 
-from urllib.parse import urlparse
+from urllib.parse import urlparse, parse_qs
 
 file_loop = False
 
+RTP_BUFFER_SIZE   = 4 * 1024 * 1024  # udpsrc SO_RCVBUF request, capped by net.core.rmem_max
+RTP_PROBE_BYTES   = 64     # Bytes of each sniffed packet read (header and NAL header)
+RTP_SNIFF_VOTES   = 8      # Packets agreeing on a codec before auto-detection decides
+RTP_SNIFF_LIMIT   = 300    # Packets sniffed before falling back to H.264
+RTP_CLOCK_RATE    = 90000
+RTP_LATENCY       = 0      # rtpjitterbuffer latency (ms) by default: counts packets, holds none back
+
+RTP_DEPAYLOADERS = {"h264": ("rtph264depay", "h264parse", "avdec_h264"),
+                    "h265": ("rtph265depay", "h265parse", "avdec_h265")}
+# H.265 trailing, IRAP, parameter set, AUD and SEI NAL types
+H265_SNIFF_NALS = {0, 1} | set(range(16, 22)) | {32, 33, 34, 35, 39}
+JITTER_STATS = ("num-pushed", "num-lost", "num-late", "num-duplicates", "avg-jitter")
+
+# Per-source state and counters by source index, replaced when a bin is rebuilt
+rtp_sources = {}
+
 def cb_newpad(decodebin, decoder_src_pad, data):
     print("In cb_newpad\n")
     caps=decoder_src_pad.get_current_caps()
@@ -68,55 +87,148 @@ def parse_rtp_url(rtp_url):
     
     return ip, port
 
-def create_rtp_h265_source_bin(index, uri):
-    print("Creating rtp h265 bin")
+def rtp_options(rtp_url):
+    """Per-source overrides from the URL query, e.g. rtp://@:5600?codec=h265&latency=20&payload=97."""
+    options = {}
+    for key, values in parse_qs(urlparse(rtp_url).query).items():
+        key = key.replace("-", "_")
+        if key in ("codec", "decoder"):
+            options[key] = None if values[-1] == "auto" else values[-1]
+            if key == "codec" and options[key] not in (None, *RTP_DEPAYLOADERS):
+                raise ValueError(f"Unknown codec {values[-1]} in {rtp_url}")
+        elif key in ("payload", "buffer_size", "latency"):
+            options[key] = int(values[-1])
+        elif key == "low_latency":
+            options[key] = values[-1] not in ("0", "false", "no")
+        else:
+            raise ValueError(f"Unknown RTP option {key} in {rtp_url}")
+    return options
 
-    # Create a source GstBin to abstract this bin's content from the rest of the
-    # pipeline
-    bin_name="source-bin-%02d" %index
-    print(bin_name)
-    nbin=Gst.Bin.new(bin_name)
-    if not nbin:
-        sys.stderr.write(" Unable to create source bin \n")
+def set_if_supported(element, name, value):
+    # Decoder properties differ between JetPack/DeepStream releases
+    if element.find_property(name) is not None:
+        element.set_property(name, value)
+        return True
+    return False
 
-    ip, port = parse_rtp_url(uri)
-    udpsrc = Gst.ElementFactory.make("udpsrc", "udpsrc")
-    print(f"{ip} {port}")
-    udpsrc.set_property('address', ip)
-    udpsrc.set_property('port', port)
-    caps = Gst.Caps.from_string("application/x-rtp,encoding-name=H265,payload=96")
-    capsfilter = Gst.ElementFactory.make("capsfilter", "capsfilter")
-    capsfilter.set_property("caps", caps)
-    rtph265depay = Gst.ElementFactory.make("rtph265depay", "rtph265depay")
-    h265parse = Gst.ElementFactory.make("h265parse", "h265parse")
-    nvv4l2decoder = Gst.ElementFactory.make("nvv4l2decoder", "nvv4l2decoder")
+def rtp_payload_offset(data):
+    """Offset of the payload in an RTP packet, None if data is not RTP version 2."""
+    if len(data) < 12 or data[0] >> 6 != 2:
+        return None
+    offset = 12 + 4 * (data[0] & 0x0F)
+    if data[0] & 0x10 and len(data) >= offset + 4:  # Header extension
+        offset += 4 + 4 * struct.unpack_from("!H", data, offset + 2)[0]
+    return offset
 
-    # We need to create a ghost pad for the source bin which will act as a proxy
-    # for the video decoder src pad. The ghost pad will not have a target right
-    # now. Once the decode bin creates the video decoder and generates the
-    # cb_newpad callback, we will set the ghost pad target to the video decoder
-    # src pad.
-    #Gst.Bin.add(nbin, udpsrc, capsfilter, rtph265depay,h265parse,nvv4l2decoder)
-    nbin.add(udpsrc)
-    nbin.add(capsfilter)
-    nbin.add(rtph265depay)
-    nbin.add(h265parse)
-    nbin.add(nvv4l2decoder)
-    udpsrc.link(capsfilter)
-    capsfilter.link(rtph265depay)
-    rtph265depay.link(h265parse)
-    h265parse.link(nvv4l2decoder)
-    bin_ghost_pad = Gst.GhostPad.new_no_target("src",Gst.PadDirection.SRC)
-    bin_pad=nbin.add_pad(bin_ghost_pad)
-    if not bin_pad:
-        sys.stderr.write(" Failed to add ghost pad in source bin \n")
+def guess_codec(payload):
+    """"h264", "h265" or None from the NAL header at the start of an RTP payload.
+
+    Fragments and aggregates (most packets of a video stream) tell the codecs
+    apart: H.264 FU-A/STAP-A are types 28/24 in one byte, H.265 FU/AP are
+    types 49/48 in two bytes with a non-zero temporal id.
+    """
+    if len(payload) < 2 or payload[0] & 0x80:
         return None
-    decoder_src_pad=nvv4l2decoder.get_static_pad("src")
-    bin_ghost_pad.set_target(decoder_src_pad)
-    return nbin
+    h265_type = (payload[0] >> 1) & 0x3F
+    if h265_type in (48, 49) and payload[1] & 0x07 and not payload[0] & 0x01:
+        return "h265"
+    h264_type = payload[0] & 0x1F
+    if h264_type in (24, 28) or (h264_type in (1, 5, 7, 8) and payload[0] & 0x60):
+        return "h264"
+    if h265_type in H265_SNIFF_NALS and payload[1] & 0x07:
+        return "h265"
+    return None
+
+class RtpSource:
+    """Codec detection and counters of one RTP source bin.
+
+    Until the codec is known a buffer probe on the udpsrc pad sniffs the NAL
+    headers and drops the packets; once RTP_SNIFF_VOTES packets agree it links
+    the decode chain and removes itself, so the streaming thread runs no Python
+    per packet afterwards. Packet and loss counters are the stats of the
+    rtpjitterbuffer every decode chain has, available once it is linked.
+    """
+
+    def __init__(self, index, codec, link):
+        self.index = index
+        self.codec = codec or "h264"
+        self.detected = codec is not None
+        self.link = link
+        self.votes = {"h264": 0, "h265": 0}
+        self.linked = False
+        self.sniffed = 0
+        self.jitterbuffer = None
+        self.decoder = None
 
-def create_rtp_h264_source_bin(index, uri):
-    print("Creating rtp h264 bin")
+    def probe(self, pad, info, u_data):
+        buffer = info.get_buffer()
+        if not self._sniff(buffer.extract_dup(0, min(buffer.get_size(), RTP_PROBE_BYTES))):
+            return Gst.PadProbeReturn.DROP
+        if not self.linked:
+            # The decode chain failed to link, nothing can take the packets
+            return Gst.PadProbeReturn.DROP
+        return Gst.PadProbeReturn.REMOVE
+
+    def _sniff(self, data):
+        """Count a vote, True once the codec is decided and the chain link was attempted."""
+        if self.detected:
+            return True
+        offset = rtp_payload_offset(data)
+        codec = guess_codec(data[offset:offset + 2]) if offset is not None else None
+        self.sniffed += 1
+        if codec:
+            self.votes[codec] += 1
+        if codec and self.votes[codec] >= RTP_SNIFF_VOTES:
+            self.codec = codec
+        elif self.sniffed < RTP_SNIFF_LIMIT:
+            return False
+        else:
+            sys.stderr.write(f" Source {self.index}: codec not detected in {self.sniffed} packets, using h264 \n")
+        self.detected = True
+        print(f"Source {self.index}: RTP codec {self.codec}")
+        # Runs in the udpsrc streaming thread; nothing downstream is linked yet
+        self.linked = self.link(self.codec)
+        return True
+
+    def jitter_stats(self):
+        if self.jitterbuffer is None:
+            return {}
+        stats = self.jitterbuffer.get_property("stats")
+        return {name: stats.get_value(name) for name in JITTER_STATS}
+
+    def snapshot(self):
+        snapshot = {'codec': self.codec if self.detected else None}
+        snapshot.update({name[4:] if name.startswith("num-") else name.replace("-", "_"): value
+                         for name, value in self.jitter_stats().items()})
+        return snapshot
+
+    def summary(self):
+        codec = self.codec if self.detected else "not detected"
+        jitter = self.jitter_stats()
+        if not jitter:
+            return f"{codec}, no packet counters before the decode chain is linked"
+        total = jitter['num-pushed'] + jitter['num-lost']
+        return (f"{codec}, {jitter['num-pushed']} packets pushed, {jitter['num-lost']} lost "
+                f"({100.0 * jitter['num-lost'] / total if total else 0.0:.2f}%), {jitter['num-late']} late, "
+                f"{jitter['num-duplicates']} duplicates, jitter {jitter['avg-jitter'] / 1e6:.2f}ms")
+
+def create_rtp_source_bin(index, uri, codec=None, payload=None, buffer_size=RTP_BUFFER_SIZE, latency=None,
+                          decoder=None, low_latency=False, nvmm=True):
+    """RTP/UDP source bin: udpsrc ! capsfilter ! rtpjitterbuffer ! depay ! parse ! decoder.
+
+    codec None detects H.264/H.265 from the first packets. payload None accepts
+    any payload type. The rtpjitterbuffer drops packets later than latency (ms),
+    None is RTP_LATENCY, and its stats are the source's packet and loss
+    counters. decoder None uses nvv4l2decoder when
+    available and avdec otherwise; with nvmm a software decoder is followed by
+    nvvideoconvert to NVMM for nvstreammux. low_latency disables the decoder's
+    picture buffer, only for streams without B-frames. Options in the URL
+    query override the arguments. Counters are in rtp_sources[index].
+    """
+    options = dict(codec=codec, payload=payload, buffer_size=buffer_size, latency=latency,
+                   decoder=decoder, low_latency=low_latency)
+    options.update(rtp_options(uri))
+    print("Creating rtp %s bin" % (options['codec'] or "auto"))
 
     # Create a source GstBin to abstract this bin's content from the rest of the
     # pipeline
@@ -125,43 +237,107 @@ def create_rtp_h264_source_bin(index, uri):
     nbin=Gst.Bin.new(bin_name)
     if not nbin:
         sys.stderr.write(" Unable to create source bin \n")
+        return None
 
     ip, port = parse_rtp_url(uri)
-    udpsrc = Gst.ElementFactory.make("udpsrc", "udpsrc")
+    udpsrc = Gst.ElementFactory.make("udpsrc", "udpsrc-%02d" % index)
+    if not udpsrc:
+        sys.stderr.write(" Unable to create udpsrc \n")
+        return None
     print(f"{ip} {port}")
     udpsrc.set_property('address', ip)
     udpsrc.set_property('port', port)
-    caps = Gst.Caps.from_string("application/x-rtp,encoding-name=H264,payload=96")
-    capsfilter = Gst.ElementFactory.make("capsfilter", "capsfilter")
-    capsfilter.set_property("caps", caps)
-    rtph264depay = Gst.ElementFactory.make("rtph264depay", "rtph264depay")
-    h264parse = Gst.ElementFactory.make("h264parse", "h264parse")
-    nvv4l2decoder = Gst.ElementFactory.make("nvv4l2decoder", "nvv4l2decoder")
-
-    # We need to create a ghost pad for the source bin which will act as a proxy
-    # for the video decoder src pad. The ghost pad will not have a target right
-    # now. Once the decode bin creates the video decoder and generates the
-    # cb_newpad callback, we will set the ghost pad target to the video decoder
-    # src pad.
-    #Gst.Bin.add(nbin, udpsrc, capsfilter, rtph265depay,h265parse,nvv4l2decoder)
+    if options['buffer_size']:
+        udpsrc.set_property('buffer-size', options['buffer_size'])
     nbin.add(udpsrc)
-    nbin.add(capsfilter)
-    nbin.add(rtph264depay)
-    nbin.add(h264parse)
-    nbin.add(nvv4l2decoder)
-    udpsrc.link(capsfilter)
-    capsfilter.link(rtph264depay)
-    rtph264depay.link(h264parse)
-    h264parse.link(nvv4l2decoder)
+
+    # The ghost pad gets the decoder (or converter) src pad as target once the
+    # decode chain is linked, right away or after the codec is detected.
     bin_ghost_pad = Gst.GhostPad.new_no_target("src",Gst.PadDirection.SRC)
     bin_pad=nbin.add_pad(bin_ghost_pad)
     if not bin_pad:
         sys.stderr.write(" Failed to add ghost pad in source bin \n")
         return None
-    decoder_src_pad=nvv4l2decoder.get_static_pad("src")
-    bin_ghost_pad.set_target(decoder_src_pad)
+
+    def link(codec):
+        return link_rtp_decoder(nbin, udpsrc, index, codec, options, nvmm, source)
+
+    source = RtpSource(index, options['codec'], link)
+    rtp_sources[index] = source
+    if source.detected:
+        source.linked = link(source.codec)
+        if not source.linked:
+            return None
+    else:
+        udpsrc.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, source.probe, 0)
     return nbin
 
+def link_rtp_decoder(nbin, udpsrc, index, codec, options, nvmm, source):
+    """Add and link the decode chain behind udpsrc, target the bin ghost pad at its end."""
+    depay_name, parse_name, software_name = RTP_DEPAYLOADERS[codec]
+    decoder_name = options['decoder']
+    if decoder_name is None:
+        decoder_name = "nvv4l2decoder" if Gst.ElementFactory.find("nvv4l2decoder") else software_name
+    elif decoder_name == "software":
+        decoder_name = software_name
+    factories = [("capsfilter", "rtp-caps"), ("rtpjitterbuffer", "rtp-jitterbuffer")]
+    factories += [(depay_name, depay_name), (parse_name, parse_name), (decoder_name, "decoder")]
+    if decoder_name != "nvv4l2decoder" and nvmm:
+        factories += [("nvvideoconvert", "convert"), ("capsfilter", "nvmm-caps")]
+
+    chain = []
+    for factory, name in factories:
+        element = Gst.ElementFactory.make(factory, "%s-%02d" % (name, index))
+        if not element:
+            sys.stderr.write(" Unable to create %s \n" % factory)
+            return False
+        chain.append(element)
+    elements = {name: element for (factory, name), element in zip(factories, chain)}
+
+    caps = "application/x-rtp,media=video,clock-rate=%d,encoding-name=%s" % (RTP_CLOCK_RATE, codec.upper())
+    if options['payload'] is not None:
+        caps += ",payload=%d" % options['payload']
+    elements["rtp-caps"].set_property("caps", Gst.Caps.from_string(caps))
+    # Always present for the per-source counters, with RTP_LATENCY it holds nothing back
+    jitterbuffer = elements["rtp-jitterbuffer"]
+    latency = options['latency']
+    jitterbuffer.set_property("latency", RTP_LATENCY if latency is None else latency)
+    jitterbuffer.set_property("drop-on-latency", True)
+    # Lost packets become events, the depayloader marks the next frame discont
+    jitterbuffer.set_property("do-lost", True)
+    source.jitterbuffer = jitterbuffer
+    decoder = elements["decoder"]
+    if decoder_name == "nvv4l2decoder":
+        set_if_supported(decoder, "enable-max-performance", True)
+        if options['low_latency']:
+            # Output each frame as soon as it is decoded, no reordering
+            set_if_supported(decoder, "disable-dpb", True)
+    elif not set_if_supported(decoder, "thread-type", 2):
+        # Frame threads add one frame of delay each, slice threads do not
+        set_if_supported(decoder, "max-threads", 1)
+    source.decoder = decoder
+    if "nvmm-caps" in elements:
+        elements["nvmm-caps"].set_property("caps", Gst.Caps.from_string("video/x-raw(memory:NVMM)"))
+
+    previous = udpsrc
+    for element in chain:
+        nbin.add(element)
+        if not previous.link(element):
+            sys.stderr.write(" Unable to link %s to %s \n" % (previous.get_name(), element.get_name()))
+            return False
+        previous = element
+    nbin.get_static_pad("src").set_target(chain[-1].get_static_pad("src"))
+    # No-op while the bin is being built, starts the chain when linked after detection
+    for element in chain:
+        element.sync_state_with_parent()
+    return True
+
+def create_rtp_h265_source_bin(index, uri, **options):
+    return create_rtp_source_bin(index, uri, codec="h265", **options)
+
+def create_rtp_h264_source_bin(index, uri, **options):
+    return create_rtp_source_bin(index, uri, codec="h264", **options)
+
 def create_source_bin(index,uri):
     print("Creating source bin")
 
@@ -202,4 +378,47 @@ def create_source_bin(index,uri):
     if not bin_pad:
         sys.stderr.write(" Failed to add ghost pad in source bin \n")
         return None
-    return nbin
\ No newline at end of file
+    return nbin
+
+RTP_LOOPBACK_ENCODERS = {
+    "h264": "x264enc tune=zerolatency speed-preset=ultrafast key-int-max=30 ! rtph264pay mtu=1200",
+    "h265": "x265enc tune=zerolatency speed-preset=ultrafast key-int-max=30 ! rtph265pay mtu=1200",
+}
+
+if __name__ == "__main__":
+    # Loopback check with software codecs, no DeepStream needed:
+    # python3 ./utils/deepstream/common/source_bin.py [h264|h265] [seconds] [drop probability] [latency ms]
+    # The receiver is built like a deepstream.py source with the default flags, only the decoder is software
+    codec = sys.argv[1] if len(sys.argv) > 1 else "h264"
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    drop = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    latency = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    port = 5650
+    Gst.init(None)
+    sender = Gst.parse_launch(
+        "videotestsrc is-live=true ! video/x-raw,width=640,height=360,framerate=30/1 ! %s ! "
+        "identity drop-probability=%f ! udpsink host=127.0.0.1 port=%d" % (RTP_LOOPBACK_ENCODERS[codec], drop, port))
+    receiver = Gst.Pipeline()
+    source_bin = create_rtp_source_bin(0, "rtp://127.0.0.1:%d" % port, codec=codec, latency=latency,
+                                       decoder="software", nvmm=False)
+    sink = Gst.ElementFactory.make("fakesink", "sink")
+    sink.set_property("sync", False)
+    receiver.add(source_bin)
+    receiver.add(sink)
+    source_bin.get_static_pad("src").link(sink.get_static_pad("sink"))
+    frames = [0]
+
+    def count_frames(pad, info, u_data):
+        frames[0] += 1
+        return Gst.PadProbeReturn.OK
+
+    sink.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER, count_frames, 0)
+    receiver.set_state(Gst.State.PLAYING)
+    sender.set_state(Gst.State.PLAYING)
+    loop = GLib.MainLoop()
+    GLib.timeout_add(int(seconds * 1000), loop.quit)
+    loop.run()
+    sender.set_state(Gst.State.NULL)
+    receiver.set_state(Gst.State.NULL)
+    print(f"Decoded {frames[0]} frames in {seconds:.1f}s")
+    print(f"Source 0: {rtp_sources[0].summary()}")
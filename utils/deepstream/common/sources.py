@@ -0,0 +1,288 @@
+import os
+import json
+import math
+import time
+import threading
+import socketserver
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+from common.source_bin import create_rtp_source_bin, create_source_bin, rtp_sources
+
+SOURCE_COMMAND_TIMEOUT = 5.0   # Seconds a control command may wait for the main loop
+SOURCE_WATCHDOG_MS     = 500   # Period of the stalled-source check
+SOURCE_BACKOFF_MAX     = 60.0  # Longest wait (s) between restarts of a source that does not connect
+
+class Source:
+    """One source bin and its reconnect history."""
+
+    def __init__(self, index, uri, codec, bin):
+        self.index = index
+        self.uri = uri
+        self.codec = codec
+        self.bin = bin
+        self.started = time.monotonic()  # Added or last restarted
+        self.connected = False           # A frame arrived since started
+        self.restarts = 0
+        self.failures = 0                # Restarts in a row that brought no frame
+        self.connect_time = None         # Seconds from start to the first frame, last connection
+        self.connect_times = []
+        self.rtp = rtp_sources.get(index) if uri.startswith("rtp://") else None
+
+    def is_live(self):
+        return self.uri.startswith("rtp://") or self.uri.startswith("rtsp://")
+
+    def info(self):
+        info = {'index': self.index, 'uri': self.uri, 'codec': self.codec, 'connected': self.connected,
+                'restarts': self.restarts, 'connect_time': self.connect_time}
+        if self.rtp:
+            info['rtp'] = self.rtp.snapshot()
+        return info
+
+class SourceManager:
+    """Source bins on nvstreammux request pads, added, removed and restarted while PLAYING.
+
+    Pad sink_N carries source N, a removed source frees its pad index for the
+    next add. The tiler grid follows the highest index in use. The nvstreammux
+    and primary inference batch sizes stay at max_sources: the legacy
+    nvstreammux cannot renegotiate its batch size while PLAYING, and the
+    engine is built for it. Partial batches are pushed on batched-push-timeout.
+
+    Pipeline changes run on the GLib main loop: control commands are posted
+    there with GLib.idle_add. on_frame() is called by the pad probe (streaming
+    thread) and only clears a flag.
+    """
+
+    def __init__(self, pipeline, streammux, tiler=None, max_sources=1, codec="h264", perf_data=None, timeout=0.0,
+                 rtp_options=None):
+        self.pipeline = pipeline
+        self.streammux = streammux
+        self.tiler = tiler
+        self.codec = codec
+        self.rtp_options = rtp_options or {}  # create_rtp_source_bin() keyword arguments
+        self.perf_data = perf_data
+        self.timeout = timeout
+        self.slots = [None] * max_sources
+        self.waiting = {}  # index -> Source waiting for its first frame
+        self.server = None
+
+    def _make_bin(self, index, uri, codec):
+        if uri.startswith("rtp://"):
+            return create_rtp_source_bin(index, uri, None if codec == "auto" else codec, **self.rtp_options)
+        return create_source_bin(index, uri)
+
+    def add(self, uri, codec=None, index=None):
+        """Create and link a source bin, returns its index (the nvstreammux pad and stream number)."""
+        codec = codec or self.codec
+        if index is None:
+            if None not in self.slots:
+                raise ValueError(f"All {len(self.slots)} sources in use")
+            index = self.slots.index(None)
+        elif self.slots[index] is not None:
+            raise ValueError(f"Source {index} in use")
+
+        print("Creating source_bin ", index, " \n ")
+        source_bin = self._make_bin(index, uri, codec)
+        if not source_bin:
+            raise RuntimeError(f"Unable to create source bin for {uri}")
+        self.pipeline.add(source_bin)
+        padname = "sink_%u" % index
+        sinkpad = self.streammux.get_static_pad(padname) or self.streammux.request_pad_simple(padname)
+        if not sinkpad:
+            self.pipeline.remove(source_bin)
+            raise RuntimeError(f"Unable to create streammux pad {padname}")
+        srcpad = source_bin.get_static_pad("src")
+        if not srcpad or srcpad.link(sinkpad) != Gst.PadLinkReturn.OK:
+            self.pipeline.remove(source_bin)
+            self.streammux.release_request_pad(sinkpad)
+            raise RuntimeError(f"Unable to link source bin {index} to {padname}")
+
+        source = Source(index, uri, codec, source_bin)
+        self.slots[index] = source
+        self.waiting[index] = source
+        # Follows the pipeline state, a no-op before PLAYING
+        source_bin.sync_state_with_parent()
+        self._layout()
+        return index
+
+    def remove(self, index):
+        source = self._source(index)
+        self.waiting.pop(index, None)
+        state_return = source.bin.set_state(Gst.State.NULL)
+        if state_return == Gst.StateChangeReturn.ASYNC:
+            source.bin.get_state(Gst.CLOCK_TIME_NONE)
+        elif state_return == Gst.StateChangeReturn.FAILURE:
+            raise RuntimeError(f"Unable to stop source {index}")
+        # Unblock nvstreammux on the pad before releasing it for reuse
+        sinkpad = self.streammux.get_static_pad("sink_%u" % index)
+        if sinkpad:
+            sinkpad.send_event(Gst.Event.new_flush_stop(False))
+            self.streammux.release_request_pad(sinkpad)
+        self.pipeline.remove(source.bin)
+        self.slots[index] = None
+        self._layout()
+        return source
+
+    def restart(self, index, log=True):
+        """Rebuild a source bin on the same pad, the time to its first frame is recorded."""
+        source = self.remove(index)
+        self.add(source.uri, source.codec, index)
+        restarted = self.slots[index]
+        restarted.restarts = source.restarts + 1
+        restarted.failures = source.failures if source.connected else source.failures + 1
+        restarted.connect_times = source.connect_times
+        if log:
+            print(f"Source {index} restarted ({restarted.restarts}): {source.uri}")
+        return index
+
+    def on_frame(self, index):
+        """Pad probe hook: the first frame after an add/restart completes the connection."""
+        if self.waiting:
+            source = self.waiting.pop(index, None)
+            if source is not None:
+                source.connected = True
+                source.connect_time = time.monotonic() - source.started
+                source.connect_times.append(source.connect_time)
+                if source.failures:
+                    print(f"Source {index} connected after {source.failures} retries")
+                    source.failures = 0
+
+    def set_tiler(self, tiler):
+        self.tiler = tiler
+        self._layout()
+
+    def _source(self, index):
+        if not 0 <= index < len(self.slots) or self.slots[index] is None:
+            raise ValueError(f"No source {index}")
+        return self.slots[index]
+
+    def _layout(self):
+        active = [source.index for source in self.slots if source is not None]
+        if self.tiler:
+            # Tiles are placed by source index, cover the highest one in use
+            tiles = max(active) + 1 if active else 1
+            rows = int(math.sqrt(tiles))
+            self.tiler.set_property("rows", rows)
+            self.tiler.set_property("columns", int(math.ceil((1.0 * tiles) / rows)))
+
+    def _watchdog(self):
+        # Restart live sources that stopped delivering frames. A source that does
+        # not connect is retried with exponential backoff and logged once.
+        now = time.monotonic()
+        for source in list(self.slots):
+            if source is None or not source.is_live():
+                continue
+            last = source.started
+            if self.perf_data and source.connected:
+                stream = self.perf_data.all_stream_fps.get("stream{0}".format(source.index))
+                if stream and stream.last_frame_time:
+                    last = max(last, stream.last_frame_time)
+            wait = min(self.timeout * 2 ** min(source.failures, 16), max(self.timeout, SOURCE_BACKOFF_MAX))
+            if now - last > wait:
+                if source.connected:
+                    print(f"Source {source.index} stalled for {now - last:.1f}s")
+                elif not source.failures:
+                    print(f"Source {source.index} not connected after {now - last:.1f}s, "
+                          f"retrying with backoff up to {max(self.timeout, SOURCE_BACKOFF_MAX):.0f}s: {source.uri}")
+                try:
+                    self.restart(source.index, log=source.connected)
+                except (RuntimeError, ValueError) as e:
+                    print(f"Source {source.index} restart failed: {e}")
+        return True
+
+    def start_watchdog(self):
+        if self.timeout > 0:
+            GLib.timeout_add(SOURCE_WATCHDOG_MS, self._watchdog)
+
+    def execute(self, line):
+        """Run one control command: add URI [h264|h265|auto] | remove N | restart N | list."""
+        words = line.split()
+        if not words:
+            raise ValueError("Empty command")
+        command, arguments = words[0], words[1:]
+        if command == "add" and arguments:
+            codec = arguments[1] if len(arguments) > 1 else None
+            if codec not in (None, "h264", "h265", "auto"):
+                raise ValueError(f"Unknown codec {codec}")
+            return {'added': self.add(arguments[0], codec)}
+        if command in ("remove", "restart") and len(arguments) == 1:
+            index = int(arguments[0])
+            if command == "remove":
+                self.remove(index)
+                return {'removed': index}
+            return {'restarted': self.restart(index)}
+        if command == "list":
+            return {'sources': self.list()}
+        raise ValueError(f"Unknown command: {line.strip()}")
+
+    def call(self, line):
+        """Run a command on the main loop from another thread and wait for its reply."""
+        done = threading.Event()
+        reply = {}
+
+        def run():
+            try:
+                reply.update(self.execute(line))
+            except Exception as e:
+                reply['error'] = str(e)
+            done.set()
+            return False
+
+        GLib.idle_add(run)
+        if not done.wait(SOURCE_COMMAND_TIMEOUT):
+            return {'error': "timeout"}
+        return reply
+
+    def list(self):
+        sources = []
+        for source in self.slots:
+            if source is None:
+                continue
+            info = source.info()
+            if self.perf_data:
+                info['fps'] = self.perf_data.all_stream_fps["stream{0}".format(source.index)].get_fps()
+            sources.append(info)
+        return sources
+
+    def serve(self, path):
+        """Accept line commands on a Unix stream socket, one JSON reply line per command."""
+        manager = self
+
+        class CommandHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    line = line.decode("utf-8", "replace").strip()
+                    if line:
+                        self.wfile.write((json.dumps(manager.call(line)) + "\n").encode("utf-8"))
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socketserver.ThreadingUnixStreamServer(path, CommandHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="source-control", daemon=True).start()
+        print(f"Source control on {path}: add URI [h264|h265|auto], remove N, restart N, list")
+        return self.server
+
+    def close(self):
+        if self.server:
+            path = self.server.server_address
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if isinstance(path, str) and os.path.exists(path):
+                os.unlink(path)
+
+    def summary(self):
+        lines = []
+        for source in self.slots:
+            if source is None:
+                continue
+            times = source.connect_times
+            connect = (f"connect {min(times):.2f}/{sum(times) / len(times):.2f}/{max(times):.2f}s min/mean/max"
+                       if times else "never connected")
+            lines.append(f"Source {source.index} {source.uri}: {source.restarts} restarts, {connect}")
+            if source.rtp:
+                lines.append(f"Source {source.index} RTP: {source.rtp.summary()}")
+        return "\n".join(lines)
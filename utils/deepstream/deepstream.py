@@ -1,32 +1,28 @@
 #!/usr/bin/env python3
 
 import sys
+import os
 sys.path.append('./')
+# utils/, for the shared pipeline package (also used by common/)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 from pathlib import Path
 from os import environ
 
 import configparser
 import argparse
 
-import gi
-gi.require_version('Gst', '1.0')
-from gi.repository import GLib, Gst
-
 from ctypes import *
 import time
 import sys
 import math
 import platform
-from common.platform_info import PlatformInfo
-from common.bus_call import bus_call
 from common.FPS import PERF_DATA
-from common.source_bin import create_rtp_h265_source_bin
-from common.source_bin import create_rtp_h264_source_bin
-from common.source_bin import create_source_bin
+from common.meta import BatchMetaExtractor
 import re
 
-import pyds
-import os
+from pipeline.startup import StartupTimeline
+
+startup = StartupTimeline("deepstream")
 
 if "DISPLAY" not in os.environ:
     os.environ["DISPLAY"] = ":0"
@@ -34,9 +30,38 @@ if "DISPLAY" not in os.environ:
 no_display = False
 silent = False
 
-codec_h264 = True
+input_codec = "h264"
+rtp_options = {}
 perf_data = None
+extractor = None
+sources = None
+max_sources = 0
+control_path = None
+source_timeout = 0.0
 measure_latency = False
+startup_log = None
+metrics_port = None
+
+def load_dependencies():
+    """Import GStreamer, the DeepStream bindings and CUDA once the arguments are valid,
+    so --help and argument errors do not pay for them."""
+    global Gst, GLib, pyds, PlatformInfo, bus_call, SourceManager
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import GLib, Gst
+    import pyds
+    from common.platform_info import PlatformInfo
+    from common.bus_call import bus_call
+    from common.sources import SourceManager
+    startup.mark("imports")
+
+def first_frame_probe(pad, info, u_data):
+    # One-shot: the first buffer reaching the sink completes the startup timeline
+    startup.mark("first_frame")
+    print(startup.report())
+    if startup_log:
+        startup.export(startup_log)
+    return Gst.PadProbeReturn.REMOVE
 
 MAX_DISPLAY_LEN=64
 PGIE_CLASS_ID_VEHICLE = 0
@@ -54,12 +79,9 @@ OSD_DISPLAY_TEXT= 1
 
 DEEPSTREAM_TEST_PGIE_CONFIG = "dstest3_pgie_config.txt"
 
-# pgie_src_pad_buffer_probe  will extract metadata received on tiler sink pad
-# and update params for drawing rectangle, object information etc.
+# pgie_src_pad_buffer_probe  will extract metadata received on the pgie src pad
+# into preallocated arrays, the consumer thread prints per-frame object counts
 def pgie_src_pad_buffer_probe(pad, info, u_data):
-    frame_number = 0
-    num_rects = 0
-    got_fps = False
     gst_buffer = info.get_buffer()
     if not gst_buffer:
         print("Unable to get GstBuffer ")
@@ -77,59 +99,33 @@ def pgie_src_pad_buffer_probe(pad, info, u_data):
         if num_sources_in_batch == 0:
             print("Unable to get number of sources in GstBuffer for latency measurement")
 
-    batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
-    l_frame = batch_meta.frame_meta_list
-    while l_frame is not None:
-        try:
-            # Note that l_frame.data needs a cast to pyds.NvDsFrameMeta
-            # The casting is done by pyds.NvDsFrameMeta.cast()
-            # The casting also keeps ownership of the underlying memory
-            # in the C code, so the Python garbage collector will leave
-            # it alone.
-            frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
-        except StopIteration:
-            break
-
-        frame_number=frame_meta.frame_num
-        l_obj=frame_meta.obj_meta_list
-        num_rects = frame_meta.num_obj_meta
-        obj_counter = {
-        PGIE_CLASS_ID_VEHICLE:0,
-        PGIE_CLASS_ID_PERSON:0,
-        PGIE_CLASS_ID_BICYCLE:0,
-        PGIE_CLASS_ID_ROADSIGN:0
-        }
-        while l_obj is not None:
-            try: 
-                # Casting l_obj.data to pyds.NvDsObjectMeta
-                obj_meta=pyds.NvDsObjectMeta.cast(l_obj.data)
-            except StopIteration:
-                break
-            obj_counter[obj_meta.class_id] += 1
-            try: 
-                l_obj=l_obj.next
-            except StopIteration:
-                break
-        if not silent:
-            print("Frame Number=", frame_number, "Number of Objects=",num_rects,"Vehicle_count=",obj_counter[PGIE_CLASS_ID_VEHICLE],"Person_count=",obj_counter[PGIE_CLASS_ID_PERSON])
-
-        # Update frame rate through this probe
-        stream_index = "stream{0}".format(frame_meta.pad_index)
-        global perf_data
-        perf_data.update_fps(stream_index)
+    # One pass over the frame and object metas, the streaming thread does nothing else
+    batch = extractor.extract(pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer)))
 
-        try:
-            l_frame=l_frame.next
-        except StopIteration:
-            break
+    # Update frame rate through this probe
+    global perf_data
+    for frame_meta in batch.frame_metas:
+        perf_data.update_fps("stream{0}".format(frame_meta.pad_index), frame_meta.ntp_timestamp)
+        sources.on_frame(frame_meta.pad_index)
 
     return Gst.PadProbeReturn.OK
 
+def print_batch(batch):
+    # Metadata consumer, runs off the streaming thread
+    for index, frame in enumerate(batch.frames):
+        obj_counter = batch.class_counts(index)
+        print("Frame Number=", frame['frame_num'], "Number of Objects=", frame['num_obj'],
+              "Vehicle_count=", obj_counter[PGIE_CLASS_ID_VEHICLE], "Person_count=", obj_counter[PGIE_CLASS_ID_PERSON])
+
 def main(args, requested_pgie=None, config=None, disable_probe=False):
     global perf_data
-    perf_data = PERF_DATA(len(args))
-
-    number_sources=len(args)
+    global extractor
+    global sources
+    load_dependencies()
+    number_sources=max(max_sources, len(args))
+    perf_data = PERF_DATA(number_sources)
+    if metrics_port is not None:
+        perf_data.serve(metrics_port)
 
     platform_info = PlatformInfo()
     # Standard GStreamer initialization
@@ -154,31 +150,17 @@ def main(args, requested_pgie=None, config=None, disable_probe=False):
 
     pipeline.add(streammux)
 
-    for i in range(number_sources):
-        print("Creating source_bin ",i," \n ")
-        uri_name=args[i]
+    # Source bins on nvstreammux pads, more can be added while playing (--control)
+    sources = SourceManager(pipeline, streammux, max_sources=number_sources,
+                            codec=input_codec, perf_data=perf_data, timeout=source_timeout,
+                            rtp_options=rtp_options)
+    for uri_name in args:
         if uri_name.find("rtsp://") == 0 or uri_name.find("rtp://") == 0:
             is_live = True
-
-        if uri_name.find("rtp://") == 0:
-            if codec_h264:
-                source_bin = create_rtp_h264_source_bin(i, uri_name)
-            else:
-                source_bin = create_rtp_h265_source_bin(i, uri_name)
-        else:
-            source_bin = create_source_bin(i, uri_name)
-
-        if not source_bin:
-            sys.stderr.write("Unable to create source bin \n")
-        pipeline.add(source_bin)
-        padname="sink_%u" %i
-        sinkpad= streammux.request_pad_simple(padname) 
-        if not sinkpad:
-            sys.stderr.write("Unable to create sink pad bin \n")
-        srcpad=source_bin.get_static_pad("src")
-        if not srcpad:
-            sys.stderr.write("Unable to create src pad bin \n")
-        srcpad.link(sinkpad)
+        try:
+            sources.add(uri_name)
+        except (RuntimeError, ValueError) as e:
+            sys.stderr.write(f"Unable to add source {uri_name}: {e}\n")
 
     queue1=Gst.ElementFactory.make("queue","queue1")
     queue2=Gst.ElementFactory.make("queue","queue2")
@@ -285,10 +267,8 @@ def main(args, requested_pgie=None, config=None, disable_probe=False):
     if(pgie_batch_size != number_sources):
         print("WARNING: Overriding infer-config batch-size",pgie_batch_size," with number of sources ", number_sources," \n")
         pgie.set_property("batch-size",number_sources)
-    tiler_rows=int(math.sqrt(number_sources))
-    tiler_columns=int(math.ceil((1.0*number_sources)/tiler_rows))
-    tiler.set_property("rows",tiler_rows)
-    tiler.set_property("columns",tiler_columns)
+    # nvstreammux and primary inference are sized for --max-sources, only the tiler grid follows the sources
+    sources.set_tiler(tiler)
     tiler.set_property("width", TILED_OUTPUT_WIDTH)
     tiler.set_property("height", TILED_OUTPUT_HEIGHT)
 
@@ -323,6 +303,11 @@ def main(args, requested_pgie=None, config=None, disable_probe=False):
     nvosd.link(queue5)
     queue5.link(sink)   
 
+    sink_pad = sink.get_static_pad("sink")
+    if sink_pad:
+        sink_pad.add_probe(Gst.PadProbeType.BUFFER, first_frame_probe, 0)
+    startup.mark("pipeline")
+
     # create an event loop and feed gstreamer bus mesages to it
     loop = GLib.MainLoop()
     bus = pipeline.get_bus()
@@ -333,6 +318,10 @@ def main(args, requested_pgie=None, config=None, disable_probe=False):
         sys.stderr.write(" Unable to get src pad \n")
     else:
         if not disable_probe:
+            extractor = BatchMetaExtractor(pyds, max_frames=number_sources)
+            if not silent:
+                extractor.add_consumer(print_batch)
+            extractor.start()
             pgie_src_pad.add_probe(Gst.PadProbeType.BUFFER, pgie_src_pad_buffer_probe, 0)
             # perf callback function to print fps every 5 sec
             GLib.timeout_add(5000, perf_data.perf_print_callback)
@@ -354,6 +343,12 @@ def main(args, requested_pgie=None, config=None, disable_probe=False):
     
     # start play back and listed to events
     pipeline.set_state(Gst.State.PLAYING)
+    startup.mark("playing")
+    if not disable_probe:
+        # Frames are seen by the probe only, nvdslogger runs go without the watchdog and connect times
+        sources.start_watchdog()
+    if control_path:
+        sources.serve(control_path)
     try:
       loop.run()
     except:
@@ -362,6 +357,12 @@ def main(args, requested_pgie=None, config=None, disable_probe=False):
     # cleanup
     print("Exiting app\n")
     pipeline.set_state(Gst.State.NULL)
+    perf_data.close()
+    sources.close()
+    print(sources.summary())
+    if extractor:
+        extractor.close()
+        print(f"Metadata: {extractor.summary()}")
 
 def parse_args():
 
@@ -378,9 +379,37 @@ def parse_args():
     )
     parser.add_argument(
         "--input-codec", 
-        type=str, choices=["h264", "h265"], 
+        type=str, choices=["h264", "h265", "auto"], 
         default="h264", 
-        help="Input codec: h264 or h265 (default: h264)"
+        help="Input codec of rtp:// sources: h264, h265 or auto (detected from the packets, default: h264)"
+    )
+    parser.add_argument(
+        "--rtp-buffer-size",
+        type=int,
+        default=None,
+        dest='rtp_buffer_size',
+        help="UDP receive buffer of rtp:// sources in bytes, capped by net.core.rmem_max (default: 4 MiB)",
+    )
+    parser.add_argument(
+        "--rtp-latency",
+        type=int,
+        default=None,
+        dest='rtp_latency',
+        help="Latency of the rtpjitterbuffer in ms, later packets are dropped (default: 0, it only counts packets)",
+    )
+    parser.add_argument(
+        "--rtp-payload",
+        type=int,
+        default=None,
+        dest='rtp_payload',
+        help="Accept only this RTP payload type (default: any)",
+    )
+    parser.add_argument(
+        "--low-latency",
+        action="store_true",
+        default=False,
+        dest='low_latency',
+        help="Disable the decoder picture buffer of rtp:// sources, for streams without B-frames",
     )
     parser.add_argument(
         "-c",
@@ -417,6 +446,39 @@ def parse_args():
         dest='disable_probe',
         help="Disable the probe function and use nvdslogger for FPS",
     )
+    parser.add_argument(
+        "--max-sources",
+        type=int,
+        default=0,
+        dest='max_sources',
+        help="Sources that can be connected at once, inputs added at runtime included (default: number of inputs)",
+    )
+    parser.add_argument(
+        "--control",
+        default=None,
+        metavar="SOCKET",
+        help="Unix socket accepting 'add URI [h264|h265]', 'remove N', 'restart N' and 'list' while playing",
+    )
+    parser.add_argument(
+        "--source-timeout",
+        type=float,
+        default=0.0,
+        dest='source_timeout',
+        help="Restart a live source after this many seconds without frames (0: never)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        dest='metrics_port',
+        help="Serve per-stream FPS, jitter and latency on http://127.0.0.1:PORT/metrics (Prometheus) and /metrics.json",
+    )
+    parser.add_argument(
+        "--startup-log",
+        default=None,
+        dest='startup_log',
+        help="Append the startup timeline (JSON lines) to this file",
+    )
     parser.add_argument(
         "-s",
         "--silent",
@@ -439,15 +501,27 @@ def parse_args():
     global no_display
     global silent
     global file_loop
-    global codec_h264
-
+    global input_codec
+    global rtp_options
+    global startup_log
+    global metrics_port
+    global max_sources
+    global control_path
+    global source_timeout
+
+    startup.mark("args")
+    startup_log = args.startup_log
+    metrics_port = args.metrics_port
+    max_sources = args.max_sources
+    control_path = args.control
+    source_timeout = args.source_timeout
     no_display = args.no_display
     silent = args.silent
     file_loop = args.file_loop
-    if args.input_codec == "h264":
-        codec_h264 = True
-    else:
-        codec_h264 = False
+    input_codec = args.input_codec
+    rtp_options = {'payload': args.rtp_payload, 'latency': args.rtp_latency, 'low_latency': args.low_latency}
+    if args.rtp_buffer_size is not None:
+        rtp_options['buffer_size'] = args.rtp_buffer_size
 
     if config and not pgie or pgie and not config:
         sys.stderr.write ("\nEither pgie or configfile is missing. Please specify both! Exiting...\n\n\n\n")
@@ -4,28 +4,26 @@ import sys
 sys.path.append('./')
 import platform
 import os
+# utils/, for the shared pipeline package (also used by common/)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 import configparser
 import argparse
 
-import gi
-gi.require_version('Gst', '1.0')
-from gi.repository import GLib, Gst
-
 import math
-from common.platform_info import PlatformInfo
-from common.bus_call import bus_call
 from common.FPS import PERF_DATA
-from common.source_bin import create_rtp_h265_source_bin
-from common.source_bin import create_rtp_h264_source_bin
-from common.source_bin import create_source_bin
-import pyds
-import os
+from common.meta import BatchMetaExtractor
+from pipeline.startup import StartupTimeline
+
+startup = StartupTimeline("deepstream_NvDCF")
 
 if "DISPLAY" not in os.environ:
     os.environ["DISPLAY"] = ":0"
 
 no_display = False
 perf_data = None
+extractor = None
+startup_log = None
+metrics_port = None
 PGIE_CLASS_ID_VEHICLE = 0
 PGIE_CLASS_ID_BICYCLE = 1
 PGIE_CLASS_ID_PERSON = 2
@@ -36,16 +34,31 @@ TILED_OUTPUT_HEIGHT=1080
 OSD_PROCESS_MODE= 0
 OSD_DISPLAY_TEXT= 1
 
+def load_dependencies():
+    """Import GStreamer, the DeepStream bindings and CUDA once the arguments are valid,
+    so --help and argument errors do not pay for them."""
+    global Gst, GLib, pyds, PlatformInfo, bus_call
+    global create_rtp_h265_source_bin, create_rtp_h264_source_bin, create_source_bin
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import GLib, Gst
+    import pyds
+    from common.platform_info import PlatformInfo
+    from common.bus_call import bus_call
+    from common.source_bin import create_rtp_h265_source_bin
+    from common.source_bin import create_rtp_h264_source_bin
+    from common.source_bin import create_source_bin
+    startup.mark("imports")
+
+def first_frame_probe(pad, info, u_data):
+    # One-shot: the first buffer reaching the sink completes the startup timeline
+    startup.mark("first_frame")
+    print(startup.report())
+    if startup_log:
+        startup.export(startup_log)
+    return Gst.PadProbeReturn.REMOVE
+
 def osd_sink_pad_buffer_probe(pad,info,u_data):
-    frame_number=0
-    #Intiallizing object counter with 0.
-    obj_counter = {
-        PGIE_CLASS_ID_VEHICLE:0,
-        PGIE_CLASS_ID_PERSON:0,
-        PGIE_CLASS_ID_BICYCLE:0,
-        PGIE_CLASS_ID_ROADSIGN:0
-    }
-    num_rects=0
     gst_buffer = info.get_buffer()
     if not gst_buffer:
         print("Unable to get GstBuffer ")
@@ -55,37 +68,15 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
     # Note that pyds.gst_buffer_get_nvds_batch_meta() expects the
     # C address of gst_buffer as input, which is obtained with hash(gst_buffer)
     batch_meta = pyds.gst_buffer_get_nvds_batch_meta(hash(gst_buffer))
-    l_frame = batch_meta.frame_meta_list
-    while l_frame is not None:
-        try:
-            # Note that l_frame.data needs a cast to pyds.NvDsFrameMeta
-            # The casting is done by pyds.NvDsFrameMeta.cast()
-            # The casting also keeps ownership of the underlying memory
-            # in the C code, so the Python garbage collector will leave
-            # it alone.
-            frame_meta = pyds.NvDsFrameMeta.cast(l_frame.data)
-        except StopIteration:
-            break
-
-        frame_number=frame_meta.frame_num
-        num_rects = frame_meta.num_obj_meta
-        l_obj=frame_meta.obj_meta_list
-        while l_obj is not None:
-            try:
-                # Casting l_obj.data to pyds.NvDsObjectMeta
-                obj_meta=pyds.NvDsObjectMeta.cast(l_obj.data)
-            except StopIteration:
-                break
-            obj_counter[obj_meta.class_id] += 1
-            try: 
-                l_obj=l_obj.next
-            except StopIteration:
-                break
 
+    # One pass over the frame and object metas into preallocated arrays,
+    # printing is left to the metadata consumer thread
+    batch = extractor.extract(batch_meta)
+    for index, frame_meta in enumerate(batch.frame_metas):
         # Update frame rate through this probe
         stream_index = "stream{0}".format(frame_meta.pad_index)
         global perf_data
-        perf_data.update_fps(stream_index)
+        perf_data.update_fps(stream_index, frame_meta.ntp_timestamp)
 
         if not silent:
             # Acquiring a display meta object. The memory ownership remains in
@@ -97,9 +88,7 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
             # Setting display text to be shown on screen
             # Note that the pyds module allocates a buffer for the string, and the
             # memory will not be claimed by the garbage collector.
-            # Reading the display_text field here will return the C address of the
-            # allocated string. Use pyds.get_string() to get the string content.
-            py_nvosd_text_params.display_text = "Frame Number={} Number of Objects={} Vehicle_count={} Person_count={}".format(frame_number, num_rects, obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON])
+            py_nvosd_text_params.display_text = frame_text(batch, index)
 
             # Now set the offsets where the string should appear
             py_nvosd_text_params.x_offset = 10
@@ -115,15 +104,8 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
             py_nvosd_text_params.set_bg_clr = 1
             # set(red, green, blue, alpha); set to Black
             py_nvosd_text_params.text_bg_clr.set(0.0, 0.0, 0.0, 1.0)
-            # Using pyds.get_string() to get display_text as string
-            print(pyds.get_string(py_nvosd_text_params.display_text))
             pyds.nvds_add_display_meta_to_frame(frame_meta, display_meta)
 
-        try:
-            l_frame=l_frame.next
-        except StopIteration:
-            break
-    
     #past tracking meta data
     l_user=batch_meta.batch_user_meta_list
     while l_user is not None:
@@ -170,9 +152,24 @@ def osd_sink_pad_buffer_probe(pad,info,u_data):
             break
     return Gst.PadProbeReturn.OK
 
+def frame_text(batch, index):
+    frame = batch.frames[index]
+    obj_counter = batch.class_counts(index)
+    return "Frame Number={} Number of Objects={} Vehicle_count={} Person_count={}".format(
+        frame['frame_num'], frame['num_obj'], obj_counter[PGIE_CLASS_ID_VEHICLE], obj_counter[PGIE_CLASS_ID_PERSON])
+
+def print_batch(batch):
+    # Metadata consumer, runs off the streaming thread
+    for index in range(len(batch.frames)):
+        print(frame_text(batch, index))
+
 def main(args, h264=True):
     global perf_data
+    global extractor
+    load_dependencies()
     perf_data = PERF_DATA(len(args))
+    if metrics_port is not None:
+        perf_data.serve(metrics_port)
 
     number_sources=len(args)
 
@@ -413,6 +410,11 @@ def main(args, h264=True):
     #nvvidconv.link(nvosd)
     #nvosd.link(sink)
 
+    sink_pad = sink.get_static_pad("sink")
+    if sink_pad:
+        sink_pad.add_probe(Gst.PadProbeType.BUFFER, first_frame_probe, 0)
+    startup.mark("pipeline")
+
     # create and event loop and feed gstreamer bus mesages to it
     loop = GLib.MainLoop()
 
@@ -426,6 +428,10 @@ def main(args, h264=True):
     osdsinkpad = nvosd.get_static_pad("sink")
     if not osdsinkpad:
         sys.stderr.write(" Unable to get sink pad of nvosd \n")
+    extractor = BatchMetaExtractor(pyds, max_frames=number_sources, probe_arrays=not silent)
+    if not silent:
+        extractor.add_consumer(print_batch)
+    extractor.start()
     osdsinkpad.add_probe(Gst.PadProbeType.BUFFER, osd_sink_pad_buffer_probe, 0)
     # perf callback function to print fps every 5 sec
     GLib.timeout_add(5000, perf_data.perf_print_callback)
@@ -439,6 +445,7 @@ def main(args, h264=True):
     
     # start play back and listed to events
     pipeline.set_state(Gst.State.PLAYING)
+    startup.mark("playing")
     try:
       loop.run()
     except:
@@ -447,6 +454,9 @@ def main(args, h264=True):
     # cleanup
     print("Exiting app\n")
     pipeline.set_state(Gst.State.NULL)
+    perf_data.close()
+    extractor.close()
+    print(f"Metadata: {extractor.summary()}")
 
 def parse_args():
 
@@ -481,6 +491,19 @@ def parse_args():
         dest='file_loop',
         help="Loop the input file sources after EOS",
     )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        dest='metrics_port',
+        help="Serve per-stream FPS, jitter and latency on http://127.0.0.1:PORT/metrics (Prometheus) and /metrics.json",
+    )
+    parser.add_argument(
+        "--startup-log",
+        default=None,
+        dest='startup_log',
+        help="Append the startup timeline (JSON lines) to this file",
+    )
     parser.add_argument(
         "-s",
         "--silent",
@@ -498,8 +521,14 @@ def parse_args():
     stream_paths = args.input
     global silent
     global file_loop
+    global startup_log
+    global metrics_port
     codec_h264 = True
 
+    startup.mark("args")
+    startup_log = args.startup_log
+    metrics_port = args.metrics_port
+
     no_display = args.no_display
     silent = args.silent
     file_loop = args.file_loop
@@ -0,0 +1,419 @@
+import os
+import re
+import ast
+import json
+import math
+import time
+import cv2
+import numpy as np
+
+LETTERBOX_COLOR = (114, 114, 114)
+NMS_IOU_THRESHOLD = 0.45
+NMS_MAX_DETECTIONS = 300
+MIN_CONFIDENCE = 0.25  # Same default as Ultralytics predict()
+MODEL_STRIDE = 32
+DEFAULT_IMGSZ = 640
+
+def letterbox(image, shape, color=LETTERBOX_COLOR):
+    """Resize keeping the aspect ratio and pad to shape (h, w).
+
+    Returns the padded image, the resize scale and the (x, y) padding.
+    """
+    height, width = image.shape[:2]
+    target_h, target_w = shape
+    scale = min(target_h / height, target_w / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    if (new_h, new_w) != (height, width):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x = (target_w - new_w) // 2
+    pad_y = (target_h - new_h) // 2
+    if (new_h, new_w) != (target_h, target_w):
+        image = cv2.copyMakeBorder(image, pad_y, target_h - new_h - pad_y, pad_x, target_w - new_w - pad_x,
+                                   cv2.BORDER_CONSTANT, value=color)
+    return image, scale, (pad_x, pad_y)
+
+def inference_shape(crop_shape, max_side=DEFAULT_IMGSZ, stride=MODEL_STRIDE):
+    """Stride-aligned (h, w) with the crop's aspect ratio and max_side as the long side."""
+    height, width = crop_shape
+    if height <= 0 or width <= 0:
+        return (max_side, max_side)
+    scale = max_side / max(height, width)
+    return (int(math.ceil(height * scale / stride)) * stride, int(math.ceil(width * scale / stride)) * stride)
+
+def shape_model_path(model_path, shape):
+    """Per-shape model next to the default one: yolo11n.engine -> yolo11n_512x640.engine"""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}_{shape[0]}x{shape[1]}{ext}"
+
+def scale_boxes(boxes, scale, pad, offset=(0, 0)):
+    """Map Nx6 boxes from letterboxed coordinates back to the source frame."""
+    if len(boxes) == 0:
+        return boxes
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / scale + offset[0]
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / scale + offset[1]
+    return boxes
+
+def _read_engine_header(model_path):
+    """Ultralytics metadata of a TensorRT engine and the offset of the engine data, ({}, 0) without one."""
+    with open(model_path, "rb") as f:
+        size = int.from_bytes(f.read(4), byteorder="little", signed=True)
+        try:
+            if 0 < size < 1 << 20:
+                return json.loads(f.read(size).decode("utf-8")), 4 + size
+        except (UnicodeDecodeError, ValueError):
+            pass
+    return {}, 0
+
+def _engine_is_dynamic(model_path, offset):
+    """Whether the engine's input has dynamic dimensions, None if TensorRT is not available."""
+    try:
+        import tensorrt as trt
+    except ImportError:
+        return None
+    with open(model_path, "rb") as f:
+        f.seek(offset)
+        engine = trt.Runtime(trt.Logger(trt.Logger.WARNING)).deserialize_cuda_engine(f.read())
+    if engine is None:
+        return None
+    if hasattr(engine, "get_tensor_name"):
+        shape = engine.get_tensor_shape(engine.get_tensor_name(0))
+    else:
+        shape = engine.get_binding_shape(0)
+    return -1 in tuple(shape)
+
+def exported_metadata(model_path):
+    """Input shape (h, w), batch and dynamic flag of an exported model, {} if unknown.
+
+    Ultralytics writes them into a JSON header in front of TensorRT engines and
+    into the model metadata of ONNX exports. Older exports do not record the
+    dynamic flag, it is then read from the input dimensions.
+    """
+    ext = os.path.splitext(model_path)[1]
+    if ext == ".engine":
+        metadata, offset = _read_engine_header(model_path)
+        dynamic = metadata.get("dynamic", metadata.get("args", {}).get("dynamic"))
+        if dynamic is None and metadata:
+            dynamic = _engine_is_dynamic(model_path, offset)
+    elif ext == ".onnx":
+        import onnxruntime as ort
+        session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        metadata = {}
+        for key, value in session.get_modelmeta().custom_metadata_map.items():
+            try:
+                metadata[key] = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                metadata[key] = value
+        shape = session.get_inputs()[0].shape
+        dynamic = not all(isinstance(dim, int) for dim in shape[2:])
+        if "imgsz" not in metadata and not dynamic:
+            metadata["imgsz"] = shape[2:]
+        if "batch" not in metadata and isinstance(shape[0], int):
+            metadata["batch"] = shape[0]
+    else:
+        return {}
+    if not metadata:
+        return {}
+    info = {'dynamic': bool(dynamic)}
+    imgsz = metadata.get("imgsz")
+    if imgsz:
+        imgsz = [imgsz] if isinstance(imgsz, int) else list(imgsz)
+        info['imgsz'] = (int(imgsz[0]), int(imgsz[-1]))
+    if isinstance(metadata.get("batch"), int):
+        info['batch'] = metadata["batch"]
+    return info
+
+class DetectorBackend:
+    """Common interface of the detection backends.
+
+    infer() takes a list of letterboxed uint8 images of shape imgsz (h, w) and
+    returns one float32 array of [x1, y1, x2, y2, conf, cls] rows per image, in
+    letterboxed pixel coordinates. `names` maps class index to class name and
+    `inference_ms` holds the pure inference time of the last call.
+    """
+    names = {}
+    inference_ms = 0.0
+
+    def set_classes(self, class_indices):
+        self.classes = class_indices
+
+    def static_shape(self):
+        """(h, w) the model was built for, None if it accepts any stride-aligned shape."""
+        return None
+
+    def max_batch(self):
+        """Largest batch one infer() call accepts, None if unbounded."""
+        return None
+
+    def tiers(self):
+        """Models behind this backend, for warm-up and benchmarks that must reach all of them."""
+        return [self]
+
+    def infer(self, images, imgsz):
+        raise NotImplementedError
+
+class UltralyticsBackend(DetectorBackend):
+    """TensorRT engines (or any other Ultralytics model format) through Ultralytics."""
+
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.model_path = model_path
+        self.names = self.model.names
+        self.classes = None
+        # Exported models carry their input size and whether it is dynamic in the
+        # export metadata. Without metadata the model is taken as fixed-size:
+        # DEFAULT_IMGSZ unless the file name carries it (see shape_model_path)
+        metadata = {} if model_path.endswith(".pt") else exported_metadata(model_path)
+        self.dynamic = model_path.endswith(".pt") or metadata.get('dynamic', False)
+        match = re.search(r"_(\d+)x(\d+)\.\w+$", model_path)
+        if 'imgsz' in metadata:
+            self.imgsz = metadata['imgsz']
+        elif match:
+            self.imgsz = (int(match.group(1)), int(match.group(2)))
+        else:
+            self.imgsz = (DEFAULT_IMGSZ, DEFAULT_IMGSZ)
+        # Engines run at most the exported batch, fixed-batch ones exactly that many
+        self.batch = metadata.get('batch', 1)
+        if not self.dynamic and not metadata:
+            print(f"No export metadata in {model_path}, assuming a fixed {self.imgsz[1]}x{self.imgsz[0]} input")
+
+    def static_shape(self):
+        return None if self.dynamic else self.imgsz
+
+    def max_batch(self):
+        return None if self.model_path.endswith(".pt") else self.batch
+
+    def infer(self, images, imgsz):
+        count = len(images)
+        if not self.dynamic and count < self.batch:
+            # A fixed-batch engine only accepts full batches, pad with the last image
+            images = list(images) + [images[-1]] * (self.batch - count)
+        results = self.model.predict(
+            source=images if len(images) > 1 else images[0],
+            show=False,
+            verbose=False,
+            classes=self.classes,
+            imgsz=list(imgsz)
+        )
+        # speed is per image
+        self.inference_ms = sum(result.speed.get("inference", 0.0) for result in results)
+        output = []
+        for result in results:
+            if not hasattr(result, "boxes") or result.boxes is None:
+                output.append(np.zeros((0, 6), dtype=np.float32))
+            else:
+                output.append(result.boxes.data.cpu().numpy().astype(np.float32))
+        return output[:count]
+
+class OnnxRuntimeBackend(DetectorBackend):
+    """ONNX Runtime execution of Ultralytics YOLO exports, CPU by default.
+
+    Input and output buffers are preallocated per (batch, h, w) and bound with
+    IO binding, so a steady-state call does not allocate.
+    """
+
+    def __init__(self, model_path, intra_threads=0, inter_threads=0, providers=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_threads
+        options.inter_op_num_threads = inter_threads
+        if inter_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.ort = ort
+        self.session = ort.InferenceSession(model_path, options, providers=providers or ["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_shape = self.session.get_inputs()[0].shape
+        self.output_name = self.session.get_outputs()[0].name
+        self.names = self._read_names()
+        self.classes = None
+        self.buffers = {}
+
+    def _read_names(self):
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if "names" in metadata:
+            try:
+                return {int(k): v for k, v in ast.literal_eval(metadata["names"]).items()}
+            except (ValueError, SyntaxError):
+                pass
+        # No metadata: derive the class count from the output shape (1, 4 + nc, anchors)
+        shape = self.session.get_outputs()[0].shape
+        nc = shape[1] - 4 if len(shape) == 3 and isinstance(shape[1], int) else 80
+        return {i: str(i) for i in range(nc)}
+
+    def static_shape(self):
+        """(h, w) if the model was exported with a fixed input size, else None."""
+        h, w = self.input_shape[2], self.input_shape[3]
+        return (h, w) if isinstance(h, int) and isinstance(w, int) else None
+
+    def max_batch(self):
+        batch = self.input_shape[0]
+        return batch if isinstance(batch, int) else None
+
+    def _get_buffers(self, batch, height, width):
+        key = (batch, height, width)
+        if key not in self.buffers:
+            inputs = np.zeros((batch, 3, height, width), dtype=np.float32)
+            # Learn the output shape once, then bind preallocated memory
+            outputs = self.session.run([self.output_name], {self.input_name: inputs})[0]
+            outputs = np.empty_like(outputs)
+            binding = self.session.io_binding()
+            binding.bind_ortvalue_input(self.input_name, self.ort.OrtValue.ortvalue_from_numpy(inputs))
+            binding.bind_ortvalue_output(self.output_name, self.ort.OrtValue.ortvalue_from_numpy(outputs))
+            self.buffers[key] = (inputs, outputs, binding)
+        return self.buffers[key]
+
+    def infer(self, images, imgsz):
+        height, width = imgsz
+        inputs, outputs, binding = self._get_buffers(len(images), height, width)
+
+        # BGR HWC uint8 -> RGB CHW float32 in [0, 1], like Ultralytics does for numpy input
+        for i, image in enumerate(images):
+            np.multiply(image[..., ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=inputs[i], casting="unsafe")
+
+        mark_start = time.perf_counter()
+        self.session.run_with_iobinding(binding)
+        self.inference_ms = (time.perf_counter() - mark_start) * 1000
+
+        return [self._postprocess(output) for output in outputs]
+
+    def _postprocess(self, output):
+        if output.ndim == 2 and output.shape[-1] == 6:
+            # End-to-end export with NMS: [x1, y1, x2, y2, conf, cls]
+            boxes = output[output[:, 4] >= MIN_CONFIDENCE]
+            if self.classes is not None:
+                boxes = boxes[np.isin(boxes[:, 5].astype(int), self.classes)]
+            return boxes.astype(np.float32)
+
+        # Raw head: (4 + nc, anchors) with cx, cy, w, h and per-class scores
+        predictions = output.T
+        scores = predictions[:, 4:]
+        if self.classes is not None:
+            masked = np.full_like(scores, -1.0)
+            masked[:, self.classes] = scores[:, self.classes]
+            scores = masked
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf >= MIN_CONFIDENCE
+        if not np.any(keep):
+            return np.zeros((0, 6), dtype=np.float32)
+        xywh = predictions[keep, :4]
+        cls = cls[keep]
+        conf = conf[keep]
+
+        # Class-aware NMS by offsetting boxes per class
+        offset = cls[:, None] * 4096.0
+        nms_boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2 + offset, xywh[:, 2:]], axis=1)
+        indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), conf.tolist(), MIN_CONFIDENCE, NMS_IOU_THRESHOLD)
+        indices = np.asarray(indices, dtype=int).reshape(-1)[:NMS_MAX_DETECTIONS]
+
+        boxes = np.empty((len(indices), 6), dtype=np.float32)
+        boxes[:, 0:2] = xywh[indices, :2] - xywh[indices, 2:] / 2
+        boxes[:, 2:4] = xywh[indices, :2] + xywh[indices, 2:] / 2
+        boxes[:, 4] = conf[indices]
+        boxes[:, 5] = cls[indices]
+        return boxes
+
+def create_backend(kind, model_path, intra_threads=0, inter_threads=0):
+    if kind == "onnx":
+        return OnnxRuntimeBackend(model_path, intra_threads=intra_threads, inter_threads=inter_threads)
+    return UltralyticsBackend(model_path)
+
+def benchmark(backend, shape, runs):
+    """Best-of-runs wall time (ms) of one inference of shape, summed over the backend's models."""
+    dummy = np.zeros((shape[0], shape[1], 3), dtype=np.uint8)
+    total = 0.0
+    for tier in backend.tiers():
+        best = math.inf
+        for _ in range(runs):
+            mark_start = time.perf_counter()
+            tier.infer([dummy], shape)
+            best = min(best, (time.perf_counter() - mark_start) * 1000)
+        total += best
+    return total
+
+class ShapeCache:
+    """Crop, inference shape and backend per input resolution.
+
+    The crop of each resolution is letterboxed into a stride-aligned shape of
+    the same aspect ratio instead of a square, so no network pixels are spent
+    on padding. Models with a fixed input size use a per-shape model file
+    (shape_model_path) when one exists and fall back to the square otherwise.
+    """
+
+    def __init__(self, backend, model_path, crop_size, factory, max_side=DEFAULT_IMGSZ, rect=True, benchmark_runs=0):
+        self.backend = backend
+        self.model_path = model_path
+        self.crop_size = crop_size    # (frame_h, frame_w) -> (crop_h, crop_w)
+        self.factory = factory        # (model_path, shape) -> DetectorBackend
+        self.max_side = max_side
+        self.rect = rect
+        self.benchmark_runs = benchmark_runs
+        self.square = backend.static_shape() or (max_side, max_side)  # Shape of the default model
+        self.entries = {}             # (frame_h, frame_w) -> entry dict
+        self.backends = {self.square: backend}
+
+    def backend_for(self, shape):
+        """Backend able to run shape, None if the model is fixed-size and has no per-shape file."""
+        if shape in self.backends:
+            return self.backends[shape]
+        static = self.backend.static_shape()
+        if static is None or static == shape:
+            backend = self.backend
+        else:
+            path = shape_model_path(self.model_path, shape)
+            if not os.path.exists(path):
+                print(f"No {shape[0]}x{shape[1]} model ({path}), using {static[0]}x{static[1]}")
+                return None
+            backend = self.factory(path, shape)
+            backend.set_classes(self.backend.classes)
+        self.backends[shape] = backend
+        return backend
+
+    def get(self, frame_h, frame_w):
+        entry = self.entries.get((frame_h, frame_w))
+        if entry is None:
+            entry = self._build(frame_h, frame_w)
+            self.entries[(frame_h, frame_w)] = entry
+        return entry
+
+    def _build(self, frame_h, frame_w):
+        crop = self.crop_size(frame_h, frame_w)
+        shape = inference_shape(crop, self.max_side) if self.rect else self.square
+        backend = self.backend_for(shape)
+        if backend is None:
+            shape = self.square
+            backend = self.backend
+        entry = {'crop': crop, 'imgsz': shape, 'backend': backend, 'count': 0, 'inference_ms': 0.0,
+                 'bench_ms': None, 'square_ms': None}
+        if self.benchmark_runs and shape != self.square:
+            # Warm the new shape up and measure it against the square on the same input
+            benchmark(backend, shape, 1)
+            entry['bench_ms'] = benchmark(backend, shape, self.benchmark_runs)
+            entry['square_ms'] = benchmark(self.backend, self.square, self.benchmark_runs)
+        print(f"Inference shape {frame_w}x{frame_h}: {self.describe(entry)}")
+        return entry
+
+    def cached(self, frame_h, frame_w):
+        """Entry of a resolution get() already built, else None."""
+        return self.entries.get((frame_h, frame_w))
+
+    def record(self, entry, inference_ms):
+        entry['count'] += 1
+        entry['inference_ms'] += inference_ms
+
+    def describe(self, entry):
+        (crop_h, crop_w), (h, w) = entry['crop'], entry['imgsz']
+        pixels = h * w
+        text = (f"crop {crop_w}x{crop_h} -> {w}x{h}, {pixels} px/inference "
+                f"({100.0 * pixels / (self.square[0] * self.square[1]):.0f}% of {self.square[1]}x{self.square[0]})")
+        if entry['bench_ms'] and entry['square_ms']:
+            text += (f", benchmark {entry['bench_ms']:.2f}ms vs {entry['square_ms']:.2f}ms "
+                     f"({entry['square_ms'] / entry['bench_ms']:.2f}x)")
+        if entry['count']:
+            text += f", {entry['count']} inferences {entry['inference_ms'] / entry['count']:.2f}ms avg"
+        return text
+
+    def summary(self):
+        return "\n".join(f"Inference shape {w}x{h}: {self.describe(entry)}" for (h, w), entry in self.entries.items())
@@ -0,0 +1,114 @@
+import time
+import numpy as np
+from pipeline.backends import DetectorBackend
+from pipeline.stats import StreamingStats
+
+CASCADE_PERIOD   = 5     # Large model on every N-th call regardless of confidence
+CASCADE_LOW      = 0.3   # Small model detections in [low, high) are uncertain
+CASCADE_HIGH     = 0.6
+CASCADE_FUSE_IOU = 0.55  # Same object seen by both tiers
+
+def box_iou(a, b):
+    """IoU matrix of Nx4 and Mx4 [x1, y1, x2, y2] boxes."""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def fuse(small, large, high=CASCADE_HIGH, iou=CASCADE_FUSE_IOU):
+    """Merge the detections of both tiers for one image.
+
+    Matched pairs keep the large model's box with the higher confidence,
+    large-only boxes are kept, small-only boxes survive only when confident
+    (the large model looked and did not confirm the uncertain ones).
+    """
+    if len(large) == 0:
+        return small[small[:, 4] >= high]
+    if len(small) == 0:
+        return large
+    overlap = box_iou(small, large)
+    overlap[small[:, 5][:, None] != large[:, 5][None, :]] = 0.0
+    fused = large.copy()
+    matched = overlap.max(axis=1) >= iou
+    best = overlap.argmax(axis=1)
+    for index in np.flatnonzero(matched):
+        fused[best[index], 4] = max(fused[best[index], 4], small[index, 4])
+    extra = small[~matched & (small[:, 4] >= high)]
+    return np.concatenate([fused, extra]) if len(extra) else fused
+
+class CascadeBackend(DetectorBackend):
+    """Two resident models behind one backend: a small one on every call and
+    a large one every `period` calls or when the small one is uncertain.
+
+    Both tiers receive the same letterboxed images, so pre-processing is done
+    once per frame, and their results are fused before tracking.
+    """
+
+    def __init__(self, small, large, period=CASCADE_PERIOD, low=CASCADE_LOW, high=CASCADE_HIGH):
+        small_shape, large_shape = small.static_shape(), large.static_shape()
+        if small_shape and large_shape and small_shape != large_shape:
+            raise ValueError(f"Cascade models have different input sizes {small_shape} and {large_shape}")
+        self.small = small
+        self.large = large
+        self.period = period
+        self.low = low
+        self.high = high
+        self.names = small.names
+        self.classes = None
+
+        # Statistics
+        self.calls = 0
+        self.large_calls = 0
+        self.escalations = 0  # Large calls triggered by uncertain detections
+        self.small_latency = StreamingStats()  # Seconds
+        self.large_latency = StreamingStats()
+        self.start = None
+
+    def tiers(self):
+        return [self.small, self.large]
+
+    def set_classes(self, class_indices):
+        self.classes = class_indices
+        self.small.set_classes(class_indices)
+        self.large.set_classes(class_indices)
+
+    def static_shape(self):
+        return self.small.static_shape() or self.large.static_shape()
+
+    def max_batch(self):
+        batches = [b for b in (self.small.max_batch(), self.large.max_batch()) if b]
+        return min(batches) if batches else None
+
+    def infer(self, images, imgsz):
+        if self.start is None:
+            self.start = time.monotonic()
+        results = self.small.infer(images, imgsz)
+        self.inference_ms = self.small.inference_ms
+        self.small_latency.update(self.small.inference_ms / 1000)
+
+        uncertain = any(np.any((boxes[:, 4] >= self.low) & (boxes[:, 4] < self.high)) for boxes in results)
+        scheduled = self.calls % self.period == 0
+        self.calls += 1
+        if not (scheduled or uncertain):
+            return results
+
+        large = self.large.infer(images, imgsz)
+        self.inference_ms += self.large.inference_ms
+        self.large_latency.update(self.large.inference_ms / 1000)
+        self.large_calls += 1
+        if uncertain and not scheduled:
+            self.escalations += 1
+        return [fuse(s, l, self.high) for s, l in zip(results, large)]
+
+    def summary(self):
+        elapsed = time.monotonic() - self.start if self.start else 0.0
+        if not self.calls or elapsed <= 0:
+            return "no cascade calls"
+        small, large = self.small_latency.roll(), self.large_latency.roll()
+        return (f"small {self.calls / elapsed:.1f} calls/s {self.small_latency.ewma * 1000:.2f}ms "
+                f"(p95 {small['p95'] * 1000:.2f}ms), "
+                f"large {self.large_calls / elapsed:.1f} calls/s {self.large_latency.ewma * 1000:.2f}ms "
+                f"(p95 {large['p95'] * 1000:.2f}ms), "
+                f"{self.large_calls}/{self.calls} escalated ({self.escalations} by confidence)")
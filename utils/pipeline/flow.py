@@ -0,0 +1,181 @@
+import time
+import cv2
+import numpy as np
+
+# KLT settings for box propagation on the low-res luma plane
+FLOW_MAX_POINTS   = 12    # Tracked corners per box
+FLOW_MIN_POINTS   = 3     # Below this a box is re-seeded, or dropped if re-seeding fails
+FLOW_FB_THRESHOLD = 1.0   # Max forward-backward error in luma pixels
+FLOW_BOX_SHRINK   = 0.15  # Seed corners away from the box border (background)
+
+class BoxPropagator:
+    """Shift and scale tracked boxes between detection frames with sparse KLT flow."""
+
+    def __init__(self, scale=0.5, max_points=FLOW_MAX_POINTS, min_points=FLOW_MIN_POINTS):
+        self.scale = scale
+        self.max_points = max_points
+        self.min_points = min_points
+        self.lk_params = dict(winSize=(15, 15), maxLevel=2, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+        self.prev_gray = None
+        self.track_ids = []
+        self.boxes = []     # [x1, y1, x2, y2] in frame coordinates
+        self.points = []    # Nx1x2 float32 in luma coordinates
+        self.features = []
+        self.confs = []
+        self.classes = []
+
+        # Statistics
+        self.propagate_time = 0.0
+        self.propagated_boxes = 0
+        self.lost_boxes = 0
+        self.drift_samples = 0
+        self.drift_center = 0.0
+        self.drift_iou = 0.0
+        self.latest_cost_per_box = 0.0
+
+    def _seed(self, gray, box):
+        s = self.scale
+        x1, y1, x2, y2 = box
+        dx = (x2 - x1) * FLOW_BOX_SHRINK
+        dy = (y2 - y1) * FLOW_BOX_SHRINK
+        lx1 = max(0, int((x1 + dx) * s))
+        ly1 = max(0, int((y1 + dy) * s))
+        lx2 = min(gray.shape[1], int((x2 - dx) * s))
+        ly2 = min(gray.shape[0], int((y2 - dy) * s))
+        if lx2 - lx1 < 4 or ly2 - ly1 < 4:
+            return None
+        pts = cv2.goodFeaturesToTrack(gray[ly1:ly2, lx1:lx2], maxCorners=self.max_points,
+                                      qualityLevel=0.01, minDistance=3, blockSize=3)
+        if pts is None or len(pts) < self.min_points:
+            return None
+        return pts + np.array([lx1, ly1], dtype=np.float32)
+
+    def reset(self, gray, tracks):
+        """Measure drift against freshly detected tracks, then re-seed from them."""
+        propagated = dict(zip(self.track_ids, self.boxes))
+
+        self.track_ids = []
+        self.boxes = []
+        self.points = []
+        self.features = []
+        self.confs = []
+        self.classes = []
+        for track in tracks:
+            # Only boxes that were just matched to a detection are reliable seeds
+            if not track.is_confirmed() or track.time_since_update > 0 or not track.features:
+                continue
+            box = track.to_ltrb()
+            if track.track_id in propagated:
+                self._measure_drift(propagated[track.track_id], box)
+            pts = self._seed(gray, box)
+            if pts is None:
+                continue
+            self.track_ids.append(track.track_id)
+            self.boxes.append(np.asarray(box, dtype=np.float32))
+            self.points.append(pts)
+            self.features.append(track.get_feature())
+            self.confs.append(track.det_conf if track.det_conf is not None else 0.0)
+            self.classes.append(track.det_class)
+        self.prev_gray = gray
+
+    def propagate(self, gray):
+        """Move every seeded box to the current frame.
+
+        Returns DeepSort detections ([x, y, w, h], conf, cls) and the matching
+        appearance embeddings, so no embedder pass is needed for them.
+        """
+        detections = []
+        embeds = []
+        if self.prev_gray is None or not self.points or self.prev_gray.shape != gray.shape:
+            self.prev_gray = gray
+            return detections, embeds
+
+        mark_start = time.perf_counter()
+        counts = [len(p) for p in self.points]
+        prev_pts = np.concatenate(self.points).astype(np.float32)
+
+        # One batched forward-backward KLT pass for all boxes
+        curr_pts, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, prev_pts, None, **self.lk_params)
+        back_pts, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, curr_pts, None, **self.lk_params)
+        fb_error = np.linalg.norm((prev_pts - back_pts).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < FLOW_FB_THRESHOLD)
+
+        keep = []
+        offset = 0
+        for i, count in enumerate(counts):
+            sel = slice(offset, offset + count)
+            offset += count
+            mask = good[sel]
+            p0 = prev_pts[sel][mask].reshape(-1, 2)
+            p1 = curr_pts[sel][mask].reshape(-1, 2)
+            if len(p0) < self.min_points:
+                self.lost_boxes += 1
+                continue
+
+            shift = np.median(p1 - p0, axis=0) / self.scale
+            scale = self._median_scale(p0, p1)
+
+            x1, y1, x2, y2 = self.boxes[i]
+            cx = (x1 + x2) / 2 + shift[0]
+            cy = (y1 + y2) / 2 + shift[1]
+            w = (x2 - x1) * scale
+            h = (y2 - y1) * scale
+            self.boxes[i] = np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+            # Re-seed boxes whose corners are running out
+            if len(p1) < self.max_points // 2:
+                pts = self._seed(gray, self.boxes[i])
+                self.points[i] = pts if pts is not None else p1.reshape(-1, 1, 2)
+            else:
+                self.points[i] = p1.reshape(-1, 1, 2)
+
+            keep.append(i)
+            detections.append(([float(cx - w / 2), float(cy - h / 2), float(w), float(h)],
+                               self.confs[i], self.classes[i]))
+            embeds.append(self.features[i])
+
+        self.track_ids = [self.track_ids[i] for i in keep]
+        self.boxes = [self.boxes[i] for i in keep]
+        self.points = [self.points[i] for i in keep]
+        self.features = [self.features[i] for i in keep]
+        self.confs = [self.confs[i] for i in keep]
+        self.classes = [self.classes[i] for i in keep]
+        self.prev_gray = gray
+
+        elapsed = time.perf_counter() - mark_start
+        self.propagate_time += elapsed
+        self.propagated_boxes += len(counts)
+        self.latest_cost_per_box = elapsed / len(counts)
+        return detections, embeds
+
+    @staticmethod
+    def _median_scale(p0, p1):
+        if len(p0) < 2:
+            return 1.0
+        i, j = np.triu_indices(len(p0), k=1)
+        d0 = np.linalg.norm(p0[i] - p0[j], axis=1)
+        d1 = np.linalg.norm(p1[i] - p1[j], axis=1)
+        valid = d0 > 1e-3
+        if not np.any(valid):
+            return 1.0
+        return float(np.clip(np.median(d1[valid] / d0[valid]), 0.8, 1.25))
+
+    def _measure_drift(self, propagated, detected):
+        px1, py1, px2, py2 = propagated
+        dx1, dy1, dx2, dy2 = detected
+        center = np.hypot((px1 + px2 - dx1 - dx2) / 2, (py1 + py2 - dy1 - dy2) / 2)
+        iw = max(0.0, min(px2, dx2) - max(px1, dx1))
+        ih = max(0.0, min(py2, dy2) - max(py1, dy1))
+        inter = iw * ih
+        union = (px2 - px1) * (py2 - py1) + (dx2 - dx1) * (dy2 - dy1) - inter
+        self.drift_center += center
+        self.drift_iou += inter / union if union > 0 else 0.0
+        self.drift_samples += 1
+
+    def summary(self):
+        cost = self.propagate_time / self.propagated_boxes if self.propagated_boxes else 0.0
+        center = self.drift_center / self.drift_samples if self.drift_samples else 0.0
+        iou = self.drift_iou / self.drift_samples if self.drift_samples else 0.0
+        return (f"boxes {self.propagated_boxes} lost {self.lost_boxes} cost/box {cost*1000:.3f}ms "
+                f"drift {center:.1f}px iou {iou:.3f} ({self.drift_samples} samples)")
@@ -0,0 +1,85 @@
+import numpy as np
+from pipeline.luma import downsample_luma
+
+GATE_SCALE           = 0.125  # Luma downsample factor of the change detector
+GATE_BLOCK           = 8      # Block size (downsampled pixels)
+GATE_BLOCK_THRESHOLD = 6.0    # Mean absolute luma difference of a changed block, above sensor noise
+GATE_THRESHOLD       = 0.05   # Changed-block fraction accumulated since the last detection that forces one
+GATE_MAX_SKIP        = 30     # Detections skipped in a row at most
+
+class SceneGate:
+    """Skip detections while the scene and the tracks are static.
+
+    measure() runs on the capture side: it returns the fraction of blocks of
+    the downsampled luma that changed since the previous frame (block-motion
+    energy). decide() runs on the inference side at each scheduled detection
+    and skips it while the energy accumulated since the last detection is
+    below threshold and the set of tracks is unchanged. A detection that runs
+    restarts the accumulation from its frame; reset() records the tracks it
+    produced. Each side has a single thread, the energy travels with the frame.
+    """
+
+    def __init__(self, scale=GATE_SCALE, threshold=GATE_THRESHOLD, max_skip=GATE_MAX_SKIP,
+                 block=GATE_BLOCK, block_threshold=GATE_BLOCK_THRESHOLD):
+        self.scale = scale
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.block = block
+        self.block_threshold = block_threshold
+
+        # Capture side
+        self.previous = None
+
+        # Inference side
+        self.accumulated = 0.0
+        self.skipped_in_row = 0
+        self.track_ids = None
+
+        # Statistics
+        self.scheduled = 0
+        self.skipped = 0
+        self.saved_ms = 0.0
+
+    def measure(self, frame):
+        gray = downsample_luma(frame, self.scale)
+        previous, self.previous = self.previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return 1.0
+        height = gray.shape[0] // self.block * self.block
+        width = gray.shape[1] // self.block * self.block
+        if height == 0 or width == 0:
+            return 1.0
+        diff = np.abs(gray[:height, :width].astype(np.int16) - previous[:height, :width])
+        blocks = diff.reshape(height // self.block, self.block, width // self.block, self.block).mean(axis=(1, 3))
+        return float(np.count_nonzero(blocks > self.block_threshold)) / blocks.size
+
+    def observe(self, energy):
+        """Accumulate the energy of every processed frame."""
+        self.accumulated += energy
+
+    def decide(self, tracks, inference_ms):
+        """True if the scheduled detection must run, inference_ms is the cost a skip saves."""
+        self.scheduled += 1
+        track_ids = {track.track_id for track in tracks if track.is_confirmed()}
+        stable = (track_ids == self.track_ids and all(track.is_confirmed() for track in tracks))
+        if stable and self.accumulated < self.threshold and self.skipped_in_row < self.max_skip:
+            self.skipped += 1
+            self.skipped_in_row += 1
+            self.saved_ms += inference_ms
+            return False
+        self.accumulated = 0.0
+        self.skipped_in_row = 0
+        return True
+
+    def reset(self, tracks):
+        """Record the tracks a detection produced, the reference of the next decisions."""
+        self.track_ids = {track.track_id for track in tracks if track.is_confirmed()}
+
+    def summary(self, watts=0.0):
+        if not self.scheduled:
+            return "no scheduled detections"
+        text = (f"{self.skipped}/{self.scheduled} detections skipped ({100.0 * self.skipped / self.scheduled:.1f}%), "
+                f"{self.saved_ms / 1000:.2f}s of inference saved")
+        if watts:
+            text += f" (~{watts * self.saved_ms / 1000:.1f}J at {watts:.1f}W)"
+        return text
@@ -0,0 +1,11 @@
+import cv2
+
+def downsample_luma(frame, scale):
+    """Return the 8-bit luma plane of a colour frame, downsampled by scale."""
+    if scale != 1.0:
+        height, width = frame.shape[:2]
+        frame = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
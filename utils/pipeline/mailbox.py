@@ -0,0 +1,38 @@
+import threading
+
+class LatestFrame:
+    """Single-slot mailbox of one source: the producer overwrites, the consumer takes the newest item.
+
+    Several mailboxes can share one `ready` event so a consumer serving
+    many sources sleeps until any of them has a new frame.
+    """
+
+    def __init__(self, ready=None):
+        self.lock = threading.Lock()
+        self.ready = ready or threading.Event()
+        self.item = None
+        self.overwritten = 0  # Frames replaced before the consumer took them
+
+    def put(self, item, merge=None):
+        """Store item, returns True if it replaced a frame that was never consumed.
+
+        merge(replaced, item) returns the item stored in that case, so state of
+        the dropped frame can be carried into the new one atomically.
+        """
+        with self.lock:
+            replaced = self.item is not None
+            if replaced:
+                self.overwritten += 1
+                if merge is not None:
+                    item = merge(self.item, item)
+            self.item = item
+        self.ready.set()
+        return replaced
+
+    def take(self):
+        with self.lock:
+            item, self.item = self.item, None
+        return item
+
+    def pending(self):
+        return self.item is not None
@@ -0,0 +1,91 @@
+import time
+import cv2
+import numpy as np
+
+class GlobalMotionEstimator:
+    """Estimate the inter-frame camera motion as a partial affine transform.
+
+    This is the KLT + RANSAC estimate used by the video stabilizer, split out so
+    the trackers can compensate camera motion with the same model.
+    """
+
+    def __init__(self, max_corners=400, quality_level=0.01, min_distance=30, block_size=3, lk_params=None):
+        self.max_corners = max_corners
+        self.quality_level = quality_level
+        self.min_distance = min_distance
+        self.block_size = block_size
+        if lk_params is None:
+            lk_params = dict(winSize=(15, 15), maxLevel=3, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.lk_params = lk_params
+
+        # State for update()
+        self.prev_gray = None
+        self.estimate_time = 0.0
+        self.estimates = 0
+        self.failures = 0
+
+    def estimate(self, prev_gray, curr_gray, offset=(0, 0)):
+        """Return (m, prev_pts, curr_pts) for prev_gray -> curr_gray.
+
+        Points are shifted by offset (e.g. the ROI origin) before fitting.
+        prev_pts is None if no corners were found, m is None if no transform
+        could be fitted.
+        """
+        prev_pts = cv2.goodFeaturesToTrack(prev_gray, maxCorners=self.max_corners, qualityLevel=self.quality_level,
+                                           minDistance=self.min_distance, blockSize=self.block_size)
+        if prev_pts is None or len(prev_pts) == 0:
+            return None, None, None
+
+        curr_pts, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, prev_pts, None, **self.lk_params)
+        idx = np.where(status == 1)[0]  # Get indices of successfully tracked points
+        prev_pts = prev_pts[idx] + np.array(offset)
+        curr_pts = curr_pts[idx] + np.array(offset)
+
+        m = None
+        if len(prev_pts) >= 2:
+            m, inliers = cv2.estimateAffinePartial2D(prev_pts, curr_pts)
+        return m, prev_pts, curr_pts
+
+    def update(self, gray, scale=1.0):
+        """Feed the next downsampled luma frame, return the camera motion in full-resolution pixels.
+
+        Returns the identity transform for the first frame or when the fit fails.
+        """
+        mark_start = time.perf_counter()
+        m = None
+        if self.prev_gray is not None and self.prev_gray.shape == gray.shape:
+            m, _, _ = self.estimate(self.prev_gray, gray)
+        self.prev_gray = gray
+
+        if m is None:
+            self.failures += 1
+            m = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        else:
+            m = m.copy()
+            m[:, 2] /= scale  # Translation back to full resolution
+
+        self.estimate_time += time.perf_counter() - mark_start
+        self.estimates += 1
+        return m
+
+    def summary(self):
+        cost = self.estimate_time / self.estimates if self.estimates else 0.0
+        return f"estimates {self.estimates} failures {self.failures} cost {cost*1000:.3f}ms"
+
+def compensate_tracks(tracks, m):
+    """Warp the Kalman state of DeepSort tracks by the camera motion m.
+
+    The state is (x, y, a, h, vx, vy, va, vh) with (x, y) the box centre, so the
+    centre is moved by m, height and its velocity are scaled by the motion's
+    zoom and the centre velocity is rotated with the camera.
+    """
+    rot = m[:, :2]
+    zoom = float(np.sqrt(abs(np.linalg.det(rot))))
+    if zoom == 0:
+        return
+    for track in tracks:
+        mean = track.mean
+        mean[0:2] = rot @ mean[0:2] + m[:, 2]
+        mean[4:6] = rot @ mean[4:6]
+        mean[3] *= zoom
+        mean[7] *= zoom
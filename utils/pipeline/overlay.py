@@ -0,0 +1,135 @@
+import time
+import cv2
+import numpy as np
+from collections import OrderedDict
+
+OVERLAY_FONT            = cv2.FONT_HERSHEY_SIMPLEX
+OVERLAY_MAX_SPRITES     = 512  # Label sprites kept (LRU)
+OVERLAY_STATUS_INTERVAL = 0.5  # Seconds between status bar refreshes
+OVERLAY_MARGIN          = 10
+
+class OverlayCompositor:
+    """Draw labels and the status bar from pre-rasterized sprites.
+
+    A sprite is the text rendered once with putText into a mask plus a patch
+    of its colour, cached by (text, colour), so a label that is seen again
+    costs one masked copy (cv2.copyTo) instead of glyph rasterization. The
+    status text is sampled every `status_interval` seconds and only
+    re-rasterized when it differs from the cached one.
+    """
+
+    def __init__(self, font_scale, thickness, max_sprites=OVERLAY_MAX_SPRITES, status_interval=OVERLAY_STATUS_INTERVAL):
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.max_sprites = max_sprites
+        self.status_interval = status_interval
+        self.sprites = OrderedDict()  # (text, color) -> (mask, color patch, ascent)
+
+        self.status_text = None
+        self.status_sprite = None
+        self.status_time = -np.inf
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.status_frames = 0
+        self.status_renders = 0
+
+    def rasterize(self, text, color):
+        (width, height), baseline = cv2.getTextSize(text, OVERLAY_FONT, self.font_scale, self.thickness)
+        mask = np.zeros((height + baseline + self.thickness, width + self.thickness), dtype=np.uint8)
+        cv2.putText(mask, text, (0, height), OVERLAY_FONT, self.font_scale, 255, self.thickness, cv2.LINE_8)
+        # OpenCV 5 antialiases even LINE_8 text, keep a solid stroke so copyTo stays a plain copy
+        mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)[1]
+        patch = np.empty(mask.shape + (3,), dtype=np.uint8)
+        patch[:] = color
+        return mask, patch, height
+
+    def sprite(self, text, color):
+        key = (text, color)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = self.rasterize(text, color)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def blit(self, frame, sprite, x, y):
+        """Paint the sprite with its text origin at (x, y), like putText, clipped to the frame."""
+        mask, patch, ascent = sprite
+        top = y - ascent
+        frame_h, frame_w = frame.shape[:2]
+        y0, x0 = max(top, 0), max(x, 0)
+        y1, x1 = min(top + mask.shape[0], frame_h), min(x + mask.shape[1], frame_w)
+        if y1 <= y0 or x1 <= x0:
+            return
+        sy, sx = y0 - top, x0 - x
+        region = frame[y0:y1, x0:x1]
+        cv2.copyTo(patch[sy:sy + y1 - y0, sx:sx + x1 - x0], mask[sy:sy + y1 - y0, sx:sx + x1 - x0], region)
+
+    def label(self, frame, text, x, y, color):
+        self.blit(frame, self.sprite(text, color), x, y)
+
+    def status(self, frame, make_text, color, now=None):
+        """Status bar at the top right; make_text() is only called when a refresh is due."""
+        now = time.monotonic() if now is None else now
+        self.status_frames += 1
+        if now - self.status_time >= self.status_interval:
+            self.status_time = now
+            text = make_text()
+            if text != self.status_text:
+                self.status_text = text
+                self.status_sprite = self.rasterize(text, color)
+                self.status_renders += 1
+        if self.status_sprite is not None:
+            width = self.status_sprite[0].shape[1] - self.thickness
+            self.blit(frame, self.status_sprite, frame.shape[1] - width - OVERLAY_MARGIN, 30)
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f"label sprites {len(self.sprites)}, {hit_rate:.1f}% cache hits, "
+                f"status bar rasterized {self.status_renders} times in {self.status_frames} frames")
+
+class Renderer:
+    """Display path of a stream: a window, a jetson_utils videoOutput, or both."""
+
+    def __init__(self, mode, name, uri=None, argv=None):
+        self.mode = mode
+        self.name = name
+        self.uri = uri
+        self.argv = argv
+        self.output = None
+        self.window_initialized = False
+        self.streaming = True
+
+    def init_window(self, width, height):
+        import screeninfo
+        screen = screeninfo.get_monitors()[0]
+        if screen.width <= width and screen.height <= height:
+            cv2.namedWindow(self.name, cv2.WND_PROP_FULLSCREEN)
+            cv2.setWindowProperty(self.name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+        else:
+            cv2.namedWindow(self.name, cv2.WND_PROP_AUTOSIZE)
+            window_x = (screen.width - width) // 2
+            window_y = (screen.height - height) // 2
+            cv2.moveWindow(self.name, window_x, window_y)
+
+    def present(self, frame):
+        if self.mode in ("output", "both"):
+            from jetson_utils import videoOutput, cudaFromNumpy
+            if self.output is None:
+                self.output = videoOutput(self.uri, argv=self.argv)
+            self.output.Render(cudaFromNumpy(frame))
+            self.streaming = self.output.IsStreaming()
+        if self.mode in ("window", "both"):
+            if not self.window_initialized:
+                self.init_window(frame.shape[1], frame.shape[0])
+                self.window_initialized = True
+            cv2.imshow(self.name, frame)
+            cv2.waitKey(1) # 1ms
@@ -0,0 +1,147 @@
+import os
+import threading
+
+# Stage that gets whatever CPUs are not dedicated to another stage
+SHARED_STAGE = "ui"
+
+def parse_cpu_list(text):
+    """Parse a kernel cpulist such as "0-2,5" into a set of CPU ids."""
+    cpus = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def isolated_cpus():
+    """CPUs removed from the scheduler with isolcpus=, if any."""
+    try:
+        with open("/sys/devices/system/cpu/isolated") as f:
+            return parse_cpu_list(f.read())
+    except (OSError, ValueError):
+        return set()
+
+def parse_plan(entries):
+    """Parse ["capture=3", "inference=2", "ui=0-1"] into {stage: {cpus}}."""
+    plan = {}
+    for entry in entries:
+        stage, _, cpus = entry.partition("=")
+        if not cpus:
+            raise ValueError(f"Invalid CPU plan entry '{entry}', expected <stage>=<cpulist>")
+        plan[stage.strip()] = parse_cpu_list(cpus)
+    return plan
+
+def default_plan(dedicated_stages):
+    """One core per dedicated stage, preferring isolated cores, the rest is shared.
+
+    Dedicated cores are taken from the top of the CPU list, CPU0 usually
+    serves most interrupts and is left to the shared stage.
+    """
+    available = sorted(os.sched_getaffinity(0))
+    isolated = sorted(isolated_cpus() & set(available))
+    if len(available) <= len(dedicated_stages):
+        return {SHARED_STAGE: set(available)}
+
+    pool = isolated if len(isolated) >= len(dedicated_stages) else available
+    plan = {}
+    for stage, cpu in zip(dedicated_stages, reversed(pool)):
+        plan[stage] = {cpu}
+    dedicated = set().union(*plan.values())
+    plan[SHARED_STAGE] = set(available) - dedicated - set(isolated) or set(available) - dedicated
+    return plan
+
+def read_thread_counters(tid):
+    """Scheduler counters of one thread of this process (None if unavailable)."""
+    counters = {}
+    base = f"/proc/self/task/{tid}"
+    try:
+        # Needs CONFIG_SCHED_DEBUG, present on L4T kernels
+        with open(f"{base}/sched") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key in ("se.nr_migrations", "nr_switches", "nr_voluntary_switches", "nr_involuntary_switches"):
+                    counters[key.replace("se.", "")] = int(float(value))
+    except OSError:
+        pass
+    if "nr_voluntary_switches" not in counters:
+        try:
+            with open(f"{base}/status") as f:
+                for line in f:
+                    if line.startswith("voluntary_ctxt_switches"):
+                        counters["nr_voluntary_switches"] = int(line.split()[1])
+                    elif line.startswith("nonvoluntary_ctxt_switches"):
+                        counters["nr_involuntary_switches"] = int(line.split()[1])
+        except OSError:
+            return None
+    try:
+        with open(f"{base}/stat") as f:
+            # Field 39 is the CPU the thread last ran on; skip the "(comm)" field that may contain spaces
+            counters["cpu"] = int(f.read().rsplit(")", 1)[1].split()[36])
+    except (OSError, IndexError, ValueError):
+        pass
+    return counters
+
+class CpuPlacement:
+    """Pin pipeline threads to CPUs by native thread id according to a stage plan."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.threads = {}
+        self.baseline = {}
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def cpus_for(self, stage):
+        return self.plan.get(stage) or self.plan.get(SHARED_STAGE)
+
+    def pin(self, stage):
+        """Pin the calling thread to the CPUs of its stage and verify it."""
+        tid = threading.get_native_id()
+        cpus = self.cpus_for(stage)
+        if not cpus:
+            return
+        try:
+            os.sched_setaffinity(tid, cpus)  # A thread id pins only that thread, 0 would be the caller as well
+            actual = os.sched_getaffinity(tid)
+        except (AttributeError, OSError) as e:
+            print(f"CPU placement of {stage} not supported: {e}")
+            return
+        if actual != cpus:
+            print(f"CPU placement of {stage} thread {tid} requested {sorted(cpus)} but got {sorted(actual)}")
+        else:
+            print(f"Thread {tid} ({stage}) bound to CPU {sorted(cpus)}")
+        with self.lock:
+            self.threads[stage] = tid
+            self.baseline[stage] = read_thread_counters(tid)
+
+    def finish(self, stage):
+        """Collect migration/context-switch deltas; call from the pinned thread before it exits."""
+        with self.lock:
+            tid = self.threads.get(stage)
+            baseline = self.baseline.get(stage)
+        if tid is None or baseline is None:
+            return None
+        current = read_thread_counters(tid)
+        if current is None:
+            return None
+        delta = {key: current[key] - baseline[key] for key in current if key in baseline and key != "cpu"}
+        delta["cpu"] = current.get("cpu")
+        try:
+            delta["affinity_kept"] = os.sched_getaffinity(tid) == self.cpus_for(stage)
+        except OSError:
+            delta["affinity_kept"] = None
+        with self.lock:
+            self.results[stage] = delta
+        return delta
+
+    def report(self):
+        lines = []
+        for stage, delta in self.results.items():
+            fields = " ".join(f"{key.replace('nr_', '')} {value}" for key, value in delta.items())
+            lines.append(f"CPU placement {stage} {sorted(self.cpus_for(stage))}: {fields}")
+        return "\n".join(lines)
@@ -0,0 +1,49 @@
+import os
+import re
+import json
+import platform
+
+PROFILES_FILE = "./model/yolo-profiles.json"
+
+def hardware_name():
+    """Profile name of this machine: the device-tree model on Jetson, else the CPU architecture and host name."""
+    try:
+        with open('/proc/device-tree/model') as f:
+            model = f.read().strip('\x00\n ')
+    except OSError:
+        model = f"{platform.machine()}-{platform.node()}"
+    return re.sub(r'[^a-z0-9]+', '-', model.lower()).strip('-')
+
+def load_profiles(path=PROFILES_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_profile(name, profile, path=PROFILES_FILE):
+    """Add or replace one hardware profile, other profiles in the file are kept."""
+    profiles = load_profiles(path)
+    profiles[name] = profile
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(profiles, f, indent=2)
+
+def load_profile(spec, path=PROFILES_FILE):
+    """yolo.py argument values of "NAME" (its selected configuration) or "NAME:CONFIG",
+    and the extra arguments every tuning run was given.
+
+    An empty NAME is this machine's hardware_name().
+    """
+    name, _, config = spec.partition(':')
+    name = name or hardware_name()
+    profiles = load_profiles(path)
+    if name not in profiles:
+        raise ValueError(f"No profile {name} in {path} (available: {', '.join(profiles) or 'none'})")
+    profile = profiles[name]
+    config = config or profile['selected']
+    for entry in profile['configs']:
+        if entry['name'] == config:
+            return entry['args'], profile.get('extra_args', [])
+    raise ValueError(f"Profile {name} has no configuration {config}")
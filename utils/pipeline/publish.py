@@ -0,0 +1,136 @@
+import os
+import zlib
+import socket
+import struct
+import numpy as np
+from urllib.parse import urlparse
+
+# Track packet layout (see doc/YOLO.md "Track stream"), one datagram per processed frame:
+#   PUBLISH_HEADER  magic b"FPVK", version, source, trace flags, sequence, frame id,
+#                   capture timestamp (time.monotonic(), same clock in every local process),
+#                   frame width/height, track count
+#   ...             count records of PUBLISH_DTYPE
+PUBLISH_MAGIC   = b"FPVK"
+PUBLISH_VERSION = 1
+PUBLISH_HEADER  = struct.Struct("<4sBBHIIdHHH2x")
+
+PUBLISH_DTYPE = np.dtype([
+    ('track_id',   '<u4'),
+    ('cls',        '<i2'),  # Model class index, -1 if unknown
+    ('state',      'u1'),   # PUBLISH_STATE_* bits
+    ('reserved',   'u1'),
+    ('x1',         '<f4'),  # Box in frame pixels
+    ('y1',         '<f4'),
+    ('x2',         '<f4'),
+    ('y2',         '<f4'),
+    ('confidence', '<f4'),  # Detection confidence of the last update, 0 if none
+])
+
+PUBLISH_STATE_CONFIRMED = 0x01  # Track confirmed by the tracker
+PUBLISH_STATE_DETECTED  = 0x02  # Box updated by a detection on this frame
+
+PUBLISH_MAX_TRACKS = 1024  # Keeps a packet well inside one UDP datagram
+
+def parse_uri(uri):
+    """udp://host:port or unix:///path/to/socket -> (family, address)."""
+    parsed = urlparse(uri)
+    if parsed.scheme == "udp":
+        if not parsed.port:
+            raise ValueError(f"{uri}: UDP destination needs a port")
+        return socket.AF_INET, (parsed.hostname or "127.0.0.1", parsed.port)
+    if parsed.scheme == "unix":
+        return socket.AF_UNIX, parsed.netloc + parsed.path
+    raise ValueError(f"{uri}: expected udp://host:port or unix:///path")
+
+def track_number(track_id):
+    """DeepSort ids are decimal strings, anything else is hashed to 32 bits."""
+    try:
+        return int(track_id) & 0xFFFFFFFF
+    except (TypeError, ValueError):
+        return zlib.crc32(str(track_id).encode("utf-8"))
+
+class TrackPublisher:
+    """Send the tracks of every processed frame as one binary datagram.
+
+    The socket is non-blocking and nothing is retried: a packet that cannot be
+    sent (no subscriber, full buffer) is counted and dropped, the sequence
+    number still advances so subscribers see the gap. Call publish() from a
+    single thread.
+    """
+
+    def __init__(self, uri, max_tracks=PUBLISH_MAX_TRACKS):
+        self.uri = uri
+        self.family, self.address = parse_uri(uri)
+        self.sock = socket.socket(self.family, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.max_tracks = max_tracks
+        self.buffer = bytearray(PUBLISH_HEADER.size + max_tracks * PUBLISH_DTYPE.itemsize)
+        self.records = np.frombuffer(self.buffer, dtype=PUBLISH_DTYPE, count=max_tracks,
+                                     offset=PUBLISH_HEADER.size)
+        self.sequence = 0
+
+        # Statistics
+        self.sent = 0
+        self.dropped = 0
+        self.truncated = 0
+
+    def publish(self, frame_id, capture_ts, tracks, width, height, source=0, flags=0):
+        count = min(len(tracks), self.max_tracks)
+        if count < len(tracks):
+            self.truncated += 1
+        records = self.records
+        for index, track in enumerate(tracks[:count]):
+            x1, y1, x2, y2 = track.to_ltrb()
+            state = PUBLISH_STATE_CONFIRMED if track.is_confirmed() else 0
+            if track.time_since_update == 0:
+                state |= PUBLISH_STATE_DETECTED
+            confidence = getattr(track, 'det_conf', None)
+            cls = getattr(track, 'det_class', None)
+            records[index] = (track_number(track.track_id), -1 if cls is None else int(cls), state, 0,
+                              x1, y1, x2, y2, confidence or 0.0)
+        PUBLISH_HEADER.pack_into(self.buffer, 0, PUBLISH_MAGIC, PUBLISH_VERSION, source, flags,
+                                 self.sequence, frame_id, capture_ts, width, height, count)
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        try:
+            self.sock.sendto(memoryview(self.buffer)[:PUBLISH_HEADER.size + count * PUBLISH_DTYPE.itemsize],
+                             self.address)
+            self.sent += 1
+        except OSError:
+            # No subscriber yet (ECONNREFUSED/ENOENT) or socket buffer full (EAGAIN)
+            self.dropped += 1
+
+    def close(self):
+        self.sock.close()
+
+    def summary(self):
+        return (f"{self.sent} packets sent to {self.uri}, {self.dropped} dropped, "
+                f"{self.truncated} truncated to {self.max_tracks} tracks")
+
+def decode_packet(data):
+    """Parse one datagram, returns (header dict, PUBLISH_DTYPE records)."""
+    if len(data) < PUBLISH_HEADER.size:
+        raise ValueError("short track packet")
+    magic, version, source, flags, sequence, frame_id, capture_ts, width, height, count = \
+        PUBLISH_HEADER.unpack_from(data, 0)
+    if magic != PUBLISH_MAGIC or version != PUBLISH_VERSION:
+        raise ValueError(f"not a track packet (magic {magic!r}, version {version})")
+    records = np.frombuffer(data, dtype=PUBLISH_DTYPE, count=count, offset=PUBLISH_HEADER.size)
+    header = {
+        'source': source,
+        'flags': flags,
+        'sequence': sequence,
+        'frame_id': frame_id,
+        'capture_ts': capture_ts,
+        'width': width,
+        'height': height,
+    }
+    return header, records
+
+def open_subscriber(uri):
+    """Bound datagram socket receiving what a TrackPublisher sends to uri."""
+    family, address = parse_uri(uri)
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    if family == socket.AF_UNIX and os.path.exists(address):
+        os.unlink(address)
+    sock.bind(address)
+    return sock
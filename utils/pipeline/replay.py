@@ -0,0 +1,134 @@
+import os
+import time
+import cv2
+import numpy as np
+from collections import deque
+
+REPLAY_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class ReplaySource:
+    """Frames of a recorded video file or of a directory of images, as RGB arrays.
+
+    RGB matches what cudaToNumpy() hands the live pipeline.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(REPLAY_IMAGE_EXTENSIONS))
+            if not self.files:
+                raise ValueError(f"No images found in {path}")
+            self.capture = None
+        else:
+            self.files = None
+            self.capture = cv2.VideoCapture(path)
+            if not self.capture.isOpened():
+                raise ValueError(f"Unable to open {path}")
+
+    def frame_rate(self):
+        if self.capture is not None:
+            fps = self.capture.get(cv2.CAP_PROP_FPS)
+            if fps and fps > 0:
+                return fps
+        return 30.0
+
+    def __iter__(self):
+        if self.files is not None:
+            for index, name in enumerate(self.files):
+                frame = cv2.imread(name, cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                yield index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        else:
+            index = 0
+            try:
+                while True:
+                    ok, frame = self.capture.read()
+                    if not ok:
+                        break
+                    yield index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    index += 1
+            finally:
+                # Also when the consumer stops iterating early
+                self.capture.release()
+
+class ReplayResult:
+    def __init__(self):
+        self.frames = 0
+        self.processed = 0
+        self.dropped = 0
+        self.stopped = False  # Interrupted before the end of the input
+        self.latencies = []
+        self.costs = []
+        self.wall_time = 0.0
+        self.virtual_time = 0.0
+
+    def report(self):
+        latencies = np.asarray(self.latencies) if self.latencies else np.zeros(1)
+        costs = np.asarray(self.costs) if self.costs else np.zeros(1)
+        return {
+            'frames': self.frames,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'stopped': self.stopped,
+            'wall_time': self.wall_time,
+            'virtual_time': self.virtual_time,
+            'throughput_fps': self.processed / self.wall_time if self.wall_time > 0 else 0.0,
+            'virtual_fps': self.processed / self.virtual_time if self.virtual_time > 0 else 0.0,
+            'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p95': float(np.percentile(latencies, 95)),
+            'latency_p99': float(np.percentile(latencies, 99)),
+            'latency_max': float(latencies.max()),
+            'cost_mean': float(costs.mean()),
+            'cost_p95': float(np.percentile(costs, 95)),
+        }
+
+def run_replay(source, process, fps=0.0, queue_size=20, stop=None):
+    """Drive process() with the frames of source on a virtual clock.
+
+    process(frame_id, frame, arrival_ts) must return the virtual service time
+    of the frame in seconds. With fps > 0, frame i arrives at i / fps and is
+    dropped if queue_size frames are already waiting, exactly like the live
+    capture thread; the schedule only depends on the returned service times.
+    With fps == 0 every frame is processed back to back (as fast as possible).
+    Setting the stop event ends the replay before the next frame.
+    """
+    result = ReplayResult()
+    period = 1.0 / fps if fps > 0 else 0.0
+    waiting = deque()
+    busy_until = 0.0  # Virtual time the consumer becomes free
+    wall_start = time.perf_counter()
+
+    def serve(until):
+        nonlocal busy_until
+        while waiting and max(busy_until, waiting[0][2]) <= until:
+            if stop is not None and stop.is_set():
+                result.stopped = True
+                return
+            frame_id, frame, arrival = waiting.popleft()
+            start = max(busy_until, arrival)
+            cost = process(frame_id, frame, arrival)
+            busy_until = start + cost
+            result.processed += 1
+            result.costs.append(cost)
+            result.latencies.append(busy_until - arrival)
+
+    for frame_id, frame in source:
+        if stop is not None and stop.is_set():
+            result.stopped = True
+            break
+        result.frames += 1
+        arrival = frame_id * period if period else busy_until
+        serve(arrival)
+        if len(waiting) >= queue_size:
+            result.dropped += 1
+        else:
+            waiting.append((frame_id, frame, arrival))
+        if not period:
+            serve(arrival)
+    serve(float('inf'))
+
+    result.wall_time = time.perf_counter() - wall_start
+    result.virtual_time = busy_until
+    return result
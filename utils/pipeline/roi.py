@@ -0,0 +1,98 @@
+import math
+import cv2
+import numpy as np
+from pipeline.backends import MODEL_STRIDE, MIN_CONFIDENCE, NMS_IOU_THRESHOLD, letterbox, scale_boxes
+
+ROI_SIZE     = 256  # Detector input per region, native resolution for targets that fit
+ROI_MAX      = 4    # Regions per batch
+ROI_PADDING  = 1.0  # Context added around a track box, in box sizes
+
+class RoiDetector:
+    """Re-detect only around confirmed tracks with a batch of fixed-size crops.
+
+    Each region is a square of at least `size` pixels centred on a track and
+    clamped to the frame; a target that fits is seen at native resolution,
+    bigger ones are downscaled into the region. Results are mapped back to
+    frame coordinates and duplicates from overlapping regions are merged.
+    """
+
+    def __init__(self, backend, size=ROI_SIZE, max_rois=ROI_MAX, padding=ROI_PADDING, max_batch=None):
+        self.backend = backend
+        self.size = size
+        self.max_rois = max_rois
+        self.padding = padding
+        self.max_batch = max_batch or backend.max_batch() or max_rois
+
+        # Statistics
+        self.calls = 0
+        self.regions = 0
+        self.total_ms = 0.0
+
+    def warmup(self, runs):
+        dummy = np.zeros((self.size, self.size, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.backend.infer([dummy] * min(self.max_rois, self.max_batch), (self.size, self.size))
+
+    def select(self, tracks, frame_shape):
+        """Regions (x0, y0, x1, y1) around confirmed tracks, smallest targets first."""
+        height, width = frame_shape[:2]
+        limit = min(height, width)
+        candidates = []
+        for track in tracks:
+            if not track.is_confirmed():
+                continue
+            x1, y1, x2, y2 = track.to_ltrb()
+            box_w, box_h = x2 - x1, y2 - y1
+            if box_w <= 0 or box_h <= 0:
+                continue
+            candidates.append((box_w * box_h, x1, y1, x2, y2))
+        candidates.sort(key=lambda c: c[0])
+
+        regions = []
+        for _, x1, y1, x2, y2 in candidates:
+            if len(regions) >= self.max_rois:
+                break
+            # Skip targets already inside a selected region
+            if any(rx0 <= x1 and ry0 <= y1 and x2 <= rx1 and y2 <= ry1 for rx0, ry0, rx1, ry1 in regions):
+                continue
+            side = max(x2 - x1, y2 - y1) * (1 + self.padding)
+            side = min(limit, max(self.size, int(math.ceil(side / MODEL_STRIDE)) * MODEL_STRIDE))
+            x0 = int(min(max((x1 + x2 - side) / 2, 0), width - side))
+            y0 = int(min(max((y1 + y2 - side) / 2, 0), height - side))
+            regions.append((x0, y0, x0 + side, y0 + side))
+        return regions
+
+    def detect(self, frame, regions):
+        """Detect in regions, return [x1, y1, x2, y2, conf, cls] rows in frame coordinates and the inference ms."""
+        imgsz = (self.size, self.size)
+        images, transforms = [], []
+        for x0, y0, x1, y1 in regions:
+            image, scale, pad = letterbox(frame[y0:y1, x0:x1], imgsz)
+            images.append(image)
+            transforms.append((scale, pad, (x0, y0)))
+
+        results = []
+        inference_ms = 0.0
+        for start in range(0, len(images), self.max_batch):
+            results.extend(self.backend.infer(images[start:start + self.max_batch], imgsz))
+            inference_ms += self.backend.inference_ms
+
+        boxes = [scale_boxes(result, *transform) for result, transform in zip(results, transforms) if len(result)]
+        boxes = np.concatenate(boxes) if boxes else np.zeros((0, 6), dtype=np.float32)
+        if len(regions) > 1 and len(boxes) > 1:
+            # A target seen by two overlapping regions: class-aware NMS in frame coordinates
+            offset = boxes[:, 5:6] * 8192.0
+            xywh = np.concatenate([boxes[:, 0:2] + offset, boxes[:, 2:4] - boxes[:, 0:2]], axis=1)
+            keep = cv2.dnn.NMSBoxes(xywh.tolist(), boxes[:, 4].tolist(), MIN_CONFIDENCE, NMS_IOU_THRESHOLD)
+            boxes = boxes[np.asarray(keep, dtype=int).reshape(-1)]
+
+        self.calls += 1
+        self.regions += len(regions)
+        self.total_ms += inference_ms
+        return boxes, inference_ms
+
+    def summary(self):
+        if not self.calls:
+            return "no ROI batches"
+        return (f"{self.calls} batches, {self.regions / self.calls:.1f} regions/batch of {self.size}x{self.size}, "
+                f"{self.total_ms / self.calls:.2f}ms/batch, {self.total_ms / self.regions:.2f}ms/region")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import sys
+import socket
+import struct
+import threading
+from urllib.parse import urlparse
+
+RTP_MONITOR_PORT = 5601   # Local port the decoder reads when the monitor owns the stream port
+RTP_MAX_PACKET   = 65536
+
+# Integrity bits of a captured frame
+FRAME_DAMAGED = 0x01  # Packets lost since the previous captured frame
+FRAME_SUSPECT = 0x02  # Packets lost since the last keyframe, errors may have propagated
+
+# NAL unit types starting a keyframe (H.264 IDR/SPS, H.265 IRAP/VPS/SPS)
+H264_KEY_NALS = {5, 7}
+H265_KEY_NALS = set(range(16, 22)) | {32, 33}
+
+def rtp_port(uri):
+    """Port of an rtp://@:port input, None for anything else."""
+    parsed = urlparse(uri)
+    return parsed.port if parsed.scheme == "rtp" else None
+
+def key_frame_start(payload, codec):
+    """True if this RTP payload starts a keyframe (single NAL, aggregation or first fragment)."""
+    if not payload:
+        return False
+    if codec == "h265":
+        if len(payload) < 3:
+            return False
+        nal = (payload[0] >> 1) & 0x3F
+        if nal == 49:  # Fragmentation unit, start bit
+            return bool(payload[2] & 0x80) and (payload[2] & 0x3F) in H265_KEY_NALS
+        if nal == 48:  # Aggregation packet, first unit after the 2-byte header and 2-byte size
+            return len(payload) > 4 and ((payload[4] >> 1) & 0x3F) in H265_KEY_NALS
+        return nal in H265_KEY_NALS
+    nal = payload[0] & 0x1F
+    if nal == 28:  # FU-A, start bit
+        return len(payload) > 1 and bool(payload[1] & 0x80) and (payload[1] & 0x1F) in H264_KEY_NALS
+    if nal == 24:  # STAP-A, first unit after the 1-byte header and 2-byte size
+        return len(payload) > 3 and (payload[3] & 0x1F) in H264_KEY_NALS
+    return nal in H264_KEY_NALS
+
+class RtpMonitor:
+    """UDP relay in front of the decoder that watches the RTP stream's integrity.
+
+    wifibroadcast delivers RTP after FEC, so a sequence gap is data FEC could
+    not recover. The relay thread counts gaps, access units (marker bit) and
+    keyframes; sample() is called by the capture thread once per decoded
+    frame and returns the FRAME_* bits and the distance to the last keyframe.
+    """
+
+    def __init__(self, listen_port, forward_port=RTP_MONITOR_PORT, codec="h264", forward_host="127.0.0.1"):
+        self.codec = codec
+        self.forward = (forward_host, forward_port)
+        self.rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.rx.bind(("0.0.0.0", listen_port))
+        self.rx.settimeout(0.5)
+        self.tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._relay, name="rtp-monitor", daemon=True)
+
+        # Relay thread state, read by sample()
+        self.expected = None
+        self.packets = 0
+        self.lost = 0
+        self.loss_events = 0
+        self.reordered = 0
+        self.access_units = 0
+        self.keyframes = 0
+        self.keyframe_unit = None      # Access unit index of the last keyframe
+        self.loss_since_keyframe = True
+
+        # Capture side
+        self.sampled_loss_events = 0
+        self.frames = 0
+        self.damaged = 0
+        self.suspect = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _relay(self):
+        while not self.stopped.is_set():
+            try:
+                data = self.rx.recv(RTP_MAX_PACKET)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self.tx.sendto(data, self.forward)
+            except OSError:
+                pass
+            self.inspect(data)
+
+    def inspect(self, data):
+        if len(data) < 12 or data[0] >> 6 != 2:
+            return
+        csrc = data[0] & 0x0F
+        marker = data[1] & 0x80
+        seq = struct.unpack_from("!H", data, 2)[0]
+        offset = 12 + 4 * csrc
+        if data[0] & 0x10 and len(data) >= offset + 4:  # Header extension
+            offset += 4 + 4 * struct.unpack_from("!H", data, offset + 2)[0]
+        self.packets += 1
+
+        if self.expected is not None and seq != self.expected:
+            gap = (seq - self.expected) & 0xFFFF
+            if gap >= 0x8000:
+                # Late or duplicate packet, the decoder has moved on
+                self.reordered += 1
+                return
+            self.lost += gap
+            self.loss_events += 1
+            self.loss_since_keyframe = True
+        self.expected = (seq + 1) & 0xFFFF
+
+        if key_frame_start(data[offset:offset + 5], self.codec):
+            if self.keyframe_unit != self.access_units:
+                self.keyframes += 1
+            self.keyframe_unit = self.access_units
+            self.loss_since_keyframe = False
+        if marker:
+            self.access_units += 1
+
+    def sample(self):
+        """Integrity of the frame just decoded: (FRAME_* bits, frames since the last keyframe, -1 if none yet)."""
+        loss_events = self.loss_events
+        flags = 0
+        if loss_events != self.sampled_loss_events:
+            flags |= FRAME_DAMAGED
+        if self.loss_since_keyframe:
+            flags |= FRAME_SUSPECT
+        self.sampled_loss_events = loss_events
+        keyframe_unit = self.keyframe_unit
+        distance = max(0, self.access_units - keyframe_unit - 1) if keyframe_unit is not None else -1
+
+        self.frames += 1
+        if flags & FRAME_DAMAGED:
+            self.damaged += 1
+        elif flags & FRAME_SUSPECT:
+            self.suspect += 1
+        return flags, distance
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.rx.close()
+        self.tx.close()
+
+    def summary(self):
+        total = self.packets + self.lost
+        return (f"{self.packets} packets, {self.lost} lost ({100.0 * self.lost / total if total else 0.0:.2f}%) "
+                f"in {self.loss_events} gaps, {self.reordered} late, {self.access_units} frames, "
+                f"{self.keyframes} keyframes; decoded frames {self.frames}: {self.damaged} damaged, "
+                f"{self.suspect} after a loss before the next keyframe")
+
+if __name__ == "__main__":
+    # Standalone relay: python3 ./utils/pipeline/rtpmon.py <listen port> <forward port> [h264|h265]
+    if len(sys.argv) < 3:
+        print(f"Usage: {sys.argv[0]} <listen port> <forward port> [h264|h265]")
+        sys.exit(1)
+    monitor = RtpMonitor(int(sys.argv[1]), int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else "h264").start()
+    try:
+        while True:
+            monitor.stopped.wait(5.0)
+            print(monitor.summary())
+    except KeyboardInterrupt:
+        monitor.close()
@@ -0,0 +1,124 @@
+import time
+import threading
+from queue import Queue, Empty, Full
+
+STAGE_DEPTH = 2  # Items a handoff holds: one being produced while the next stage consumes the other
+
+STAGE_END = object()  # Sent down the stages after the last item
+
+class StageMeter:
+    """Occupancy of one stage: time busy, starved (waiting for input) and blocked (output full)."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.start = None
+        self.end = None
+
+    def elapsed(self):
+        if self.start is None:
+            return 0.0
+        return (self.end or time.perf_counter()) - self.start
+
+    def summary(self):
+        elapsed = self.elapsed()
+        if not self.items or elapsed <= 0:
+            return f"{self.name}: no items"
+        return (f"{self.name}: {self.items} items, {self.busy / self.items * 1000:.2f}ms/item, "
+                f"busy {100 * self.busy / elapsed:.0f}% starved {100 * self.starved / elapsed:.0f}% "
+                f"blocked {100 * self.blocked / elapsed:.0f}%")
+
+class Handoff:
+    """Bounded FIFO between two stages that records how full it was when read.
+
+    An existing Queue (e.g. the capture queue) can be wrapped to feed the first stage.
+    """
+
+    def __init__(self, depth=STAGE_DEPTH, queue=None):
+        self.queue = queue if queue is not None else Queue(maxsize=depth)
+        self.depth = self.queue.maxsize
+        self.reads = 0
+        self.occupancy = 0  # Sum of the queue sizes seen by the consumer
+
+    def put(self, item, meter, stop):
+        """Blocking put accounted as blocked time, gives up when stop is set."""
+        mark = time.perf_counter()
+        while True:
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except Full:
+                if stop.is_set():
+                    break
+        meter.blocked += time.perf_counter() - mark
+
+    def get(self, meter, timeout=0.1):
+        """Item or None on timeout, the wait is accounted as starved time."""
+        mark = time.perf_counter()
+        try:
+            item = self.queue.get(timeout=timeout)
+        except Empty:
+            item = None
+        meter.starved += time.perf_counter() - mark
+        if item is not None:
+            self.reads += 1
+            self.occupancy += self.queue.qsize() + 1
+        return item
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                return
+
+    def summary(self):
+        mean = self.occupancy / self.reads if self.reads else 0.0
+        return f"mean depth {mean:.2f}/{self.depth}"
+
+class Stage(threading.Thread):
+    """Thread running work(item) on every item of inbox and passing the result to outbox.
+
+    STAGE_END is forwarded and ends the stage; the first stage, which has no
+    upstream stage, ends when its inbox is empty and done() returns True.
+    An exception in work() sets stop, so the other stages wind down.
+    """
+
+    def __init__(self, name, work, inbox, outbox, stop, done=None, on_start=None):
+        super().__init__(name=name, daemon=True)
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stop = stop
+        self.done = done
+        self.on_start = on_start
+        self.meter = StageMeter(name)
+        self.error = None
+
+    def run(self):
+        if self.on_start:
+            self.on_start()
+        meter = self.meter
+        meter.start = time.perf_counter()
+        try:
+            while not self.stop.is_set():
+                item = self.inbox.get(meter)
+                if item is None:
+                    if self.done and self.done():
+                        break
+                    continue
+                if item is STAGE_END:
+                    break
+                mark = time.perf_counter()
+                result = self.work(item)
+                meter.busy += time.perf_counter() - mark
+                meter.items += 1
+                self.outbox.put(result, meter, self.stop)
+        except Exception as e:
+            self.error = e
+            self.stop.set()
+        meter.end = time.perf_counter()
+        self.outbox.put(STAGE_END, meter, self.stop)
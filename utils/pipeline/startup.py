@@ -0,0 +1,68 @@
+import os
+import json
+import time
+import threading
+
+def process_age():
+    """Seconds since the kernel started this process (Linux), None if unknown.
+
+    Covers interpreter start-up and the imports that ran before the
+    timeline was created, at clock-tick resolution (usually 10ms).
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StartupTimeline:
+    """Named start-up milestones in seconds since process start.
+
+    Create it before the heavy imports, then mark() each milestone (imports,
+    args, model_load, pipeline, first_frame, ...). Only the first mark of an
+    event counts, so per-source threads can mark the same event safely.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        age = process_age()
+        self.origin = time.monotonic() - (age or 0.0)
+        self.events = []  # (event, seconds since process start)
+        self.lock = threading.Lock()
+
+    def mark(self, event):
+        with self.lock:
+            if any(name == event for name, _ in self.events):
+                return False
+            self.events.append((event, time.monotonic() - self.origin))
+        return True
+
+    def has(self, event):
+        return any(name == event for name, _ in self.events)
+
+    def elapsed(self, event):
+        for name, seconds in self.events:
+            if name == event:
+                return seconds
+        return None
+
+    def report(self):
+        parts, previous = [], 0.0
+        for name, seconds in self.events:
+            parts.append(f"{name} {seconds:.3f}s (+{seconds - previous:.3f})")
+            previous = seconds
+        return f"Startup {self.name}: " + (", ".join(parts) if parts else "no events")
+
+    def export(self, path):
+        """Append this run as one JSON line, so repeated runs build a benchmark file."""
+        record = {
+            'module': self.name,
+            'pid': os.getpid(),
+            'time': time.time(),
+            'events': {name: round(seconds, 6) for name, seconds in self.events},
+        }
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
@@ -0,0 +1,133 @@
+import math
+import time
+
+# Histogram layout: log-spaced buckets between STATS_MIN_VALUE and STATS_MAX_VALUE
+# (seconds for latencies), ~6% relative resolution with 40 buckets per decade.
+STATS_MIN_VALUE          = 1e-5
+STATS_MAX_VALUE          = 10.0
+STATS_BUCKETS_PER_DECADE = 40
+STATS_EWMA_ALPHA         = 0.1
+STATS_WINDOW_SEC         = 5.0
+
+class StreamingStats:
+    """O(1) EWMA and fixed-memory log histogram for one metric.
+
+    Each instance must have a single writer thread; readers only look at
+    `ewma`, `latest` and the immutable `window` dict, so no lock is taken.
+    The histogram is reset every `window_sec` seconds by the writer and the
+    completed window is published as `window` (count/mean/min/max/p50/p95/p99).
+    """
+
+    def __init__(self, alpha=STATS_EWMA_ALPHA, window_sec=STATS_WINDOW_SEC,
+                 min_value=STATS_MIN_VALUE, max_value=STATS_MAX_VALUE, buckets_per_decade=STATS_BUCKETS_PER_DECADE):
+        self.alpha = alpha
+        self.window_sec = window_sec
+        self.min_value = min_value
+        self.buckets_per_decade = buckets_per_decade
+        # Bucket 0 is underflow, the last bucket is overflow
+        self.num_buckets = int(math.ceil(math.log10(max_value / min_value) * buckets_per_decade)) + 2
+
+        # Lifetime values
+        self.ewma = 0.0
+        self.latest = 0.0
+        self.count = 0
+        self.min = math.inf
+        self.max = 0.0
+
+        # Current window (writer only)
+        self._counts = [0] * self.num_buckets
+        self._window_count = 0
+        self._window_sum = 0.0
+        self._window_min = math.inf
+        self._window_max = 0.0
+        self._window_start = time.monotonic()
+
+        # Last completed window (readers)
+        self.window = self._empty_window()
+
+    def update(self, value, now=None):
+        if self.count == 0:
+            self.ewma = value
+        else:
+            self.ewma += self.alpha * (value - self.ewma)
+        self.latest = value
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        if value <= self.min_value:
+            index = 0
+        else:
+            index = min(self.num_buckets - 1, int(math.log10(value / self.min_value) * self.buckets_per_decade) + 1)
+        self._counts[index] += 1
+        self._window_count += 1
+        self._window_sum += value
+        if value < self._window_min:
+            self._window_min = value
+        if value > self._window_max:
+            self._window_max = value
+
+        if self.window_sec:
+            now = time.monotonic() if now is None else now
+            if now - self._window_start >= self.window_sec:
+                self.roll(now)
+
+    def rate(self):
+        """Events per second when the metric is an interval or a duration."""
+        return 1.0 / self.ewma if self.ewma > 0 else 0.0
+
+    def _bucket_value(self, index):
+        if index == 0:
+            return self.min_value
+        # Geometric centre of the bucket
+        return self.min_value * 10 ** ((index - 0.5) / self.buckets_per_decade)
+
+    def percentile(self, q, counts=None, total=None):
+        counts = self._counts if counts is None else counts
+        total = sum(counts) if total is None else total
+        if total == 0:
+            return 0.0
+        rank = q / 100.0 * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank and count:
+                return self._bucket_value(index)
+        return self._bucket_value(self.num_buckets - 1)
+
+    def _empty_window(self):
+        return {'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+
+    def roll(self, now=None):
+        """Publish the current window and start a new one (writer thread)."""
+        counts = self._counts
+        total = self._window_count
+        if total:
+            window = {
+                'count': total,
+                'mean': self._window_sum / total,
+                'min': self._window_min,
+                'max': self._window_max,
+                'p50': min(self.percentile(50, counts, total), self._window_max),
+                'p95': min(self.percentile(95, counts, total), self._window_max),
+                'p99': min(self.percentile(99, counts, total), self._window_max),
+            }
+        else:
+            window = self._empty_window()
+        self._counts = [0] * self.num_buckets
+        self._window_count = 0
+        self._window_sum = 0.0
+        self._window_min = math.inf
+        self._window_max = 0.0
+        self._window_start = time.monotonic() if now is None else now
+        self.window = window
+        return window
+
+    def snapshot(self):
+        snap = dict(self.window)
+        snap['ewma'] = self.ewma
+        snap['latest'] = self.latest
+        snap['total'] = self.count
+        return snap
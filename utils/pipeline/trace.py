@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import sys
+import json
+import struct
+import threading
+import numpy as np
+
+# Frame trace file layout (see doc/YOLO.md "Frame trace"):
+#   8 bytes   magic  b"FPVTRACE"
+#   4 bytes   little-endian uint32 header length N
+#   N bytes   UTF-8 JSON header {"version", "clock", "units", "fields"}
+#   ...       packed records of TRACE_DTYPE until end of file
+TRACE_MAGIC   = b"FPVTRACE"
+TRACE_VERSION = 1
+
+TRACE_DTYPE = np.dtype([
+    ('frame_id',   '<u4'),  # Capture frame number
+    ('source',     '<u2'),  # Input source index
+    ('flags',      '<u2'),  # TRACE_FLAG_* bits
+    ('capture_ts', '<f8'),  # time.monotonic() when the frame was captured
+    ('queue_wait', '<f4'),  # Capture to dequeue by the inference thread
+    ('inference',  '<f4'),  # Crop + model inference + post-processing, in whichever stage or batch ran them
+    ('tracking',   '<f4'),  # Tracker update
+    ('draw',       '<f4'),  # Boxes, labels and status bar
+    ('display',    '<f4'),  # Frame output (imshow/render)
+])
+
+TRACE_FLAG_INFERENCE  = 0x0001  # Detector ran on this frame
+TRACE_FLAG_PROPAGATED = 0x0002  # Boxes propagated by optical flow
+TRACE_FLAG_ROI        = 0x0004  # Detector ran on crops around tracks only
+TRACE_FLAG_GATED      = 0x0008  # Scheduled detection skipped by the scene gate
+TRACE_FLAG_TRIAGED    = 0x0010  # Tracked without detection, the frame was damaged by packet loss
+
+TRACE_CAPACITY = 4096  # Records kept in memory between flushes
+
+class TraceRecorder:
+    """Per-frame timing recorder with a preallocated ring and a background flusher.
+
+    record() is meant to be called from a single thread (the inference thread);
+    it only writes into the ring, the file is written by the flusher thread.
+    """
+
+    def __init__(self, path, capacity=TRACE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.ring = np.zeros(capacity, dtype=TRACE_DTYPE)
+        self.head = 0     # Records written (writer only)
+        self.tail = 0     # Records flushed (flusher only)
+        self.dropped = 0  # Records lost because the flusher fell behind
+
+        self.file = open(path, "wb")
+        header = json.dumps({
+            "version": TRACE_VERSION,
+            "clock": "monotonic",
+            "units": "seconds",
+            "fields": [[name, TRACE_DTYPE.fields[name][0].str] for name in TRACE_DTYPE.names],
+        }).encode("utf-8")
+        self.file.write(TRACE_MAGIC + struct.pack("<I", len(header)) + header)
+
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._flush_loop, name="trace-flush", daemon=True)
+        self.thread.start()
+
+    def record(self, frame_id, capture_ts, queue_wait=0.0, inference=0.0, tracking=0.0, draw=0.0, display=0.0,
+               flags=0, source=0):
+        if self.head - self.tail >= self.capacity:
+            self.dropped += 1
+            return
+        self.ring[self.head % self.capacity] = (frame_id, source, flags, capture_ts,
+                                                queue_wait, inference, tracking, draw, display)
+        self.head += 1
+        if self.head - self.tail >= self.capacity // 2:
+            self.wake.set()
+
+    def _flush(self):
+        head = self.head
+        start = self.tail % self.capacity
+        count = head - self.tail
+        if count <= 0:
+            return
+        end = start + count
+        if end <= self.capacity:
+            self.file.write(self.ring[start:end].tobytes())
+        else:
+            self.file.write(self.ring[start:].tobytes())
+            self.file.write(self.ring[:end - self.capacity].tobytes())
+        self.tail = head
+
+    def _flush_loop(self):
+        while not self.stopped.is_set():
+            self.wake.wait(timeout=1.0)
+            self.wake.clear()
+            self._flush()
+        self.file.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join()
+        self._flush()
+        self.file.close()
+        print(f"Frame trace: {self.head} records written to {self.path}, {self.dropped} dropped")
+
+def load_trace(path):
+    """Read a trace file back into a NumPy structured array."""
+    with open(path, "rb") as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a frame trace file")
+        header_len = struct.unpack("<I", f.read(4))[0]
+        header = json.loads(f.read(header_len).decode("utf-8"))
+        dtype = np.dtype([tuple(field) for field in header["fields"]])
+        data = f.read()
+    count = len(data) // dtype.itemsize
+    return np.frombuffer(data[:count * dtype.itemsize], dtype=dtype)
+
+def summarize(records):
+    lines = [f"frames {len(records)}, inference frames {np.count_nonzero(records['flags'] & TRACE_FLAG_INFERENCE)} "
+             f"(ROI {np.count_nonzero(records['flags'] & TRACE_FLAG_ROI)}), "
+             f"triaged {np.count_nonzero(records['flags'] & TRACE_FLAG_TRIAGED)}"]
+    if len(records) > 1:
+        span = records['capture_ts'][-1] - records['capture_ts'][0]
+        if span > 0:
+            lines.append(f"throughput {(len(records) - 1) / span:.1f} FPS")
+    for name in ('queue_wait', 'inference', 'tracking', 'draw', 'display'):
+        values = records[name]
+        if name == 'inference':
+            values = values[(records['flags'] & TRACE_FLAG_INFERENCE) != 0]
+        if len(values) == 0:
+            continue
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        lines.append(f"{name:>10}: p50 {p50:.2f}ms p95 {p95:.2f}ms p99 {p99:.2f}ms max {values.max()*1000:.2f}ms")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <trace file>")
+        sys.exit(1)
+    print(summarize(load_trace(sys.argv[1])))
@@ -0,0 +1,150 @@
+import threading
+import numpy as np
+
+TRAJECTORY_TRACKS   = 64    # Tracks kept at most, the least recently seen is evicted first
+TRAJECTORY_LENGTH   = 64    # Samples kept per track
+TRAJECTORY_MAX_AGE  = 2.0   # Seconds without an update before a track is dropped
+TRAJECTORY_VELOCITY = 8     # Samples of the default velocity fit
+TRAJECTORY_ALPHA    = 0.5   # EWMA of the per-sample velocity
+
+TRAJECTORY_DTYPE = np.dtype([
+    ('t',  '<f8'),  # Capture timestamp, seconds (time.monotonic())
+    ('cx', '<f4'),  # Box centre, frame pixels
+    ('cy', '<f4'),
+    ('w',  '<f4'),  # Box size
+    ('h',  '<f4'),
+    ('vx', '<f4'),  # Smoothed centre velocity, pixels/s
+    ('vy', '<f4'),
+])
+
+class TrajectoryStore:
+    """Motion history of confirmed tracks in preallocated per-track rings.
+
+    All samples live in one (max_tracks, length) structured array, so memory
+    is fixed at construction whatever the number of tracks seen. update()
+    is called by the inference thread once per frame; queries may come from
+    other threads and return copies.
+    """
+
+    def __init__(self, max_tracks=TRAJECTORY_TRACKS, length=TRAJECTORY_LENGTH, max_age=TRAJECTORY_MAX_AGE):
+        self.max_tracks = max_tracks
+        self.length = length
+        self.max_age = max_age
+        self.samples = np.zeros((max_tracks, length), dtype=TRAJECTORY_DTYPE)
+        self.count = np.zeros(max_tracks, dtype=np.int64)      # Samples written per slot
+        self.last_seen = np.full(max_tracks, -np.inf)          # Latest timestamp per slot, -inf when free
+        self.slots = {}                                        # track_id -> slot
+        self.owners = [None] * max_tracks                      # slot -> track_id
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.updates = 0
+        self.evicted = 0   # Live tracks dropped to make room
+        self.expired = 0   # Dead tracks dropped after max_age
+
+    def _slot(self, track_id, timestamp):
+        slot = self.slots.get(track_id)
+        if slot is not None:
+            return slot
+        slot = int(np.argmin(self.last_seen))
+        if self.owners[slot] is not None:
+            del self.slots[self.owners[slot]]
+            self.evicted += 1
+        self.slots[track_id] = slot
+        self.owners[slot] = track_id
+        self.count[slot] = 0
+        self.last_seen[slot] = timestamp
+        return slot
+
+    def _release(self, slot):
+        del self.slots[self.owners[slot]]
+        self.owners[slot] = None
+        self.count[slot] = 0
+        self.last_seen[slot] = -np.inf
+
+    def update(self, tracks, timestamp):
+        """Append the boxes of the confirmed tracks at timestamp, then drop dead tracks."""
+        with self.lock:
+            confirmed = [track for track in tracks if track.is_confirmed()]
+            if confirmed:
+                slots = np.array([self._slot(track.track_id, timestamp) for track in confirmed])
+                boxes = np.array([track.to_ltrb() for track in confirmed], dtype=np.float64)
+                cx, cy = (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+                n = self.count[slots]
+
+                # Velocity against the previous sample of each track, smoothed
+                vx, vy = np.zeros(len(slots)), np.zeros(len(slots))
+                has_previous = n > 0
+                if np.any(has_previous):
+                    previous = self.samples[slots[has_previous], (n[has_previous] - 1) % self.length]
+                    dt = timestamp - previous['t']
+                    valid = dt > 0
+                    dt = np.where(valid, dt, 1.0)
+                    step_vx = np.where(valid, (cx[has_previous] - previous['cx']) / dt, previous['vx'])
+                    step_vy = np.where(valid, (cy[has_previous] - previous['cy']) / dt, previous['vy'])
+                    vx[has_previous] = previous['vx'] + TRAJECTORY_ALPHA * (step_vx - previous['vx'])
+                    vy[has_previous] = previous['vy'] + TRAJECTORY_ALPHA * (step_vy - previous['vy'])
+
+                rows = self.samples[slots, n % self.length]
+                rows['t'] = timestamp
+                rows['cx'], rows['cy'] = cx, cy
+                rows['w'], rows['h'] = boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]
+                rows['vx'], rows['vy'] = vx, vy
+                self.samples[slots, n % self.length] = rows
+                self.count[slots] = n + 1
+                self.last_seen[slots] = timestamp
+
+            for slot in np.flatnonzero(timestamp - self.last_seen > self.max_age):
+                if self.owners[slot] is not None:
+                    self._release(slot)
+                    self.expired += 1
+            self.updates += 1
+
+    def _history(self, slot, n):
+        count = self.count[slot]
+        n = min(count, self.length) if n is None else min(n, count, self.length)
+        index = np.arange(count - n, count) % self.length
+        return self.samples[slot, index]
+
+    def history(self, track_id, n=None):
+        """Last n samples of a track (all kept samples by default), oldest first."""
+        with self.lock:
+            slot = self.slots.get(track_id)
+            if slot is None:
+                return np.zeros(0, dtype=TRAJECTORY_DTYPE)
+            return self._history(slot, n)
+
+    def velocity(self, track_id, n=TRAJECTORY_VELOCITY):
+        """(vx, vy) in pixels/s from a least-squares line through the last n centres, None if unknown."""
+        samples = self.history(track_id, n)
+        if len(samples) < 2:
+            return None
+        t = samples['t'] - samples['t'][-1]
+        if np.ptp(t) <= 0:
+            return None
+        t_centered = t - t.mean()
+        denominator = np.dot(t_centered, t_centered)
+        vx = np.dot(t_centered, samples['cx'] - samples['cx'].mean()) / denominator
+        vy = np.dot(t_centered, samples['cy'] - samples['cy'].mean()) / denominator
+        return float(vx), float(vy)
+
+    def latest(self):
+        """{track_id: latest sample} of the live tracks."""
+        with self.lock:
+            return {track_id: self.samples[slot, (self.count[slot] - 1) % self.length].copy()
+                    for track_id, slot in self.slots.items() if self.count[slot]}
+
+    def in_region(self, x0, y0, x1, y1):
+        """Ids of the tracks whose latest centre is inside [x0, x1) x [y0, y1)."""
+        with self.lock:
+            slots = np.flatnonzero(self.count > 0)
+            if len(slots) == 0:
+                return []
+            last = self.samples[slots, (self.count[slots] - 1) % self.length]
+            inside = (last['cx'] >= x0) & (last['cx'] < x1) & (last['cy'] >= y0) & (last['cy'] < y1)
+            return [self.owners[slot] for slot in slots[inside]]
+
+    def summary(self):
+        kilobytes = (self.samples.nbytes + self.count.nbytes + self.last_seen.nbytes) / 1024
+        return (f"{len(self.slots)}/{self.max_tracks} tracks x {self.length} samples ({kilobytes:.0f}KB), "
+                f"{self.updates} updates, {self.expired} expired, {self.evicted} evicted")
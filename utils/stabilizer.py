@@ -15,7 +15,11 @@ import time
 import signal
 import threading
 import numpy as np
-from jetson_utils import videoSource, videoOutput, cudaToNumpy, cudaFromNumpy, Log
+from pipeline.motion import GlobalMotionEstimator
+from pipeline.startup import StartupTimeline
+
+# jetson_utils is imported in main(), --help does not load it
+startup = StartupTimeline("stabilizer")
 
 if "DISPLAY" not in os.environ:
     os.environ["DISPLAY"] = ":0"
@@ -103,6 +107,7 @@ class Stabilizer:
 
         # Initialize variables for stabilization
         self.lk_params = dict(winSize=(15, 15), maxLevel=3, criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.motion = GlobalMotionEstimator(max_corners=400, quality_level=0.01, min_distance=30, block_size=3, lk_params=self.lk_params)
         self.count = 0
         self.a = 0
         self.x = 0
@@ -153,25 +158,15 @@ class Stabilizer:
         if self.showrectROI == 1:
             cv2.rectangle(self.prevOrig, (top_left[1], top_left[0]), (bottom_right[1], bottom_right[0]), color=(211, 211, 211), thickness=1)
 
-        # Detect good features to track in the previous frame
-        prevPts = cv2.goodFeaturesToTrack(self.prevGray, maxCorners=400, qualityLevel=0.01, minDistance=30, blockSize=3)
+        # Estimate global motion between frames (points offset to match original resolution)
+        m, prevPts, currPts = self.motion.estimate(self.prevGray, currGray,
+                                                   offset=[int(res_w_orig / self.roiDiv), int(res_h_orig / self.roiDiv)])
         if prevPts is not None:
-            # Calculate optical flow to track feature points in the current frame
-            currPts, status, err = cv2.calcOpticalFlowPyrLK(self.prevGray, currGray, prevPts, None, **self.lk_params)
-            assert prevPts.shape == currPts.shape  # Ensure shapes match
-            idx = np.where(status == 1)[0]  # Get indices of successfully tracked points
-            # Offset points to match original resolution
-            prevPts = prevPts[idx] + np.array([int(res_w_orig / self.roiDiv), int(res_h_orig / self.roiDiv)])
-            currPts = currPts[idx] + np.array([int(res_w_orig / self.roiDiv), int(res_h_orig / self.roiDiv)])
             if self.showTrackingPoints == 1:
                 # Display tracking points on the previous original frame
                 for pT in prevPts:
                     cv2.circle(self.prevOrig, (int(pT[0][0]), int(pT[0][1])), 5, (211, 211, 211))
-            if prevPts.size & currPts.size:
-                # Estimate affine transformation between frames
-                m, inliers = cv2.estimateAffinePartial2D(prevPts, currPts)
-            if m is None:
-                m = self.lastRigidTransform  # Use last transformation if current is invalid
+            m = self.lastRigidTransform if m is None else m # Use last transformation if current is invalid
             # Extract translation and rotation from transformation matrix
             dx = m[0, 2]
             dy = m[1, 2]
@@ -307,24 +302,14 @@ class Stabilizer:
         if self.showrectROI == 1:
             cv2.rectangle(self.prevOrig, (top_left[1], top_left[0]), (bottom_right[1], bottom_right[0]), color=(211, 211, 211), thickness=1)
 
-        # Detect good features to track in the previous frame
-        prevPts = cv2.goodFeaturesToTrack(self.prevGray, maxCorners=400, qualityLevel=0.01, minDistance=30, blockSize=3)
-        if prevPts is not None and len(prevPts) > 0:
-            # Calculate optical flow to track feature points in the current frame
-            currPts, status, err = cv2.calcOpticalFlowPyrLK(self.prevGray, currGray, prevPts, None, **self.lk_params)
-
-            assert prevPts.shape == currPts.shape  # Ensure shapes match
-            idx = np.where(status == 1)[0]  # Get indices of successfully tracked points
-            # Offset points to match original resolution
-            prevPts = prevPts[idx] + np.array([int(res_w_orig / self.roiDiv), int(res_h_orig / self.roiDiv)])
-            currPts = currPts[idx] + np.array([int(res_w_orig / self.roiDiv), int(res_h_orig / self.roiDiv)])
+        # Estimate global motion between frames (points offset to match original resolution)
+        m, prevPts, currPts = self.motion.estimate(self.prevGray, currGray,
+                                                   offset=[int(res_w_orig / self.roiDiv), int(res_h_orig / self.roiDiv)])
+        if prevPts is not None:
             if self.showTrackingPoints == 1:
                 # Display tracking points on the previous original frame
                 for pT in prevPts:
                     cv2.circle(self.prevOrig, (int(pT[0][0]), int(pT[0][1])), 5, (211, 211, 211))
-            if prevPts.size & currPts.size:
-                # Estimate affine transformation between frames
-                m, inliers = cv2.estimateAffinePartial2D(prevPts, currPts)
             m = self.lastRigidTransform if m is None else m # Use last transformation if current is invalid
             # Extract translation and rotation from transformation matrix
             dx = m[0, 2]
@@ -442,6 +427,7 @@ Positional Arguments:
 
 Optional Arguments:
     --no-headless       Enable the OpenGL GUI window (default: headless mode is enabled)
+    --startup-log FILE  Append the startup timeline (JSON lines) to this file
 
 Description:
     This script allows viewing various types of video streams, optionally processing them
@@ -460,6 +446,9 @@ def handle_interrupt(signal_num, frame):
 
 def main():
     signal.signal(signal.SIGINT, handle_interrupt)
+    from jetson_utils import videoSource, videoOutput, cudaToNumpy, Log
+    startup.mark("imports")
+
     # parse command line
     parser = argparse.ArgumentParser(description="View various types of video streams", 
                                     formatter_class=argparse.RawTextHelpFormatter, 
@@ -486,12 +475,20 @@ def main():
         help="Enable the OpenGL GUI window (default: headless mode is enabled)"
     )
 
+    parser.add_argument(
+        "--startup-log",
+        type=str,
+        default=None,
+        help="Append the startup timeline (JSON lines) to this file"
+    )
+
     try:
         args = parser.parse_known_args()[0]
     except:
         print("")
         parser.print_help()
         sys.exit(0)
+    startup.mark("args")
 
     if args.headless:
         sys.argv.append("--headless")
@@ -499,6 +496,7 @@ def main():
     # create video sources & outputs
     input = videoSource(args.input, argv=sys.argv)
     output = videoOutput(args.output, argv=sys.argv)
+    startup.mark("pipeline")
 
     # capture frames until EOS or user exits
     numFrames = 0
@@ -538,6 +536,11 @@ def main():
 
         # render the image
         output.Render(img)
+        if not startup.has("first_frame"):
+            startup.mark("first_frame")
+            print(startup.report())
+            if args.startup_log:
+                startup.export(args.startup_log)
         
         # update the title bar
         output.SetStatus("Raw Video | {:d}x{:d} | {:.1f} FPS".format(img.width, img.height, output.GetFrameRate()))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Reference consumer of the yolo.py --publish track stream (see doc/YOLO.md "Track stream")
+import sys
+import time
+import socket
+import signal
+import argparse
+from pipeline.publish import decode_packet, open_subscriber, PUBLISH_STATE_CONFIRMED
+from pipeline.stats import StreamingStats
+
+REPORT_INTERVAL = 5.0  # Seconds between statistics lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive the binary track stream of yolo.py --publish")
+    parser.add_argument("uri", type=str, help="udp://host:port or unix:///path, same as yolo.py --publish")
+    parser.add_argument("--quiet", action="store_true", help="Only print statistics, not the tracks")
+    parser.add_argument("--confirmed", action="store_true", help="Only print confirmed tracks")
+    args = parser.parse_args()
+
+    sock = open_subscriber(args.uri)
+    sock.settimeout(1.0)
+    signal.signal(signal.SIGINT, lambda signum, frame: sys.exit(0))
+    print(f"Listening on {args.uri}")
+
+    latency = StreamingStats()  # Capture to reception, seconds
+    expected = None
+    received = 0
+    lost = 0
+    last_report = time.monotonic()
+
+    while True:
+        try:
+            data = sock.recv(65536)
+        except socket.timeout:
+            data = None
+        now = time.monotonic()
+
+        if data:
+            try:
+                header, records = decode_packet(data)
+            except ValueError as e:
+                print(f"Ignored packet: {e}")
+                continue
+            received += 1
+            # Sequence gaps are lost packets, a restarted publisher starts again from 0
+            if expected is not None and header['sequence'] > expected:
+                lost += header['sequence'] - expected
+            expected = header['sequence'] + 1
+            latency.update(now - header['capture_ts'])
+
+            if not args.quiet:
+                for record in records:
+                    confirmed = record['state'] & PUBLISH_STATE_CONFIRMED
+                    if args.confirmed and not confirmed:
+                        continue
+                    print(f"[{header['source']}] frame {header['frame_id']} id {record['track_id']} "
+                          f"cls {record['cls']} conf {record['confidence']:.2f} "
+                          f"box {record['x1']:.0f} {record['y1']:.0f} {record['x2']:.0f} {record['y2']:.0f}"
+                          f"{'' if confirmed else ' (tentative)'}")
+
+        if now - last_report >= REPORT_INTERVAL:
+            last_report = now
+            window = latency.roll()
+            total = received + lost
+            print(f"Packets {received} received, {lost} lost ({100.0 * lost / total if total else 0.0:.2f}%), "
+                  f"latency p50 {window['p50'] * 1000:.2f}ms p99 {window['p99'] * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Offline tuning of yolo.py: replay a reference clip across a parameter grid,
+# keep the Pareto-optimal configurations and save them as a hardware profile.
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import subprocess
+import tempfile
+from pipeline.profiles import PROFILES_FILE, hardware_name, save_profile
+
+YOLO_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "yolo.py")
+
+TUNE_MAX_DROP_RATE = 0.01  # A configuration keeps up with the target when it drops at most 1% of the frames
+TUNE_RUN_TIMEOUT   = 600   # Seconds per replay
+
+# Tracking between detections: DeepSort prediction only, or boxes propagated by optical flow
+TRACKERS = {
+    'kalman': False,
+    'flow': True,
+}
+
+def config_name(values):
+    return (f"{os.path.splitext(os.path.basename(values['model']))[0]}-{values['imgsz']}"
+            f"-r{values['detect_ratio']}-c{values['confidence']:g}-{values['backend']}"
+            f"{'-flow' if values['propagate'] else ''}")
+
+def track_continuity(path):
+    """Mean length (frames) of the uninterrupted runs of confirmed track ids and the number of ids."""
+    last_frame = {}
+    runs = []  # [start, end] per run
+    current = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            frame = record['frame']
+            for track_id, _, _, _, _, _, _, confirmed in record['tracks']:
+                if not confirmed:
+                    continue
+                if last_frame.get(track_id) == frame - 1:
+                    current[track_id][1] = frame
+                else:
+                    current[track_id] = [frame, frame]
+                    runs.append(current[track_id])
+                last_frame[track_id] = frame
+    if not runs:
+        return 0.0, 0
+    return sum(end - start + 1 for start, end in runs) / len(runs), len(last_frame)
+
+def run_config(args, values, workdir):
+    report_path = os.path.join(workdir, "report.json")
+    detections_path = os.path.join(workdir, "detections.jsonl")
+    command = [sys.executable, YOLO_SCRIPT, args.clip, "--replay",
+               "--replay-fps", str(args.target_fps),
+               "--replay-report", report_path,
+               "--detections", detections_path,
+               "--model", values['model'],
+               "--imgsz", str(values['imgsz']),
+               "--detect-ratio", str(values['detect_ratio']),
+               "--confidence", str(values['confidence']),
+               "--backend", values['backend']]
+    if values['propagate']:
+        command.append("--propagate")
+    command += args.extra
+
+    start = time.monotonic()
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, timeout=TUNE_RUN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        print(f"  timed out after {TUNE_RUN_TIMEOUT}s")
+        return None
+    if result.returncode != 0 or not os.path.exists(report_path):
+        print(f"  failed: {result.stdout.strip().splitlines()[-1] if result.stdout.strip() else result.returncode}")
+        return None
+
+    with open(report_path) as f:
+        report = json.load(f)
+    continuity, track_ids = track_continuity(detections_path)
+    os.remove(report_path)
+    os.remove(detections_path)
+    return {
+        'fps': report['virtual_fps'],
+        'drop_rate': report['dropped'] / report['frames'] if report['frames'] else 1.0,
+        'latency_p50': report['latency_p50'],
+        'latency_p95': report['latency_p95'],
+        'latency_p99': report['latency_p99'],
+        'inference_ms': report['inference']['ewma'] * 1000,
+        'continuity': continuity,
+        'track_ids': track_ids,
+        'shapes': report.get('shapes', []),
+        'run_time': time.monotonic() - start,
+    }
+
+def dominates(a, b):
+    """a is at least as good as b on throughput, p95 latency and continuity, and better on one."""
+    better_or_equal = (a['fps'] >= b['fps'] and a['latency_p95'] <= b['latency_p95']
+                       and a['continuity'] >= b['continuity'])
+    strictly_better = (a['fps'] > b['fps'] or a['latency_p95'] < b['latency_p95']
+                       or a['continuity'] > b['continuity'])
+    return better_or_equal and strictly_better
+
+def pareto_front(entries):
+    return [entry for entry in entries
+            if not any(dominates(other['metrics'], entry['metrics']) for other in entries if other is not entry)]
+
+def select(front):
+    """Best continuity among the configurations that keep up with the target, else the fastest."""
+    keeping_up = [entry for entry in front if entry['metrics']['drop_rate'] <= TUNE_MAX_DROP_RATE]
+    if keeping_up:
+        return max(keeping_up, key=lambda e: (e['metrics']['continuity'], -e['metrics']['latency_p95']))
+    return max(front, key=lambda e: e['metrics']['fps'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune yolo.py on a reference clip and save a hardware profile",
+                                     epilog="Arguments after -- are passed to every yolo.py run")
+    parser.add_argument("clip", type=str, help="Reference video file or image directory")
+    parser.add_argument("--target-fps", type=float, default=30.0, help="Capture rate the replay simulates")
+    parser.add_argument("--models", type=str, nargs='+', default=["11n", "5nu", "8n"])
+    parser.add_argument("--imgsz", type=int, nargs='+', default=[640, 480, 320])
+    parser.add_argument("--detect-ratio", type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument("--confidence", type=float, nargs='+', default=[0.5])
+    parser.add_argument("--backends", type=str, nargs='+', default=["tensorrt"], choices=["tensorrt", "onnx"])
+    parser.add_argument("--trackers", type=str, nargs='+', default=["kalman", "flow"], choices=list(TRACKERS))
+    parser.add_argument("--profile", type=str, default=None, help="Profile name (default: this hardware)")
+    parser.add_argument("--output", type=str, default=PROFILES_FILE, help="Profiles file yolo.py --profile reads")
+    argv = sys.argv[1:]
+    extra = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+    args.extra = extra
+
+    grid = [dict(zip(('model', 'imgsz', 'detect_ratio', 'confidence', 'backend', 'propagate'), values))
+            for values in itertools.product(args.models, args.imgsz, args.detect_ratio, args.confidence,
+                                            args.backends, [TRACKERS[t] for t in args.trackers])]
+    print(f"Tuning {len(grid)} configurations on {args.clip} at {args.target_fps:g} FPS")
+
+    entries = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for index, values in enumerate(grid):
+            name = config_name(values)
+            print(f"[{index + 1}/{len(grid)}] {name}")
+            metrics = run_config(args, values, workdir)
+            if metrics is None:
+                continue
+            fallback = [shape for shape in metrics['shapes'] if max(shape) != values['imgsz']]
+            if fallback:
+                # A fixed-size model without a per-shape file runs its own size instead
+                print(f"  skipped: ran at {', '.join(f'{w}x{h}' for h, w in fallback)}, "
+                      f"no {values['imgsz']} model")
+                continue
+            print(f"  {metrics['fps']:.1f} FPS, {100 * metrics['drop_rate']:.1f}% dropped, "
+                  f"p95 {metrics['latency_p95'] * 1000:.1f}ms, continuity {metrics['continuity']:.1f} frames "
+                  f"({metrics['track_ids']} ids)")
+            entries.append({'name': name, 'args': values, 'metrics': metrics})
+
+    if not entries:
+        print("No configuration ran")
+        sys.exit(1)
+
+    front = pareto_front(entries)
+    front.sort(key=lambda e: -e['metrics']['fps'])
+    selected = select(front)
+    name = args.profile or hardware_name()
+    save_profile(name, {
+        'clip': args.clip,
+        'target_fps': args.target_fps,
+        'extra_args': args.extra,
+        'tuned': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'selected': selected['name'],
+        'configs': front,
+    }, args.output)
+
+    print(f"Pareto-optimal configurations ({len(front)}/{len(entries)}):")
+    for entry in front:
+        metrics = entry['metrics']
+        print(f"  {'*' if entry is selected else ' '} {entry['name']}: {metrics['fps']:.1f} FPS, "
+              f"p95 {metrics['latency_p95'] * 1000:.1f}ms, continuity {metrics['continuity']:.1f}")
+    print(f"Profile {name} saved to {args.output}, use: yolo.py <input> --profile {name}")
+
+if __name__ == "__main__":
+    main()
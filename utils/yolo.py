@@ -2,26 +2,47 @@
 import os
 import sys
 import cv2
-import torch
+import json
 import time
 import signal
 import argparse
-import psutil
 import threading
-import screeninfo
 import numpy as np
 from queue import Queue, Empty
 from collections import deque
-from ultralytics import YOLO
-from ultralytics.engine.results import Results
-from ultralytics.engine.results import Boxes
-from jetson_utils import videoSource, videoOutput, Log, cudaToNumpy
-from deep_sort_realtime.deepsort_tracker import DeepSort
+from pipeline.luma import downsample_luma
+from pipeline.flow import BoxPropagator
+from pipeline.motion import GlobalMotionEstimator, compensate_tracks
+from pipeline.trace import TraceRecorder, TRACE_FLAG_INFERENCE, TRACE_FLAG_PROPAGATED, TRACE_FLAG_ROI, TRACE_FLAG_GATED, \
+    TRACE_FLAG_TRIAGED
+from pipeline.stats import StreamingStats
+from pipeline.backends import ShapeCache, create_backend, letterbox, scale_boxes, shape_model_path
+from pipeline.cascade import CascadeBackend
+from pipeline.placement import CpuPlacement, default_plan, parse_plan
+from pipeline.replay import ReplaySource, run_replay
+from pipeline.roi import RoiDetector
+from pipeline.gate import SceneGate
+from pipeline.mailbox import LatestFrame
+from pipeline.overlay import OverlayCompositor, Renderer
+from pipeline.startup import StartupTimeline
+from pipeline.publish import TrackPublisher
+from pipeline.trajectory import TrajectoryStore
+from pipeline.profiles import PROFILES_FILE, load_profile
+from pipeline.stages import Handoff, Stage, StageMeter, STAGE_END
+from pipeline.rtpmon import RtpMonitor, RTP_MONITOR_PORT, FRAME_DAMAGED, FRAME_SUSPECT, rtp_port
+
+# Heavy dependencies (torch, ultralytics, deep_sort_realtime, jetson_utils, screeninfo)
+# are imported where first used, so --help and argument errors return at once
+startup = StartupTimeline("yolo")
+startup.mark("imports")
 
 # Global configurations
 CONFIDENCE_THRESHOLD     = 0.5
 MAX_QUEUE_SIZE           = 20  # Control memory usage
+DUAL_RES_BUFFERS         = MAX_QUEUE_SIZE + 2  # Analytics frames in flight (queue, consumer, capture)
+TRIAGE_MASKS             = {'damaged': FRAME_DAMAGED, 'suspect': FRAME_DAMAGED | FRAME_SUSPECT}
 FRAME_RATE_ESTIMATE_CNT  = 60
+TRACKING_INTERVAL_ALPHA  = 2.0 / (FRAME_RATE_ESTIMATE_CNT + 1)  # EWMA equivalent of a 60 frame average
 
 # Define font color in BGR format or constants (e.g., white or yellow)
 COLOR_WHITE              = (255, 255, 255)
@@ -35,48 +56,26 @@ FONT_THICKNESS           = 1
 BOX_THICKNESS            = 1
 
 YOLO_PREDICTION_STR      = "YOLO Prediction"
+DEFAULT_OUTPUT           = "file://output.mkv"
 
 # Global controls
 exit_flag = threading.Event()
 exit_inference_flag = threading.Event()
+model_ready_flag = threading.Event()
 frame_queue = Queue(maxsize=MAX_QUEUE_SIZE)
-stats_lock = threading.Lock()
 
 class ThreadSafeStats:
+    # Every metric has a single writer thread, so updates need no lock
     def __init__(self):
-        self.raw_fps_history = deque(maxlen=FRAME_RATE_ESTIMATE_CNT)
-        self.show_fps_history = deque(maxlen=FRAME_RATE_ESTIMATE_CNT)
-
-        self.inference_fps_history = deque(maxlen=FRAME_RATE_ESTIMATE_CNT)
-        self.max_inference_time = 0
-        self.min_inference_time = 9999
-        self.latest_inference_time = 0
-
-        self.tracking_fps_history = deque(maxlen=FRAME_RATE_ESTIMATE_CNT)
-        self.max_tracking_time = 0
-        self.min_tracking_time = 9999
-        self.latest_tracking_time = 0
-
-        self.tracking_interval_history = deque(maxlen=FRAME_RATE_ESTIMATE_CNT)
+        self.raw = StreamingStats()        # Capture loop time (capture thread)
+        self.tracking = StreamingStats()   # Per-frame processing time (inference thread)
+        self.inference = StreamingStats()  # Model inference time (inference thread)
+        self.display = StreamingStats()    # Dequeue to display time (inference thread)
 
 def PRINT(args, *print_args, **kwargs):
     if args.verbose:
         print(*print_args, **kwargs)
 
-def get_least_busy_cpu():
-    """Get the CPU ID with the lowest usage."""
-    cpu_usage = psutil.cpu_percent(percpu=True)  # Get CPU usage for each core
-    min_cpu_id = cpu_usage.index(min(cpu_usage))  # Find the least busy CPU ID
-    return min_cpu_id
-
-def bind_thread_to_cpu(cpu_id):
-    """Bind the current thread to the specified CPU."""
-    try:
-        os.sched_setaffinity(0, {cpu_id})  # Set CPU affinity for the current process
-        print(f"Thread {threading.get_native_id()} bound to CPU {cpu_id}")
-    except AttributeError:
-        print("CPU affinity setting is not supported on this system")
-
 def handle_interrupt(signal_num, frame):
     exit_flag.set()
     print("YOLO start to exit ... ...")
@@ -96,56 +95,128 @@ def calculate_aspect_size(max_height, max_width, aspect_ratio=(4, 5), multiple=3
         width = aspect_w * factor * multiple
     return height, width
 
-def predict_frame(args, model, id, frame, crop_height, crop_width, class_indices):
+def prepare_frames(frames, crop_height, crop_width, imgsz):
+    """Centre crop and letterbox, returns the model images and their transforms back to the frame."""
+    images, transforms = [], []
+    for frame in frames:
+        original_height, original_width = frame.shape[:2]
+        start_x = (original_width - crop_width) // 2
+        start_y = (original_height - crop_height) // 2
+        cropped_frame = frame[start_y:start_y + crop_height, start_x:start_x + crop_width]
+        image, scale, pad = letterbox(cropped_frame, imgsz)
+        images.append(image)
+        transforms.append((scale, pad, (start_x, start_y)))
+    return images, transforms
+
+def infer_images(backend, images, imgsz):
+    """Raw detections of letterboxed images in calls of at most max_batch, and the inference ms."""
+    results = []
+    inference_ms = 0.0
+    batch = backend.max_batch() or len(images)
+    for start in range(0, len(images), batch):
+        results.extend(backend.infer(images[start:start + batch], imgsz))
+        inference_ms += backend.inference_ms
+    return results, inference_ms
+
+def predict_frames(args, backend, id, frames, crop_height, crop_width, imgsz=(640, 640)):
+    """Detect in the centre crop of same-sized frames in batched calls.
+
+    Returns one array of [x1, y1, x2, y2, conf, cls] rows in frame coordinates
+    per frame, and the inference time of all calls.
+    """
     mark_start = time.perf_counter()
-
-    original_height, original_width = frame.shape[:2]
-    start_x = (original_width - crop_width) // 2
-    start_y = (original_height - crop_height) // 2
-    cropped_frame = frame[start_y:start_y + crop_height, start_x:start_x + crop_width]
+    images, transforms = prepare_frames(frames, crop_height, crop_width, imgsz)
 
     mark_A = time.perf_counter()
-    results = model.predict(
-        source=cropped_frame,
-        show=False,
-        verbose=False,
-        classes=class_indices,
-        imgsz=[640, 640]
-    )
+    results, inference_ms = infer_images(backend, images, imgsz)
     mark_B = time.perf_counter()
 
-    for result in results:
-        if not hasattr(result, "boxes") or result.boxes is None:
-            continue
-        new_boxes = []
-        for bbox in result.boxes:
-            bbox_xyxy = bbox.xyxy.clone().detach().cpu().squeeze()
-            if bbox_xyxy.numel() != 4:
-                continue
-            bbox_xyxy[0] += start_x
-            bbox_xyxy[1] += start_y
-            bbox_xyxy[2] += start_x
-            bbox_xyxy[3] += start_y
-            full_bbox = torch.tensor([*bbox_xyxy, bbox.conf.item(), bbox.cls.item()]).unsqueeze(0)
-            new_boxes.append(full_bbox)
-        if new_boxes:
-            result.boxes = Boxes(
-                torch.cat(new_boxes, dim=0).to('cuda'),
-                orig_shape=(original_height, original_width)
-            )
+    boxes = [scale_boxes(result, *transform) for result, transform in zip(results, transforms)]
     mark_C = time.perf_counter()
 
-    PRINT(args, f"FRAME: perfp {id} {mark_A-mark_start:.3f} {mark_B-mark_A:.3f} {mark_C-mark_B:.3f}")
-    return results
-
-def capture_thread(args, model_info, stats):
-    cpu_id = get_least_busy_cpu()  # Get the least busy CPU
-    bind_thread_to_cpu(cpu_id)  # Bind the thread to the selected CPU
-
-    input = videoSource(args.input, argv=sys.argv)
-    output = videoOutput(args.output, argv=sys.argv)
+    PRINT(args, f"FRAME: perfp {id} {mark_A-mark_start:.3f} {mark_B-mark_A:.3f} {mark_C-mark_B:.3f} {len(frames)}")
+    return boxes, inference_ms
+
+def predict_frame(args, backend, id, frame, crop_height, crop_width, imgsz=(640, 640)):
+    """Detect in the centre crop, return [x1, y1, x2, y2, conf, cls] rows in frame coordinates."""
+    boxes, inference_ms = predict_frames(args, backend, id, [frame], crop_height, crop_width, imgsz)
+    return boxes[0], inference_ms
+
+def analytics_size(width, height, long_side):
+    """Even-sized (width, height) of the analytics frame, None if the frame is not larger."""
+    scale = long_side / max(width, height)
+    if scale >= 1.0:
+        return None
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+def analytics_view(item):
+    """Frame the analytics stages read (the low-res branch with --dual-res) and its scale to the frame."""
+    frame, width, height, small = item[1], item[2], item[3], item[7]
+    if small is None:
+        return frame, 1.0, 1.0
+    return small, width / small.shape[1], height / small.shape[0]
+
+def to_frame_boxes(boxes, scale_x, scale_y):
+    """[x1, y1, x2, y2, ...] rows of the analytics frame in full-resolution pixels."""
+    if scale_x == 1.0 and scale_y == 1.0:
+        return boxes
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] *= scale_x
+    boxes[:, [1, 3]] *= scale_y
+    return boxes
+
+def warmup_model(args, backend, deepsort):
+    """Run dummy inferences of the real input shape so the first frames don't pay for engine setup.
+
+    backend is None for additional sources that share an already warm model.
+    """
+    warmup_times = []
+    if backend:
+        imgsz = backend.static_shape() or (args.imgsz, args.imgsz)
+        dummy = np.zeros((imgsz[0], imgsz[1], 3), dtype=np.uint8)
+        for _ in range(args.warmup):
+            mark_start = time.perf_counter()
+            for tier in backend.tiers():
+                tier.infer([dummy], imgsz)
+            warmup_times.append(time.perf_counter() - mark_start)
+    if args.warmup and deepsort.embedder is not None:
+        # Appearance embedder is lazily initialized on its first crop batch
+        deepsort.embedder.predict([np.zeros((128, 64, 3), dtype=np.uint8)])
+    return warmup_times
+
+def load_backend(args, model_info, model_path, shape=None):
+    """Detector backend of model_path, behind a two-tier cascade with --cascade."""
+    backend = create_backend(args.backend, model_path, intra_threads=args.intra_threads, inter_threads=args.inter_threads)
+    if not model_info['cascade_path']:
+        return backend
+    large_path = model_info['cascade_path']
+    if shape is not None:
+        large_path = shape_model_path(large_path, shape)
+        if not os.path.exists(large_path):
+            print(f"No cascade model {large_path}, {shape[1]}x{shape[0]} runs the small model only")
+            return backend
+    large = create_backend(args.backend, large_path, intra_threads=args.intra_threads, inter_threads=args.inter_threads)
+    return CascadeBackend(backend, large, period=args.cascade_period, low=args.cascade_low, high=args.cascade_high)
+
+def carry_energy(dropped, item):
+    """Mailbox merge: the scene change of an overwritten frame adds to the frame replacing it."""
+    return item[:6] + (dropped[6] + item[6],) + item[7:]
+
+def capture_thread(args, model_info, stats, source=0, mailbox=None):
+    """Capture one source into frame_queue, or into its mailbox when several sources share the model."""
+    from jetson_utils import videoSource, cudaToNumpy, cudaAllocMapped, cudaResize, cudaDeviceSynchronize
+    placement = model_info['placement']
+    stage = 'capture' if source == 0 else f'capture{source}'
+    placement.pin(stage)
+
+    input = videoSource(model_info['sources'][source], argv=sys.argv)
     num_frames = 0
     num_frames_dropped = 0
+    gate = model_info['gates'][source]
+    monitor = model_info['monitors'][source]
+    energy = 0.0  # Scene change of frames not queued yet
+    small_images = None  # Ring of GPU-scaled analytics frames with --dual-res
+    startup.mark("capture_start")
 
     while not exit_flag.is_set():
         try:
@@ -153,30 +224,57 @@ def capture_thread(args, model_info, stats):
             img = input.Capture()
             if img is None:
                 continue
+            capture_ts = time.monotonic()
+
+            # Stream integrity up to this frame: (FRAME_* bits, frames since the last keyframe)
+            integrity = monitor.sample() if monitor else None
+            if integrity and integrity[0]:
+                PRINT(args, f"FRAME: integrity {source} {num_frames} {integrity[0]} {integrity[1]}")
 
             # Convert and queue frame
             cv2_frame = cudaToNumpy(img)
 
+            # Analytics branch: scaled on the GPU, Python only reads the small buffer.
+            # Mapped memory, so the NumPy view needs no copy once the resize is done.
+            small = None
+            if args.dual_res:
+                if small_images is None:
+                    size = analytics_size(img.width, img.height, args.dual_res)
+                    small_images = [cudaAllocMapped(width=size[0], height=size[1], format=img.format)
+                                    for _ in range(DUAL_RES_BUFFERS)] if size else []
+                if small_images:
+                    small_img = small_images[num_frames % len(small_images)]
+                    cudaResize(img, small_img)
+                    cudaDeviceSynchronize()
+                    small = cudaToNumpy(small_img)
+
             # Tracking parameters
             tracking_fps      = input.GetFrameRate()
 
-            if not frame_queue.full():
-                frame_queue.put((num_frames, cv2_frame, img.width, img.height, tracking_fps))
+            # Scene change since the previous frame, dropped frames add up
+            energy += gate.measure(cv2_frame if small is None else small) if gate else 1.0
+
+            item = (num_frames, cv2_frame, img.width, img.height, tracking_fps, capture_ts, energy, small, integrity)
+            if mailbox is not None:
+                # Only the newest frame of each source is batched, an unconsumed one is dropped
+                if mailbox.put(item, carry_energy):
+                    num_frames_dropped += 1
+                    PRINT(args, f"FRAME: overwrite {source} {num_frames} {num_frames_dropped}")
+                energy = 0.0
+            elif not frame_queue.full():
+                frame_queue.put(item)
+                energy = 0.0
                 PRINT(args, f"FRAME: put {num_frames}")
             else:
                 num_frames_dropped += 1
                 PRINT(args, f"FRAME: overflow {num_frames} {num_frames_dropped}")
 
-            # Output original frame
-            output.Render(img)
-
             # Update statistics
-            with stats_lock:
-                diff_time = time.time() - start_time
-                if diff_time > 0:
-                    stats.raw_fps_history.append(1.0 / diff_time)
+            diff_time = time.time() - start_time
+            if diff_time > 0:
+                stats.raw.update(diff_time)
             
-            if not input.IsStreaming() or not output.IsStreaming():
+            if not input.IsStreaming():
                 break
 
             num_frames += 1
@@ -191,185 +289,414 @@ def capture_thread(args, model_info, stats):
         exit_count -= 1
         if exit_count == 0:
             break
-    print("Capture thread exited normally")
-    exit_inference_flag.set()
+    placement.finish(stage)
+    print(f"Capture thread {source} exited normally, {num_frames_dropped} frames dropped")
+
+class InferenceContext:
+    """Detector, tracker and per-stream state shared by the live and replay paths.
+
+    Additional sources pass the context of source 0 as `shared` and reuse its
+    detector (backend, shapes, ROI), only the tracker and per-stream state are
+    their own.
+    """
+
+    def __init__(self, args, model_info, source=0, shared=None):
+        self.source = source
+        self.window_name = YOLO_PREDICTION_STR if source == 0 else f"{YOLO_PREDICTION_STR} [{source}]"
+
+        # DeepSort tracking initialization
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+        self.deepsort = DeepSort(max_age=10, n_init=2, max_iou_distance=0.7, nn_budget=50)
+
+        if shared is None:
+            self.load_detector(args, model_info)
+        else:
+            for name in ('backend', 'class_names', 'class_indices', 'shapes', 'roi'):
+                setattr(self, name, getattr(shared, name))
+            self.load_time = 0.0
+            self.warmup_times = warmup_model(args, None, self.deepsort)
+        self.detect_slot = 0
+
+        # Optical-flow box propagation between detection frames
+        self.propagator = BoxPropagator(scale=args.flow_scale) if args.propagate else None
+
+        # Camera motion compensation of the tracker's motion model
+        self.camera_motion = GlobalMotionEstimator(max_corners=200, min_distance=20) if args.cmc else None
+
+        # Scene-change gating of scheduled detections, driven by schedule_detection() only;
+        # process_frame() hands it the tracks of each detection through gate_resets
+        self.gate = model_info['gates'][source]
+        self.gate_resets = deque()
+
+        # Frames damaged by packet loss are tracked without detection (--triage)
+        self.triage_mask = TRIAGE_MASKS.get(args.triage, 0)
+        self.triaged = 0
+        self.detect_deferred = False
+        self.deferred = 0
+
+        self.tracer = model_info['tracer']
+        self.publisher = model_info['publisher']
+
+        # Motion history of confirmed tracks for follow-me control and analytics
+        self.trajectories = TrajectoryStore(length=args.trajectory_length) if args.trajectory_length else None
+
+        # One display path: the annotated frame goes to the window or to the output, not both
+        self.overlay = OverlayCompositor(FONT_SCALE, FONT_THICKNESS)
+        self.renderer = Renderer(args.render if source == 0 else "window", self.window_name,
+                                 args.output or DEFAULT_OUTPUT, sys.argv)
+
+        # Host memory read by the analytics stages (luma, gate, detector input)
+        self.analytics_bytes = 0
+        self.analytics_frames = 0
+
+        self.tracking_interval = 1
+        self.tracks = []
+        # Set by --pipelined: scheduling then runs on the pre stage thread while the
+        # tracker updates the tracks in place, so it reads copies published by post
+        self.pipelined = False
+        self.track_views = ()
+        self.crop_height, self.crop_width = 0, 0
+
+    def load_detector(self, args, model_info):
+        mark_load = time.perf_counter()
+        self.backend = load_backend(args, model_info, model_info['model_path'])
+        self.load_time = time.perf_counter() - mark_load
+        startup.mark("model_load")
+
+        self.warmup_times = warmup_model(args, self.backend, self.deepsort)
+        startup.mark("warmup")
+
+        # Configurable list of target classes to detect
+        configurable_classes = model_info['class_names']
+        self.class_names = self.backend.names  # This is likely a dictionary {index: class_name}
+
+        # Convert class_names dict to list of class names and map them to indices
+        self.class_indices = [index for index, name in self.class_names.items() if name in configurable_classes]
+        self.backend.set_classes(self.class_indices)
+
+        print("Configured detection classes:", configurable_classes)
+        print("Class indices for detection:", self.class_indices)
+
+        # Inference shape (and per-shape model) for each input resolution
+        factory = lambda path, shape: load_backend(args, model_info, path, shape)
+        self.shapes = ShapeCache(self.backend, model_info['model_path'], calculate_aspect_size, factory,
+                                 max_side=args.imgsz, rect=not args.square, benchmark_runs=args.warmup)
+        model_info['shapes'] = self.shapes
+
+        # Detection around confirmed tracks between full-frame detections
+        self.roi = None
+        if args.roi_detect:
+            roi_backend = self.shapes.backend_for((args.roi_size, args.roi_size))
+            if roi_backend is None:
+                print(f"ROI detection disabled, no {args.roi_size}x{args.roi_size} model")
+            else:
+                self.roi = RoiDetector(roi_backend, size=args.roi_size, max_rois=args.roi_max, max_batch=args.roi_batch)
+                self.roi.warmup(args.warmup)
+        model_info['roi'] = self.roi
+
+class TrackView:
+    """Copy of the track fields scheduling reads, safe to use on another thread."""
+    __slots__ = ('track_id', 'confirmed', 'ltrb')
+
+    def __init__(self, track):
+        self.track_id = track.track_id
+        self.confirmed = track.is_confirmed()
+        self.ltrb = tuple(track.to_ltrb())
+
+    def is_confirmed(self):
+        return self.confirmed
+
+    def to_ltrb(self):
+        return self.ltrb
+
+def schedule_detection(args, ctx, stats, item):
+    """Decide whether the detector runs on this frame, returns the plan (detect, trace flags, shape, regions).
+
+    When detecting, shape is the inference shape of the analytics frame and
+    regions the ROI detection regions in frame pixels; a detection without
+    regions runs on the full crop. The plan travels with the frame, so a later
+    stage never sees the regions of a newer frame. With --pipelined shape is
+    None on the first frame of a new resolution, the infer stage resolves it.
+    """
+    frame_id, _, width, height, _, _, energy, _, integrity = item
+    tracks = ctx.track_views if ctx.pipelined else ctx.tracks
+    trace_flags = 0
+    # The interval is a smoothed float, detect on the nearest whole frame count.
+    # A detection due on a triaged frame runs on the next intact one.
+    detect = frame_id % max(1, round(ctx.tracking_interval)) == 0 or ctx.detect_deferred
+    if integrity and integrity[0] & ctx.triage_mask:
+        PRINT(args, f"FRAME: triaged {frame_id} {integrity[0]} {integrity[1]}")
+        ctx.triaged += 1
+        if detect and not ctx.detect_deferred:
+            ctx.deferred += 1
+        ctx.detect_deferred = detect
+        detect = False
+        trace_flags |= TRACE_FLAG_TRIAGED
+    else:
+        ctx.detect_deferred = False
+    if ctx.gate:
+        # Tracks of finished detections, the gate stays on this thread
+        while ctx.gate_resets:
+            ctx.gate.reset(ctx.gate_resets.popleft())
+        ctx.gate.observe(energy)
+        if detect and not ctx.gate.decide(tracks, stats.inference.ewma * 1000):
+            PRINT(args, f"FRAME: gated {frame_id} {ctx.gate.accumulated:.4f}")
+            detect = False
+            trace_flags |= TRACE_FLAG_GATED
+
+    shape, regions = None, []
+    if detect:
+        analytics = analytics_view(item)[0]
+        # Resolving a new resolution may load and benchmark a model, with --pipelined
+        # that is left to the infer stage so it never runs beside an inference
+        if ctx.pipelined:
+            shape = ctx.shapes.cached(*analytics.shape[:2])
+        else:
+            shape = ctx.shapes.get(*analytics.shape[:2])
+
+        # Every roi_full-th detection runs on the full crop to discover new objects
+        if ctx.roi and ctx.detect_slot % args.roi_full != 0:
+            regions = ctx.roi.select(tracks, (height, width))
+        ctx.detect_slot += 1
+    return detect, trace_flags, shape, regions
+
+def status_text(ctx, stats):
+    tracking_win  = stats.tracking.window
+    inference_win = stats.inference.window
+    return (ctx.window_name + " - "
+            + f"FPS: {stats.raw.rate():.1f}/{stats.tracking.rate():.1f}/{stats.inference.rate():.1f}/{stats.display.rate():.1f} | "
+            + f"Tracking: {tracking_win['p50']:.3f}/{tracking_win['p95']:.3f}/{tracking_win['p99']:.3f} | "
+            + f"Inference: {inference_win['p50']:.3f}/{inference_win['p95']:.3f}/{inference_win['p99']:.3f}")
+
+def process_frame(args, ctx, stats, item, mark_start, display=True, inference_cost=None, plan=None, detected=None):
+    """Detect or track one frame, draw and show it. Returns True if the detector ran.
+
+    inference_cost (seconds) replaces the measured inference time in the stats,
+    the replay harness uses it to make the detection schedule reproducible.
+    plan is the schedule_detection() result and detected the (boxes, inference ms,
+    seconds spent) of a detection the caller already ran (batched across sources,
+    or in the pre and infer stages of --pipelined); the seconds go to the trace.
+    """
+    frame_id, cv2_frame, width, height, tracking_fps, capture_ts, energy, _, _ = item
+    analytics, scale_x, scale_y = analytics_view(item)
+    mark_A = time.perf_counter()
+    queue_wait = time.monotonic() - capture_ts
+    propagator = ctx.propagator
+    camera_motion = ctx.camera_motion
+    deepsort = ctx.deepsort
 
-def inference_thread(args, model_info, stats):
-    cpu_id = get_least_busy_cpu()  # Get the least busy CPU
-    bind_thread_to_cpu(cpu_id)  # Bind the thread to the selected CPU
+    # Perform inference
+    annotated_frame = cv2_frame.copy()
+    mark_B = time.perf_counter()
+    mark_BA = None
+
+    detections = []
+    embeds = None
+    inference_time = 0
+    detect_time = 0.0  # Detection time for the trace, including work done before this call
+    detect, trace_flags, shape, regions = plan or schedule_detection(args, ctx, stats, item)
+    if detect:
+        ctx.crop_height, ctx.crop_width = shape['crop']
+    # Luma at flow_scale of the frame, or at the analytics resolution if that is smaller.
+    # Triaged frames are tracker-only: their smeared pixels would mislead flow and camera motion.
+    triaged = trace_flags & TRACE_FLAG_TRIAGED
+    luma_scale = min(args.flow_scale, 1.0 / scale_x)
+    gray = downsample_luma(analytics, luma_scale * scale_x) if (propagator or camera_motion) and not triaged else None
+    if propagator:
+        propagator.scale = luma_scale
+    if not detect:
+        PRINT(args, f"FRAME: deepsort {frame_id} {ctx.tracking_interval}")
+        if propagator and not triaged:
+            detections, embeds = propagator.propagate(gray)
+            if detections:
+                trace_flags |= TRACE_FLAG_PROPAGATED
+                PRINT(args, f"FRAME: perfo {frame_id} {len(detections)} {propagator.latest_cost_per_box:.3f}")
+            else:
+                detections, embeds = [], None
+    else:
+        if detected is not None:
+            PRINT(args, f"FRAME: detected {ctx.source} {frame_id}")
+            boxes, inference_time, detect_time = detected
+        elif regions:
+            PRINT(args, f"FRAME: roi {frame_id} {len(regions)}")
+            boxes, inference_time = ctx.roi.detect(annotated_frame, regions)
+            trace_flags |= TRACE_FLAG_ROI
+        else:
+            PRINT(args, f"FRAME: inference {frame_id}")
+            # Predict using Yolo algorithm
+            boxes, inference_time = predict_frame(args, shape['backend'], frame_id, analytics,
+                                                  ctx.crop_height, ctx.crop_width, shape['imgsz'])
+            boxes = to_frame_boxes(boxes, scale_x, scale_y)
+            ctx.shapes.record(shape, inference_time)
+        mark_BA = time.perf_counter()
+        detect_time += mark_BA - mark_B
+        trace_flags |= TRACE_FLAG_INFERENCE
+
+        # Prepare detections for DeepSort (xywh format)
+        for x1, y1, x2, y2, conf, cls in boxes.tolist():
+            if conf < args.confidence:
+                continue
+            bbox = [x1, y1, x2 - x1, y2 - y1]  # Convert to [x, y, w, h]
+            detections.append((bbox, conf, cls))
+            PRINT(args, f"TRACKS: {frame_id} detections - {bbox[0]} {bbox[1]} {bbox[2]} {bbox[3]}")
+        mark_BB = time.perf_counter()
+
+    # Warp predicted boxes by the camera motion before association
+    if camera_motion and gray is not None:
+        m = camera_motion.update(gray, luma_scale)
+        compensate_tracks(deepsort.tracker.tracks, m)
+        PRINT(args, f"FRAME: cmc {frame_id} {m[0, 2]:.1f} {m[1, 2]:.1f} {np.arctan2(m[1, 0], m[0, 0]):.4f}")
+
+    # DeepSort tracking update
+    if mark_BA is not None and propagator:
+        # Carry propagated boxes up to this frame so drift can be measured
+        propagator.propagate(gray)
+    tracks = deepsort.update_tracks(detections, embeds=embeds, frame=annotated_frame)
+    ctx.tracks = tracks
+    if ctx.pipelined:
+        ctx.track_views = tuple(TrackView(track) for track in tracks)
+    if mark_BA is not None and propagator:
+        propagator.reset(gray, tracks)
+    if mark_BA is not None and ctx.gate:
+        ctx.gate_resets.append(ctx.track_views if ctx.pipelined else tracks)
+
+    if ctx.trajectories:
+        ctx.trajectories.update(tracks, capture_ts)
+
+    # Tracks to downstream consumers before drawing, one packet per frame
+    if ctx.publisher:
+        ctx.publisher.publish(frame_id, capture_ts, tracks, width, height, ctx.source, trace_flags)
+    mark_C = time.perf_counter()                
+    if mark_BA is not None:
+        PRINT(args, f"FRAME: perfi {frame_id} {mark_C-mark_BB:.3f} {mark_BB-mark_BA:.3f} {mark_BA-mark_B:.3f} {inference_time:.3f}")
+    else:
+        PRINT(args, f"FRAME: perfd {frame_id} {mark_C-mark_B:.3f}")
+
+    # Host memory read by analytics: luma, gate and the detector's crop or regions
+    ctx.analytics_frames += 1
+    if gray is not None:
+        ctx.analytics_bytes += analytics.nbytes
+    if ctx.gate:
+        ctx.analytics_bytes += analytics.nbytes
+    if trace_flags & TRACE_FLAG_ROI:
+        ctx.analytics_bytes += sum((x1 - x0) * (y1 - y0) * 3 for x0, y0, x1, y1 in regions)
+    elif detect:
+        ctx.analytics_bytes += ctx.crop_height * ctx.crop_width * 3
+
+    # Draw detect box
+    if args.detect_box:
+        crop_width, crop_height = int(ctx.crop_width * scale_x), int(ctx.crop_height * scale_y)
+        cv2.rectangle(annotated_frame, 
+                    ((width - crop_width)//2, (height - crop_height)//2),
+                    ((width + crop_width)//2, (height + crop_height)//2),
+                    COLOR_RED, BOX_THICKNESS)
+        for x0, y0, x1, y1 in regions:
+            cv2.rectangle(annotated_frame, (x0, y0), (x1, y1), COLOR_BLUE, BOX_THICKNESS)
+
+    # Draw detection and tracking boxes
+    if not tracks:
+        PRINT(args, f"TRACKS: {frame_id} - No tracks")
+    for track in tracks:
+        ltrb = track.to_ltrb()
+        x, y, w, h = map(int, ltrb)
+        cls = int(track.det_class) if hasattr(track, 'det_class') else -1
+        class_name = ctx.class_names.get(cls, "Unknown") if cls != -1 else "Unknown"
+
+        if not track.is_confirmed(): # Not confirmed object
+            cv2.rectangle(annotated_frame, (x, y), (w, h), COLOR_YELLOW, BOX_THICKNESS)
+            ctx.overlay.label(annotated_frame, class_name, x, y - 10, COLOR_WHITE)
+            PRINT(args, f"TRACKS: {frame_id} cls {cls} - {x} {y} {w} {h}")
+            continue
 
-    # YOLO model initialization
-    model = YOLO(model_info['model_path'])
-    configurable_classes = model_info['class_names']
+        track_id = track.track_id
+        cv2.rectangle(annotated_frame, (x, y), (w, h), COLOR_GREEN, BOX_THICKNESS)
+        ctx.overlay.label(annotated_frame, f"{class_name} ID {track_id}", x, y - 10, COLOR_WHITE)
+        PRINT(args, f"TRACKS: {frame_id} id {track_id} - {x} {y} {w} {h}")
+
+    # Update performance display 
+    tracking_time = time.perf_counter() - mark_start
+    stats.tracking.update(tracking_time)
+    PRINT(args, f"TRACKS: {frame_id} track_time {tracking_time}")
+
+    if mark_BA is not None and inference_cost is not None:
+        stats.inference.update(inference_cost)
+    elif mark_BA is not None and inference_time > 0:
+        stats.inference.update(inference_time/1000)
+        PRINT(args, f"TRACKS: {frame_id} inf_time {inference_time/1000}")
+
+    inference_fps = stats.inference.rate()
+    raw_fps       = stats.raw.rate()
+
+    # Calculate tracking interval
+    if inference_fps > 0:
+        target_interval = max(1, int(raw_fps/inference_fps) - 1) * args.detect_ratio
+        ctx.tracking_interval += TRACKING_INTERVAL_ALPHA * (target_interval - ctx.tracking_interval)
+
+    # Display status info, re-rasterized only when the text changes
+    ctx.overlay.status(annotated_frame, lambda: status_text(ctx, stats), COLOR_WHITE)
+    mark_D = time.perf_counter()
+
+    # Display frame
+    if display:
+        ctx.renderer.present(annotated_frame)
+        if not ctx.renderer.streaming:
+            exit_flag.set()
 
-    # DeepSort tracking initialization
-    deepsort = DeepSort(max_age=10, n_init=2, max_iou_distance=0.7, nn_budget=50)
+    mark_E = time.perf_counter()
 
-    # Configurable list of target classes to detect
-    class_names = model.names  # This is likely a dictionary {index: class_name}
+    if not startup.has("first_frame") and startup.has("capture_start") and startup.mark("first_frame"):
+        first_frame = startup.elapsed("first_frame") - startup.elapsed("capture_start")
+        print(f"First frame displayed {first_frame:.3f}s after capture start "
+              f"({time.monotonic() - capture_ts:.3f}s capture to display)")
 
-    # Convert class_names dict to list of class names and map them to indices
-    class_indices = [index for index, name in class_names.items() if name in configurable_classes]
+    if ctx.tracer:
+        if mark_BA is not None:
+            ctx.tracer.record(frame_id, capture_ts, queue_wait, detect_time, mark_C - mark_BA,
+                              mark_D - mark_C, mark_E - mark_D, trace_flags, ctx.source)
+        else:
+            ctx.tracer.record(frame_id, capture_ts, queue_wait, 0.0, mark_C - mark_B,
+                              mark_D - mark_C, mark_E - mark_D, trace_flags, ctx.source)
 
-    print("Configured detection classes:", configurable_classes)
-    print("Class indices for detection:", class_indices)
+    stats.display.update(mark_E - mark_start)
 
-    window_initialized = False
-    results = []
+    # DEBUG: We observed that the frame interruption,
+    # might be due to the queue being full and not processed in time.
+    PRINT(args, f"FRAME: perff {frame_id} {mark_A-mark_start:.3f} {mark_B-mark_A:.3f} {mark_C-mark_B:.3f} {mark_D-mark_C:.3f} {mark_E-mark_D:.3f}")
+    return mark_BA is not None
+
+def load_inference(args, model_info, source=0, shared=None):
+    """Load the detector and tracker, returns None if loading failed."""
+    try:
+        ctx = InferenceContext(args, model_info, source, shared)
+    except Exception as e:
+        print(f"Inference thread model loading exception: {e}")
+        return None
+    model_info['contexts'].append(ctx)
+    if shared is None:
+        print(f"Model ready: load {ctx.load_time:.3f}s, warm-up {' '.join(f'{t:.3f}' for t in ctx.warmup_times)}s")
+    return ctx
 
-    tracking_interval = 1
-    tracks = []
+def inference_thread(args, model_info, stats):
+    placement = model_info['placement']
+    placement.pin('inference')
+
+    # YOLO model initialization
+    ctx = load_inference(args, model_info)
+    if ctx is None:
+        exit_flag.set()
+        model_ready_flag.set()
+        return
+    model_ready_flag.set()
 
     while not exit_inference_flag.is_set() or frame_queue.qsize() != 0:
         try:
             mark_start = time.perf_counter()
             # Get frame data
             try:
-                frame_id, cv2_frame, width, height, tracking_fps = frame_queue.get(timeout=0.1)
+                item = frame_queue.get(timeout=0.1)
             except Empty:
                 continue
-            mark_A = time.perf_counter()
-
-            # Initialize window
-            if not window_initialized:
-                screen = screeninfo.get_monitors()[0]
-                if screen.width <= width and screen.height <= height:
-                    cv2.namedWindow(YOLO_PREDICTION_STR, cv2.WND_PROP_FULLSCREEN)
-                    cv2.setWindowProperty(YOLO_PREDICTION_STR, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-                else:
-                    cv2.namedWindow(YOLO_PREDICTION_STR, cv2.WND_PROP_AUTOSIZE)
-                    window_x = (screen.width - width) // 2
-                    window_y = (screen.height - height) // 2
-                    cv2.moveWindow(YOLO_PREDICTION_STR, window_x, window_y)
-                window_initialized = True
-
-            # Perform inference
-            annotated_frame = cv2_frame.copy()
-            mark_B = time.perf_counter()
-            mark_BA = None
-
-            detections = []
-            inference_time = 0
-            if frame_id % tracking_interval != 0:
-                PRINT(args, f"FRAME: deepsort {frame_id} {tracking_interval}")
-            else:
-                PRINT(args, f"FRAME: inference {frame_id}")
-                corp_height, corp_width = calculate_aspect_size(height, width)
-
-                # Predict using Yolo algorithm
-                results = predict_frame(args, model, frame_id, annotated_frame, corp_height, corp_width, class_indices)
-                mark_BA = time.perf_counter()
-
-                # Prepare detections for DeepSort (xywh format)
-                for result in results[0].boxes.data.tolist():
-                    x1, y1, x2, y2, conf, cls = map(float, result)
-                    if conf < args.confidence:
-                        continue
-                    bbox = [x1, y1, x2 - x1, y2 - y1]  # Convert to [x, y, w, h]
-                    detections.append((bbox, conf, cls))
-                    PRINT(args, f"TRACKS: {frame_id} detections - {bbox[0]} {bbox[1]} {bbox[2]} {bbox[3]}")
-
-                #print(results)
-                if isinstance(results, list):
-                    results = results[0]
-                if hasattr(results, "speed") and "inference" in results.speed:
-                    inference_time = results.speed["inference"]
-                mark_BB = time.perf_counter()
-
-            # DeepSort tracking update
-            tracks = deepsort.update_tracks(detections, frame=annotated_frame)
-            mark_C = time.perf_counter()                
-            if mark_BA is not None:
-                PRINT(args, f"FRAME: perfi {frame_id} {mark_C-mark_BB:.3f} {mark_BB-mark_BA:.3f} {mark_BA-mark_B:.3f} {inference_time:.3f}")
-            else:
-                PRINT(args, f"FRAME: perfd {frame_id} {mark_C-mark_B:.3f}")
-
-            # Draw detect box
-            if args.detect_box:
-                cv2.rectangle(annotated_frame, 
-                            ((width - corp_width)//2, (height - corp_height)//2),
-                            ((width + corp_width)//2, (height + corp_height)//2),
-                            COLOR_RED, BOX_THICKNESS)
-
-            # Draw detection and tracking boxes
-            if not tracks:
-                PRINT(args, f"TRACKS: {frame_id} - No tracks")
-            for track in tracks:
-                ltrb = track.to_ltrb()
-                x, y, w, h = map(int, ltrb)
-                cls = int(track.det_class) if hasattr(track, 'det_class') else -1
-                class_name = class_names.get(cls, "Unknown") if cls != -1 else "Unknown"
-
-                if not track.is_confirmed(): # Not confirmed object
-                    cv2.rectangle(annotated_frame, (x, y), (w, h), COLOR_YELLOW, BOX_THICKNESS)
-                    cv2.putText(annotated_frame, f"{class_name}", (x, y - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, FONT_SCALE, COLOR_WHITE, FONT_THICKNESS)
-                    PRINT(args, f"TRACKS: {frame_id} cls {cls} - {x} {y} {w} {h}")
-                    continue
-
-                track_id = track.track_id
-                cv2.rectangle(annotated_frame, (x, y), (w, h), COLOR_GREEN, BOX_THICKNESS)
-                cv2.putText(annotated_frame, f"{class_name} ID {track_id}", (x, y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, FONT_SCALE, COLOR_WHITE, FONT_THICKNESS)
-                PRINT(args, f"TRACKS: {frame_id} id {track_id} - {x} {y} {w} {h}")
-
-            # Update performance display 
-            with stats_lock:
-                stats.latest_tracking_time = time.perf_counter() - mark_start
-                stats.tracking_fps_history.append(1.0 / stats.latest_tracking_time)
-
-                if stats.latest_tracking_time > stats.max_tracking_time:
-                    stats.max_tracking_time = stats.latest_tracking_time
-                elif stats.latest_tracking_time < stats.min_tracking_time:
-                    stats.min_tracking_time = stats.latest_tracking_time
-
-                PRINT(args, f"TRACKS: {frame_id} track_time {stats.latest_tracking_time}")
-
-                if frame_id % tracking_interval == 0:
-                    stats.latest_inference_time = inference_time/1000
-                    stats.inference_fps_history.append(1.0 / stats.latest_inference_time)
-
-                    if stats.latest_inference_time > stats.max_inference_time:
-                        stats.max_inference_time = stats.latest_inference_time
-                    elif stats.latest_inference_time < stats.min_inference_time:
-                        stats.min_inference_time = stats.latest_inference_time
-
-                    PRINT(args, f"TRACKS: {frame_id} inf_time {stats.latest_inference_time}")
-
-                tracking_fps  = sum(stats.tracking_fps_history)/len(stats.tracking_fps_history) if stats.tracking_fps_history else 0
-                inference_fps = sum(stats.inference_fps_history)/len(stats.inference_fps_history) if stats.inference_fps_history else 0
-                raw_fps       = sum(stats.raw_fps_history)/len(stats.raw_fps_history) if stats.raw_fps_history else 0
-                show_fps      = sum(stats.show_fps_history)/len(stats.show_fps_history) if stats.show_fps_history else 0
-                status_text = (YOLO_PREDICTION_STR + " - "
-                            + f"FPS: {raw_fps:.1f}/{tracking_fps:.1f}/{inference_fps:.1f}/{show_fps:.1f} | "
-                            + f"Tracking: {stats.min_tracking_time:.3f}/{stats.latest_tracking_time:.3f}/{stats.max_tracking_time:.3f} | "
-                            + f"Inference: {stats.min_inference_time:.3f}/{stats.latest_inference_time:.3f}/{stats.max_inference_time:.3f}")
-
-                # Calculate tracking interval
-                tracking_interval = max(1, int(raw_fps/inference_fps) - 1) * args.detect_ratio
-                stats.tracking_interval_history.append(tracking_interval)
-                tracking_interval = sum(stats.tracking_interval_history)/len(stats.tracking_interval_history) if stats.tracking_interval_history else 1
-
-            # Display status info
-            text_size = cv2.getTextSize(status_text, cv2.FONT_HERSHEY_SIMPLEX, FONT_SCALE, FONT_THICKNESS)[0]
-            cv2.putText(annotated_frame, status_text, 
-                      (width - text_size[0] - 10, 30), 
-                      cv2.FONT_HERSHEY_SIMPLEX, FONT_SCALE, COLOR_WHITE, FONT_THICKNESS)
-            mark_D = time.perf_counter()
-
-            # Display frame
-            cv2.imshow(YOLO_PREDICTION_STR, annotated_frame)
-            cv2.waitKey(1) # 1ms
-
-            mark_E = time.perf_counter()
-
-            with stats_lock:
-                diff_time = mark_E - mark_start
-                stats.show_fps_history.append(1.0 / diff_time)
- 
-            # DEBUG: We observed that the frame interruption,
-            # might be due to the queue being full and not processed in time.
-            PRINT(args, f"FRAME: perff {frame_id} {mark_A-mark_start:.3f} {mark_B-mark_A:.3f} {mark_C-mark_B:.3f} {mark_D-mark_C:.3f} {mark_E-mark_D:.3f}")
+            process_frame(args, ctx, stats, item, mark_start)
 
         except Exception as e:
             print(f"Inference thread exception: {e}")
@@ -377,8 +704,244 @@ def inference_thread(args, model_info, stats):
             exit_flag.set()
             break
     frame_queue.queue.clear()
+    placement.finish('inference')
+    print("Inference thread exited normally")
+
+def pipelined_inference_thread(args, model_info, stats):
+    """Single source split into overlapping stages joined by bounded handoffs (pipeline/stages.py):
+    pre (schedule, crop, letterbox) -> infer (model, box scaling) -> post (tracking, drawing,
+    display) in this thread, so frame N+1 is prepared while frame N is inferred and
+    frame N-1 is drawn.
+
+    The pre stage schedules with copies of the tracks and the tracking interval
+    of the frame post last finished, one or two frames older than in the
+    sequential loop. Shapes of new resolutions are resolved by the infer stage.
+    """
+    placement = model_info['placement']
+    placement.pin('inference')
+
+    # YOLO model initialization
+    ctx = load_inference(args, model_info)
+    if ctx is None:
+        exit_flag.set()
+        model_ready_flag.set()
+        return
+    model_ready_flag.set()
+    ctx.pipelined = True
+
+    def pre(item):
+        mark_start = time.perf_counter()
+        plan = schedule_detection(args, ctx, stats, item)
+        detect, trace_flags, shape, regions = plan
+        job = None
+        if detect and regions:
+            job = (shape, regions, None, None, 0.0)
+            plan = (detect, trace_flags | TRACE_FLAG_ROI, shape, regions)
+        elif detect and shape is not None:
+            mark = time.perf_counter()
+            crop_height, crop_width = shape['crop']
+            images, transforms = prepare_frames([analytics_view(item)[0]], crop_height, crop_width, shape['imgsz'])
+            job = (shape, None, images, transforms, time.perf_counter() - mark)
+        elif detect:
+            job = (None, None, None, None, 0.0)
+        return item, mark_start, plan, job
+
+    def infer(work):
+        item, mark_start, plan, job = work
+        detected = None
+        if job:
+            shape, regions, images, transforms, prepare_time = job
+            mark = time.perf_counter()
+            if shape is None:
+                # First frame of a new resolution
+                shape = ctx.shapes.get(*analytics_view(item)[0].shape[:2])
+                plan = plan[:2] + (shape,) + plan[3:]
+            if regions:
+                boxes, inference_ms = ctx.roi.detect(item[1], regions)
+            else:
+                if images is None:
+                    crop_height, crop_width = shape['crop']
+                    images, transforms = prepare_frames([analytics_view(item)[0]], crop_height, crop_width, shape['imgsz'])
+                results, inference_ms = infer_images(shape['backend'], images, shape['imgsz'])
+                ctx.shapes.record(shape, inference_ms)
+                boxes = to_frame_boxes(scale_boxes(results[0], *transforms[0]), *analytics_view(item)[1:])
+            detected = (boxes, inference_ms, prepare_time + time.perf_counter() - mark)
+        return item, mark_start, plan, detected
+
+    stop = threading.Event()
+    frames = Handoff(queue=frame_queue)
+    prepared, inferred = Handoff(), Handoff()
+    stages = [Stage("pre", pre, frames, prepared, stop, done=exit_inference_flag.is_set,
+                    on_start=lambda: placement.pin('pre')),
+              Stage("infer", infer, prepared, inferred, stop, on_start=lambda: placement.pin('infer'))]
+    for stage in stages:
+        stage.start()
+
+    meter = StageMeter("post")
+    meter.start = time.perf_counter()
+    while not stop.is_set():
+        work = inferred.get(meter)
+        if work is None:
+            continue
+        if work is STAGE_END:
+            break
+        item, mark_start, plan, detected = work
+        mark = time.perf_counter()
+        try:
+            process_frame(args, ctx, stats, item, mark_start, plan=plan, detected=detected)
+        except Exception as e:
+            print(f"Inference thread exception: {e}")
+            exit_flag.set()
+            break
+        meter.busy += time.perf_counter() - mark
+        meter.items += 1
+    meter.end = time.perf_counter()
+
+    stop.set()
+    for stage in stages:
+        stage.join()
+        if stage.error:
+            print(f"Inference thread {stage.name} stage exception: {stage.error}")
+            exit_flag.set()
+    frame_queue.queue.clear()
+    model_info['stages'] = [f"{stage.meter.summary()}, input {handoff.summary()}"
+                            for stage, handoff in zip(stages, (frames, prepared))]
+    model_info['stages'].append(f"{meter.summary()}, input {inferred.summary()}")
+    placement.finish('inference')
+    print("Inference thread exited normally")
+
+def batched_inference_thread(args, model_info, source_stats, mailboxes):
+    """One model for several sources: the newest frame of each source is batched
+    into one inference call per shape, tracking and display stay per source."""
+    placement = model_info['placement']
+    placement.pin('inference')
+
+    # YOLO model initialization, once for all sources
+    ctx = load_inference(args, model_info)
+    contexts = [ctx] if ctx else []
+    for source in range(1, len(mailboxes)):
+        if ctx is None:
+            break
+        contexts.append(load_inference(args, model_info, source, shared=ctx))
+    if ctx is None or None in contexts:
+        exit_flag.set()
+        model_ready_flag.set()
+        return
+    model_ready_flag.set()
+    ready = mailboxes[0].ready
+
+    while not exit_inference_flag.is_set() or any(mailbox.pending() for mailbox in mailboxes):
+        try:
+            if not ready.wait(timeout=0.1):
+                continue
+            ready.clear()
+            mark_start = time.perf_counter()
+
+            # Latest frame of every source that has one
+            batch = []
+            for ctx, stats, mailbox in zip(contexts, source_stats, mailboxes):
+                item = mailbox.take()
+                if item is not None:
+                    batch.append((ctx, stats, item, schedule_detection(args, ctx, stats, item)))
+
+            # Full-crop detections of the same shape share one inference call
+            groups = {}
+            for index, (ctx, stats, item, (detect, _, shape, regions)) in enumerate(batch):
+                if detect and not regions:
+                    groups.setdefault(id(shape), []).append(index)
+            detected = {}
+            for indices in groups.values():
+                mark = time.perf_counter()
+                shape = batch[indices[0]][3][2]
+                crop_height, crop_width = shape['crop']
+                frames = [analytics_view(batch[index][2])[0] for index in indices]
+                boxes, inference_ms = predict_frames(args, shape['backend'], batch[indices[0]][2][0], frames,
+                                                     crop_height, crop_width, shape['imgsz'])
+                model_info['shapes'].record(shape, inference_ms)
+                results = [to_frame_boxes(result, *analytics_view(batch[index][2])[1:])
+                           for index, result in zip(indices, boxes)]
+                # Every frame of the group waited for the whole call
+                detect_time = time.perf_counter() - mark
+                for index, result in zip(indices, results):
+                    detected[index] = (result, inference_ms, detect_time)
+
+            # Fan the results out to the per-source trackers
+            for index, (ctx, stats, item, plan) in enumerate(batch):
+                process_frame(args, ctx, stats, item, mark_start, plan=plan, detected=detected.get(index))
+
+        except Exception as e:
+            print(f"Inference thread exception: {e}")
+            exit_flag.set()
+            break
+    placement.finish('inference')
     print("Inference thread exited normally")
 
+def track_records(tracks):
+    """[track_id, cls, x1, y1, x2, y2, conf, confirmed] rows for the detections file."""
+    records = []
+    for track in tracks:
+        x1, y1, x2, y2 = (round(float(v), 1) for v in track.to_ltrb())
+        conf = track.det_conf if track.det_conf is not None else 0.0
+        cls = int(track.det_class) if track.det_class is not None else -1
+        records.append([str(track.track_id), cls, x1, y1, x2, y2, round(float(conf), 3), int(track.is_confirmed())])
+    return records
+
+def replay_main(args, model_info, stats):
+    """Run the pipeline on a recorded file/directory on a virtual clock (see pipeline/replay.py)."""
+    model_info['placement'].pin('inference')
+    ctx = load_inference(args, model_info)
+    if ctx is None:
+        return None
+
+    try:
+        source = ReplaySource(args.input)
+        detections_file = open(args.detections, "w") if args.detections else None
+    except (ValueError, OSError) as e:
+        print(f"Replay input exception: {e}")
+        return None
+    fps = args.replay_fps if args.replay_fps >= 0 else source.frame_rate()
+    period = 1.0 / fps if fps > 0 else 0.0
+    detect_cost, track_cost = args.replay_cost_ms if args.replay_cost_ms else (None, None)
+    # Replay renders only when asked to: --replay-show, --render output or an explicit output
+    replay_display = args.replay_show or args.render == "output" or (args.output is not None and args.render == "both")
+    startup.mark("capture_start")
+
+    def process(frame_id, frame, arrival):
+        height, width = frame.shape[:2]
+        # The capture side GPU scaler is emulated with a CPU resize, not counted in the frame cost
+        size = analytics_size(width, height, args.dual_res) if args.dual_res else None
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA) if size else None
+        mark_start = time.perf_counter()
+        energy = model_info['gates'][0].measure(frame if small is None else small) if model_info['gates'][0] else 1.0
+        inferred = process_frame(args, ctx, stats, (frame_id, frame, width, height, fps, time.monotonic(), energy, small, None),
+                                 mark_start, display=replay_display,
+                                 inference_cost=detect_cost / 1000 if detect_cost is not None else None)
+        cost = time.perf_counter() - mark_start
+        if detect_cost is not None:
+            cost = (detect_cost if inferred else track_cost) / 1000
+        stats.raw.update(period if period else cost)
+        if detections_file:
+            detections_file.write(json.dumps({'frame': frame_id, 'ts': round(arrival, 6), 'inference': inferred,
+                                              'tracks': track_records(ctx.tracks)}) + "\n")
+        return cost
+
+    result = run_replay(source, process, fps=fps, queue_size=MAX_QUEUE_SIZE, stop=exit_flag)
+    if detections_file:
+        detections_file.close()
+
+    report = result.report()
+    report['input'] = args.input
+    report['replay_fps'] = fps
+    report['inference'] = stats.inference.snapshot()
+    report['tracking'] = stats.tracking.snapshot()
+    report['shapes'] = [list(entry['imgsz']) for entry in ctx.shapes.entries.values() if entry['count']]
+    print("Replay report: " + json.dumps(report))
+    if args.replay_report:
+        with open(args.replay_report, "w") as f:
+            json.dump(report, f, indent=2)
+    model_info['placement'].finish('inference')
+    return report
+
 def main():
     if "DISPLAY" not in os.environ:
         os.environ["DISPLAY"] = ":0"
@@ -386,53 +949,264 @@ def main():
     signal.signal(signal.SIGINT, handle_interrupt)
     parser = argparse.ArgumentParser()
     parser.add_argument("input", type=str)
-    parser.add_argument("output", type=str, default="file://output.mkv", nargs='?')
+    parser.add_argument("output", type=str, default=None, nargs='?',
+                        help="Recording/stream of the annotated frames (default: file://output.mkv)")
+    parser.add_argument("--source", type=str, action="append", default=[],
+                        help="Additional input, repeatable; all sources share one model and are batched")
     parser.add_argument("--no-headless", action="store_false", dest="headless")
+    parser.add_argument("--render", type=str, choices=["both", "window", "output"], default="both",
+                        help="Show the annotated frames in a window, send them to output, or both (default)")
     parser.add_argument("--detect-box", action="store_true", dest="detect_box")
     parser.add_argument("--detect-ratio", type=int, default=2)
     parser.add_argument("--confidence", type=float, default=0.5)
-    parser.add_argument("--model", type=str, default="11n")
+    parser.add_argument("--model", type=str, default="11n", help="11n, 5nu, 8n, 11s or a path to a model file")
+    parser.add_argument("--cascade", type=str, default=None,
+                        help="Larger model (11s, 8n, ... or a path) run behind --model at a lower cadence")
+    parser.add_argument("--cascade-period", type=int, default=5, help="Run the large model every N detections")
+    parser.add_argument("--cascade-low", type=float, default=0.3,
+                        help="Small model detections at or above this confidence and below --cascade-high escalate")
+    parser.add_argument("--cascade-high", type=float, default=0.6, help="Small model detections kept without confirmation")
+    parser.add_argument("--backend", type=str, choices=["tensorrt", "onnx"], default="tensorrt",
+                        help="tensorrt: Ultralytics + TensorRT engine, onnx: ONNX Runtime on CPU")
+    parser.add_argument("--intra-threads", type=int, default=0, help="ONNX Runtime intra-op threads (0: default)")
+    parser.add_argument("--inter-threads", type=int, default=0, help="ONNX Runtime inter-op threads (0: default)")
+    parser.add_argument("--imgsz", type=int, default=640, help="Long side of the inference shape")
+    parser.add_argument("--square", action="store_true",
+                        help="Always infer at imgsz x imgsz instead of a stride-aligned shape matching the crop")
+    parser.add_argument("--roi-detect", action="store_true",
+                        help="Detect only around confirmed tracks between full-frame detections")
+    parser.add_argument("--roi-full", type=int, default=4, help="Run a full-frame detection every N detections")
+    parser.add_argument("--roi-size", type=int, default=256, help="Detector input size of one region")
+    parser.add_argument("--roi-max", type=int, default=4, help="Regions per batch")
+    parser.add_argument("--roi-batch", type=int, default=None,
+                        help="Batch size the ROI model accepts (default: from the export metadata, 1 without it)")
+    parser.add_argument("--gate", action="store_true", help="Skip scheduled detections while the scene and tracks are static")
+    parser.add_argument("--gate-threshold", type=float, default=0.05,
+                        help="Changed-block fraction accumulated since the last detection that forces a detection")
+    parser.add_argument("--inference-watts", type=float, default=0.0,
+                        help="Power drawn by one inference, to report the energy saved by --gate")
+    parser.add_argument("--propagate", action="store_true", help="Propagate boxes with optical flow between detections")
+    parser.add_argument("--cmc", action="store_true", help="Compensate camera motion in the tracker's motion model")
+    parser.add_argument("--flow-scale", type=float, default=0.5, help="Luma downsample factor used for optical flow and camera motion")
+    parser.add_argument("--replay", action="store_true",
+                        help="Replay input (video file or image directory) on a virtual clock instead of live capture")
+    parser.add_argument("--replay-fps", type=float, default=-1,
+                        help="Simulated capture rate, 0: as fast as possible (default: file frame rate)")
+    parser.add_argument("--replay-cost-ms", type=float, nargs=2, metavar=("DETECT", "TRACK"), default=None,
+                        help="Fixed virtual cost of detection/tracking frames for fully reproducible schedules")
+    parser.add_argument("--replay-show", action="store_true", help="Show the replayed frames in a window")
+    parser.add_argument("--replay-report", type=str, default=None, help="Write the replay throughput/latency report (JSON)")
+    parser.add_argument("--detections", type=str, default=None, help="Write per-frame tracks (JSON lines) in replay mode")
+    parser.add_argument("--dual-res", type=int, default=0,
+                        help="Long side of a GPU-scaled analytics frame used for detection, luma and gate (0: full resolution)")
+    parser.add_argument("--triage", type=str, choices=list(TRIAGE_MASKS), default=None,
+                        help="Track without detection on frames hit by RTP packet loss (damaged) "
+                             "or on every frame until the next keyframe after a loss (suspect)")
+    parser.add_argument("--triage-port", type=int, default=RTP_MONITOR_PORT,
+                        help="Local port the decoder reads from while --triage relays an rtp:// input")
+    parser.add_argument("--input-codec", type=str, choices=["h264", "h265"], default="h264",
+                        help="Codec of an rtp:// input, also read by videoSource")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Overlap pre-processing, inference and tracking/drawing of consecutive frames in three threads")
+    parser.add_argument("--warmup", type=int, default=3, help="Warm-up inferences before capture starts")
+    parser.add_argument("--cpu-plan", type=str, nargs='+', default=None,
+                        help="CPU placement per stage, e.g. capture=3 inference=2 ui=0-1 (default: derived from topology)")
+    parser.add_argument("--trace", type=str, default=None, help="Record a binary per-frame timing trace to this file")
+    parser.add_argument("--trajectory-length", type=int, default=0,
+                        help="Keep this many samples of motion history per confirmed track (0: disabled)")
+    parser.add_argument("--publish", type=str, default=None,
+                        help="Send per-frame tracks as binary datagrams to udp://host:port or unix:///path")
+    parser.add_argument("--startup-log", type=str, default=None,
+                        help="Append the startup timeline of this run (JSON lines) to this file")
+    parser.add_argument("--profile", type=str, nargs='?', const='', default=None,
+                        help="Load tuned settings (yolo-tune.py): NAME, NAME:CONFIG, or this hardware's profile if empty")
+    parser.add_argument("--profile-file", type=str, default=PROFILES_FILE)
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
     args = parser.parse_args()
 
+    # Tuned values become defaults, arguments given on the command line still win
+    if args.profile is not None:
+        try:
+            profile, extra = load_profile(args.profile, args.profile_file)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if extra:
+            # The arguments the tuning runs were given apply too, the tuned values win over them
+            tuned = vars(parser.parse_args([args.input] + extra))
+            profile = dict({key: value for key, value in tuned.items()
+                            if key != 'input' and value != parser.get_default(key)}, **profile)
+        print(f"Profile settings: {profile}")
+        parser.set_defaults(**profile)
+        args = parser.parse_args()
+    startup.mark("args")
+
     if args.headless:
         sys.argv.append("--headless")
+    if args.output is not None and args.render == "window":
+        print(f"WARNING: output {args.output} is not written with --render window, use --render both")
 
     # Model configurations
     model_paths = {
-        '11n': './model/yolo11n.engine',
-        '5nu': './model/yolov5nu.engine',
-        '8n': './model/yolov8n.engine'
+        'tensorrt': {
+            '11n': './model/yolo11n.engine',
+            '5nu': './model/yolov5nu.engine',
+            '8n': './model/yolov8n.engine',
+            '11s': './model/yolo11s.engine'
+        },
+        'onnx': {
+            '11n': './model/yolo11n.onnx',
+            '5nu': './model/yolov5nu.onnx',
+            '8n': './model/yolov8n.onnx',
+            '11s': './model/yolo11s.onnx'
+        }
     }
 
     class_names = [
         'person', 'car', 'motorcycle', 'bus', 'truck', 'airplane', 'boat'
     ]  # User-defined classes to detect
 
-    stats = ThreadSafeStats()
+    sources = [args.input] + args.source
+    source_stats = [ThreadSafeStats() for _ in sources]
+    stats = source_stats[0]
     model_info = {
-        'model_path': model_paths[args.model],
+        'sources': sources,
+        'contexts': [],
+        'model_path': model_paths[args.backend].get(args.model, args.model),  # Or a path to a model file
+        'cascade_path': model_paths[args.backend].get(args.cascade, args.cascade) if args.cascade else None,
         'class_names': class_names
     }
 
-    # Start threads
-    inference_t = threading.Thread(target=inference_thread, args=(args, model_info, stats))
-    capture_t = threading.Thread(target=capture_thread, args=(args, model_info, stats))
-
-    inference_t.start()
-
-    # Make sure the inference thread is started and ready for operation
-    time.sleep(3)
-    capture_t.start()
-
-    capture_t.join()
-    inference_t.join()
+    # Dedicated cores for capture and inference, helpers and UI share the rest.
+    # Threads started from here inherit the shared set before pinning themselves.
+    dedicated = ['capture', 'inference']
+    if args.pipelined and not args.replay and not args.source:
+        # The model stages of --pipelined first, at least one core stays shared
+        dedicated = ['capture', 'infer', 'inference', 'pre'][:max(2, len(os.sched_getaffinity(0)) - 1)]
+    plan = parse_plan(args.cpu_plan) if args.cpu_plan else default_plan(dedicated)
+    model_info['placement'] = CpuPlacement(plan)
+    model_info['placement'].pin('ui')
+
+    # Change detector shared by the capture side (measure) and the inference side (decide)
+    model_info['gates'] = [SceneGate(threshold=args.gate_threshold) if args.gate else None for _ in sources]
+
+    # RTP relays tagging each decoded frame with the stream integrity, --triage on live rtp:// inputs
+    model_info['monitors'] = [None for _ in sources]
+    if args.triage and not args.replay:
+        for source, uri in enumerate(sources):
+            port = rtp_port(uri)
+            if port is None:
+                print(f"--triage needs an rtp:// input, {uri} is not monitored")
+                continue
+            try:
+                model_info['monitors'][source] = RtpMonitor(port, args.triage_port + source, args.input_codec).start()
+            except OSError as e:
+                print(f"RTP monitor on port {port} failed: {e}")
+                continue
+            sources[source] = f"rtp://@:{args.triage_port + source}"
+            print(f"RTP monitor: {uri} relayed to {sources[source]}")
+
+    # Structured per-frame trace
+    model_info['tracer'] = TraceRecorder(args.trace) if args.trace else None
+
+    # Binary track stream for other processes
+    model_info['publisher'] = TrackPublisher(args.publish) if args.publish else None
+
+    if args.replay and len(sources) > 1:
+        print("Replay takes a single input, extra sources ignored")
+    if args.pipelined and (args.replay or len(sources) > 1):
+        print("--pipelined applies to a single live source, running sequentially")
+
+    if args.replay:
+        if replay_main(args, model_info, stats) is None:
+            if model_info['tracer']:
+                model_info['tracer'].close()
+            print("YOLO replay failed")
+            return
+    else:
+        # Start threads
+        if len(sources) == 1:
+            target = pipelined_inference_thread if args.pipelined else inference_thread
+            inference_t = threading.Thread(target=target, args=(args, model_info, stats))
+            capture_threads = [threading.Thread(target=capture_thread, args=(args, model_info, stats))]
+        else:
+            ready = threading.Event()
+            mailboxes = [LatestFrame(ready) for _ in sources]
+            inference_t = threading.Thread(target=batched_inference_thread,
+                                           args=(args, model_info, source_stats, mailboxes))
+            capture_threads = [threading.Thread(target=capture_thread, args=(args, model_info, source_stats[source], source, mailbox))
+                          for source, mailbox in enumerate(mailboxes)]
+
+        inference_t.start()
+
+        # Start capture as soon as the model reports ready
+        while not model_ready_flag.wait(timeout=0.1):
+            if not inference_t.is_alive():
+                break
+        if exit_flag.is_set() or not inference_t.is_alive():
+            inference_t.join()
+            if model_info['tracer']:
+                model_info['tracer'].close()
+            print("YOLO model failed to load")
+            return
+        for capture_t in capture_threads:
+            capture_t.start()
+
+        for capture_t in capture_threads:
+            capture_t.join()
+        exit_inference_flag.set()
+        inference_t.join()
 
     cv2.destroyAllWindows()
-    PRINT(args, f"FRAME: inf_min {stats.min_inference_time} ")
-    PRINT(args, f"FRAME: inf_max {stats.max_inference_time} ")
-    PRINT(args, f"FRAME: track_min {stats.min_tracking_time} ")
-    PRINT(args, f"FRAME: track_max {stats.max_tracking_time} ")
+    if model_info['tracer']:
+        model_info['tracer'].close()
+    print(model_info['placement'].report())
+    for stage in model_info.get('stages', []):
+        print(f"Stage {stage}")
+    if model_info['publisher']:
+        print(f"Track stream: {model_info['publisher'].summary()}")
+        model_info['publisher'].close()
+    for source, monitor in enumerate(model_info['monitors']):
+        if monitor:
+            print(f"RTP integrity [{source}]: {monitor.summary()}")
+            monitor.close()
+    print(startup.report())
+    if args.startup_log:
+        startup.export(args.startup_log)
+    PRINT(args, f"FRAME: inf_min {stats.inference.min} ")
+    PRINT(args, f"FRAME: inf_max {stats.inference.max} ")
+    PRINT(args, f"FRAME: track_min {stats.tracking.min} ")
+    PRINT(args, f"FRAME: track_max {stats.tracking.max} ")
+    for name in ('raw', 'tracking', 'inference', 'display'):
+        window = getattr(stats, name).roll()
+        PRINT(args, f"FRAME: {name}_pct {window['p50']:.4f} {window['p95']:.4f} {window['p99']:.4f}")
+    if model_info.get('shapes'):
+        print(model_info['shapes'].summary())
+        for (h, w), backend in model_info['shapes'].backends.items():
+            if isinstance(backend, CascadeBackend):
+                print(f"Cascade {w}x{h}: {backend.summary()}")
+    if model_info.get('roi'):
+        print(f"ROI detection: {model_info['roi'].summary()}")
+    for ctx in model_info['contexts']:
+        prefix = f"[{ctx.source}] " if len(sources) > 1 else ""
+        if len(sources) > 1:
+            window = source_stats[ctx.source].display.roll()
+            print(f"{prefix}Source {sources[ctx.source]}: display {source_stats[ctx.source].display.rate():.1f} FPS, "
+                  f"p50/p95 {window['p50']:.3f}/{window['p95']:.3f}s, inference {source_stats[ctx.source].inference.ewma * 1000:.1f}ms")
+        if ctx.gate:
+            print(f"{prefix}Scene gate: {ctx.gate.summary(args.inference_watts)}")
+        if ctx.propagator:
+            print(f"{prefix}Box propagation: {ctx.propagator.summary()}")
+        if ctx.camera_motion:
+            print(f"{prefix}Camera motion: {ctx.camera_motion.summary()}")
+        if ctx.trajectories:
+            print(f"{prefix}Trajectories: {ctx.trajectories.summary()}")
+        if ctx.triage_mask:
+            print(f"{prefix}Frame triage: {ctx.triaged}/{ctx.analytics_frames} frames tracked without detection, "
+                  f"{ctx.deferred} detections deferred")
+        print(f"{prefix}Overlay: {ctx.overlay.summary()}")
+        if ctx.analytics_frames:
+            print(f"{prefix}Analytics input: {ctx.analytics_bytes / ctx.analytics_frames / 1e6:.3f} MB/frame"
+                  + (f" (dual-res {args.dual_res})" if args.dual_res else " (full resolution)"))
     print("YOLO exited normally")
 
 if __name__ == "__main__":